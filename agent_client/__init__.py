@@ -0,0 +1,21 @@
+"""
+Python client for the Local AI Agent API.
+
+    from agent_client import AgentClient
+
+    with AgentClient("http://localhost:8000") as client:
+        result = client.chat("Hello", domain="all")
+        print(result.response)
+"""
+from agent_client._common import AgentClientError, ChatResult
+from agent_client.async_client import AsyncAgentClient, AsyncChatStream
+from agent_client.sync_client import AgentClient, ChatStream
+
+__all__ = [
+    "AgentClient",
+    "AsyncAgentClient",
+    "AgentClientError",
+    "AsyncChatStream",
+    "ChatResult",
+    "ChatStream",
+]
@@ -0,0 +1,101 @@
+import json
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+
+class AgentClientError(Exception):
+    """Raised for HTTP errors and error packets sent by the server."""
+
+    def __init__(self, message: str, status_code: int | None = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass
+class ChatResult:
+    response: str
+    updated_summary: str | None = None
+    updated_history: list[dict] = field(default_factory=list)
+    session_id: str | None = None  # Pass on the next turn to keep the conversation on one replica
+
+    @classmethod
+    def from_dict(cls, data: dict, session_id: str | None = None) -> "ChatResult":
+        return cls(
+            response=data.get("response", ""),
+            updated_summary=data.get("updated_summary"),
+            updated_history=[{"role": m["role"], "content": m["content"]} for m in data.get("updated_history", [])],
+            session_id=session_id,
+        )
+
+
+def chat_payload(message: str, messages: list[dict] | None = None, summary: str | None = None, **params) -> dict:
+    """
+    Build a ChatRequest body; None values are dropped so server defaults apply. A new
+    conversation (no history) gets a fresh session_id for sticky upstream routing.
+    """
+    if not messages and not params.get("session_id"):
+        params["session_id"] = uuid.uuid4().hex
+    payload = {"message": message, "messages": messages or [], "summary": summary, **params}
+    return {k: v for k, v in payload.items() if v is not None}
+
+
+def ws_url(base_url: str) -> str:
+    if base_url.startswith("https://"):
+        return "wss://" + base_url[len("https://"):]
+    if base_url.startswith("http://"):
+        return "ws://" + base_url[len("http://"):]
+    return base_url
+
+
+def parse_event(raw: str | bytes) -> tuple[str, Any]:
+    """Returns ("content", str), ("metadata", dict) or raises AgentClientError."""
+    data = json.loads(raw)
+    if "content" in data:
+        return "content", data["content"]
+    if "metadata" in data:
+        return "metadata", data["metadata"]
+    if "error" in data:
+        raise AgentClientError(data["error"])
+    raise AgentClientError(f"Unexpected message from server: {data}")
+
+
+def domains_from_documents(documents: list[dict]) -> list[str]:
+    return sorted({doc["domain"] for doc in documents})
+
+
+def raise_for_status(response) -> None:
+    if response.status_code >= 400:
+        try:
+            detail = response.json().get("detail", response.text)
+        except ValueError:
+            detail = response.text
+        raise AgentClientError(f"HTTP {response.status_code}: {detail}", status_code=response.status_code)
+
+
+class TTLCache:
+    """A single cached value that expires after `ttl` seconds."""
+
+    def __init__(self, ttl: float, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self._clock = clock
+        self._value = None
+        self._expires = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if self._value is not None and self._clock() < self._expires:
+                return self._value
+            return None
+
+    def set(self, value):
+        with self._lock:
+            self._value = value
+            self._expires = self._clock() + self.ttl
+
+    def clear(self):
+        with self._lock:
+            self._value = None
@@ -0,0 +1,204 @@
+import asyncio
+import json
+from typing import AsyncIterator, BinaryIO
+
+import httpx
+from websockets.asyncio.client import ClientConnection, connect
+from websockets.exceptions import ConnectionClosed
+
+from agent_client._common import (
+    AgentClientError, ChatResult, TTLCache, chat_payload, domains_from_documents, parse_event,
+    raise_for_status, ws_url,
+)
+
+
+async def _read_chunks(file: BinaryIO, size: int = 1 << 16) -> AsyncIterator[bytes]:
+    # AsyncClient needs an async body to stream a file without reading it all
+    while chunk := file.read(size):
+        yield chunk
+
+
+class AsyncChatStream:
+    """Async counterpart of ChatStream: `async for delta in stream`, then `stream.result`."""
+
+    def __init__(self, client: "AsyncAgentClient", payload: dict):
+        self._client = client
+        self._payload = payload
+        self.result: ChatResult | None = None
+        self._text: list[str] = []
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        websocket, pooled = await self._client._acquire_ws()
+        reusable = False
+        try:
+            while True:
+                try:
+                    await websocket.send(json.dumps(self._payload))
+                    raw = await websocket.recv()
+                    break
+                except ConnectionClosed as e:
+                    await websocket.close()
+                    if not pooled:
+                        raise AgentClientError(f"Connection closed: {e}") from e
+                    # A pooled connection may have been closed by the server while idle
+                    websocket, pooled = await self._client._connect_ws(), False
+            while True:
+                try:
+                    kind, value = parse_event(raw)
+                except AgentClientError:
+                    # The server keeps the connection usable after an error packet
+                    reusable = True
+                    raise
+                if kind == "metadata":
+                    self.result = ChatResult.from_dict({"response": "".join(self._text), **value}, self._payload.get("session_id"))
+                    reusable = True
+                    return
+                self._text.append(value)
+                yield value
+                try:
+                    raw = await websocket.recv()
+                except ConnectionClosed as e:
+                    raise AgentClientError(f"Connection closed during stream: {e}") from e
+        finally:
+            # A stream abandoned half way still has unread packets; don't reuse it
+            await self._client._release_ws(websocket, reusable)
+
+    async def text(self) -> str:
+        """Consume the stream and return the full response."""
+        async for _ in self:
+            pass
+        return self.result.response
+
+
+class AsyncAgentClient:
+    """
+    Asynchronous client for the agent API; same API as AgentClient with awaitables.
+
+        async with AsyncAgentClient("http://localhost:8000") as client:
+            stream = client.stream_chat("Hello")
+            async for delta in stream:
+                print(delta, end="")
+    """
+
+    def __init__(self, base_url: str = "http://localhost:8000", api_prefix: str = "/api/v1",
+                 timeout: float = 120.0, domains_ttl: float = 30.0, max_idle_websockets: int = 4,
+                 api_key: str | None = None, headers: dict | None = None,
+                 transport: httpx.AsyncBaseTransport | None = None):
+        self.base_url = base_url.rstrip("/")
+        self.api_url = self.base_url + api_prefix
+        self.headers = dict(headers or {})
+        if api_key:
+            # Identifies the tenant for fair scheduling and token budgets
+            self.headers["X-API-Key"] = api_key
+        self._http = httpx.AsyncClient(
+            base_url=self.api_url, timeout=timeout, headers=self.headers, transport=transport,
+            limits=httpx.Limits(max_keepalive_connections=10, max_connections=20),
+        )
+        self._timeout = timeout
+        self._domains = TTLCache(domains_ttl)
+        self._idle_ws: list[ClientConnection] = []
+        self._max_idle_ws = max_idle_websockets
+
+    # --- WebSocket pool ---
+
+    async def _connect_ws(self) -> ClientConnection:
+        return await connect(ws_url(self.api_url) + "/ws/chat", additional_headers=self.headers,
+                             open_timeout=self._timeout)
+
+    async def _acquire_ws(self) -> tuple[ClientConnection, bool]:
+        # Returns (connection, taken_from_pool). No lock needed: single event loop.
+        if self._idle_ws:
+            return self._idle_ws.pop(), True
+        return await self._connect_ws(), False
+
+    async def _release_ws(self, websocket: ClientConnection, reusable: bool):
+        if reusable and len(self._idle_ws) < self._max_idle_ws:
+            self._idle_ws.append(websocket)
+        else:
+            await websocket.close()
+
+    # --- Chat ---
+
+    async def chat(self, message: str, messages: list[dict] | None = None, summary: str | None = None,
+                   **params) -> ChatResult:
+        payload = chat_payload(message, messages, summary, **params)
+        response = await self._http.post("/chat", json=payload)
+        raise_for_status(response)
+        return ChatResult.from_dict(response.json(), payload.get("session_id"))
+
+    def stream_chat(self, message: str, messages: list[dict] | None = None, summary: str | None = None,
+                    **params) -> AsyncChatStream:
+        return AsyncChatStream(self, chat_payload(message, messages, summary, **params))
+
+    async def chat_batch(self, requests: list[dict], max_concurrency: int | None = None) -> AsyncIterator[dict]:
+        """Yields batch items ({"index", "response" | "error"}) in completion order."""
+        body = {"requests": requests, "max_concurrency": max_concurrency}
+        async with self._http.stream("POST", "/chat/batch", json={k: v for k, v in body.items() if v is not None}) as response:
+            if response.status_code >= 400:
+                await response.aread()
+                raise_for_status(response)
+            async for line in response.aiter_lines():
+                if line:
+                    yield json.loads(line)
+
+    # --- Documents ---
+
+    async def upload(self, file: str | BinaryIO, domain: str, filename: str | None = None,
+                     content_type: str | None = None) -> dict:
+        if isinstance(file, str):
+            with open(file, "rb") as f:
+                return await self.upload(f, domain, filename or file.rsplit("/", 1)[-1], content_type)
+        name = filename or getattr(file, "name", "upload")
+        files = {"file": (name, file, content_type) if content_type else (name, file)}
+        response = await self._http.post("/upload", files=files, data={"domain": domain})
+        raise_for_status(response)
+        self._domains.clear()
+        return response.json()
+
+    async def upload_bulk(self, domain: str, archive: str | BinaryIO | None = None, path: str | None = None) -> dict:
+        """Async counterpart of AgentClient.upload_bulk."""
+        if isinstance(archive, str):
+            with open(archive, "rb") as f:
+                return await self.upload_bulk(domain, f)
+        params = {"domain": domain, "path": path} if path else {"domain": domain}
+        content = _read_chunks(archive) if archive is not None else None
+        response = await self._http.post("/upload/bulk", params=params, content=content)
+        raise_for_status(response)
+        self._domains.clear()
+        return response.json()
+
+    async def bulk_job(self, job_id: str) -> dict:
+        response = await self._http.get(f"/upload/bulk/{job_id}")
+        raise_for_status(response)
+        return response.json()
+
+    async def documents(self) -> list[dict]:
+        response = await self._http.get("/documents")
+        raise_for_status(response)
+        return response.json()
+
+    async def domains(self, refresh: bool = False) -> list[str]:
+        cached = None if refresh else self._domains.get()
+        if cached is None:
+            cached = domains_from_documents(await self.documents())
+            self._domains.set(cached)
+        return cached
+
+    async def ready(self) -> bool:
+        try:
+            return (await self._http.get(self.base_url + "/ready")).status_code == 200
+        except httpx.HTTPError:
+            return False
+
+    # --- Lifecycle ---
+
+    async def close(self):
+        idle, self._idle_ws = self._idle_ws, []
+        await asyncio.gather(*(websocket.close() for websocket in idle))
+        await self._http.aclose()
+
+    async def __aenter__(self) -> "AsyncAgentClient":
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
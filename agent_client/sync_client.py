@@ -0,0 +1,214 @@
+import json
+import threading
+from typing import BinaryIO, Iterator
+
+import httpx
+from websockets.exceptions import ConnectionClosed
+from websockets.sync.client import ClientConnection, connect
+
+from agent_client._common import (
+    AgentClientError, ChatResult, TTLCache, chat_payload, domains_from_documents, parse_event,
+    raise_for_status, ws_url,
+)
+
+
+class ChatStream:
+    """
+    Iterates over streamed text deltas of one chat turn. After the iteration finishes,
+    `result` holds the final ChatResult (with updated summary and history).
+    """
+
+    def __init__(self, client: "AgentClient", payload: dict):
+        self._client = client
+        self._payload = payload
+        self.result: ChatResult | None = None
+        self._text: list[str] = []
+
+    def __iter__(self) -> Iterator[str]:
+        websocket, pooled = self._client._acquire_ws()
+        reusable = False
+        try:
+            while True:
+                try:
+                    websocket.send(json.dumps(self._payload))
+                    raw = websocket.recv()
+                    break
+                except ConnectionClosed as e:
+                    websocket.close()
+                    if not pooled:
+                        raise AgentClientError(f"Connection closed: {e}") from e
+                    # A pooled connection may have been closed by the server while idle
+                    websocket, pooled = self._client._connect_ws(), False
+            while True:
+                try:
+                    kind, value = parse_event(raw)
+                except AgentClientError:
+                    # The server keeps the connection usable after an error packet
+                    reusable = True
+                    raise
+                if kind == "metadata":
+                    self.result = ChatResult.from_dict({"response": "".join(self._text), **value}, self._payload.get("session_id"))
+                    reusable = True
+                    return
+                self._text.append(value)
+                yield value
+                try:
+                    raw = websocket.recv()
+                except ConnectionClosed as e:
+                    raise AgentClientError(f"Connection closed during stream: {e}") from e
+        finally:
+            # A stream abandoned half way still has unread packets; don't reuse it
+            self._client._release_ws(websocket, reusable)
+
+    def text(self) -> str:
+        """Consume the stream and return the full response."""
+        for _ in self:
+            pass
+        return self.result.response
+
+
+class AgentClient:
+    """
+    Synchronous client for the agent API.
+
+    HTTP requests share one pooled `httpx.Client`; chat streams reuse open WebSocket
+    connections; the domain list is cached for `domains_ttl` seconds.
+
+        with AgentClient("http://localhost:8000") as client:
+            for delta in (stream := client.stream_chat("Hello", domain="all")):
+                print(delta, end="")
+            history = stream.result.updated_history
+    """
+
+    def __init__(self, base_url: str = "http://localhost:8000", api_prefix: str = "/api/v1",
+                 timeout: float = 120.0, domains_ttl: float = 30.0, max_idle_websockets: int = 4,
+                 api_key: str | None = None, headers: dict | None = None,
+                 transport: httpx.BaseTransport | None = None):
+        self.base_url = base_url.rstrip("/")
+        self.api_url = self.base_url + api_prefix
+        self.headers = dict(headers or {})
+        if api_key:
+            # Identifies the tenant for fair scheduling and token budgets
+            self.headers["X-API-Key"] = api_key
+        self._http = httpx.Client(
+            base_url=self.api_url, timeout=timeout, headers=self.headers, transport=transport,
+            limits=httpx.Limits(max_keepalive_connections=10, max_connections=20),
+        )
+        self._timeout = timeout
+        self._domains = TTLCache(domains_ttl)
+        self._idle_ws: list[ClientConnection] = []
+        self._ws_lock = threading.Lock()
+        self._max_idle_ws = max_idle_websockets
+
+    # --- WebSocket pool ---
+
+    def _connect_ws(self) -> ClientConnection:
+        websocket = connect(ws_url(self.api_url) + "/ws/chat", additional_headers=self.headers,
+                            open_timeout=self._timeout)
+        # Pooled connections outlive any `with` block; entering explicitly marks the
+        # connection as managed (newer websockets warn about bare connect() otherwise)
+        return websocket.__enter__()
+
+    def _acquire_ws(self) -> tuple[ClientConnection, bool]:
+        # Returns (connection, taken_from_pool)
+        with self._ws_lock:
+            if self._idle_ws:
+                return self._idle_ws.pop(), True
+        return self._connect_ws(), False
+
+    def _release_ws(self, websocket: ClientConnection, reusable: bool):
+        with self._ws_lock:
+            if reusable and len(self._idle_ws) < self._max_idle_ws:
+                self._idle_ws.append(websocket)
+                return
+        websocket.close()
+
+    # --- Chat ---
+
+    def chat(self, message: str, messages: list[dict] | None = None, summary: str | None = None,
+             **params) -> ChatResult:
+        payload = chat_payload(message, messages, summary, **params)
+        response = self._http.post("/chat", json=payload)
+        raise_for_status(response)
+        return ChatResult.from_dict(response.json(), payload.get("session_id"))
+
+    def stream_chat(self, message: str, messages: list[dict] | None = None, summary: str | None = None,
+                    **params) -> ChatStream:
+        return ChatStream(self, chat_payload(message, messages, summary, **params))
+
+    def chat_batch(self, requests: list[dict], max_concurrency: int | None = None) -> Iterator[dict]:
+        """Yields batch items ({"index", "response" | "error"}) in completion order."""
+        body = {"requests": requests, "max_concurrency": max_concurrency}
+        with self._http.stream("POST", "/chat/batch", json={k: v for k, v in body.items() if v is not None}) as response:
+            if response.status_code >= 400:
+                response.read()
+                raise_for_status(response)
+            for line in response.iter_lines():
+                if line:
+                    yield json.loads(line)
+
+    # --- Documents ---
+
+    def upload(self, file: str | BinaryIO, domain: str, filename: str | None = None,
+               content_type: str | None = None) -> dict:
+        if isinstance(file, str):
+            with open(file, "rb") as f:
+                return self.upload(f, domain, filename or file.rsplit("/", 1)[-1], content_type)
+        name = filename or getattr(file, "name", "upload")
+        files = {"file": (name, file, content_type) if content_type else (name, file)}
+        response = self._http.post("/upload", files=files, data={"domain": domain})
+        raise_for_status(response)
+        self._domains.clear()
+        return response.json()
+
+    def upload_bulk(self, domain: str, archive: str | BinaryIO | None = None, path: str | None = None) -> dict:
+        """
+        Starts a bulk ingest job from a zip/tar archive (streamed from disk) or a server-local
+        directory `path`. Returns the job; poll it with `bulk_job(job["id"])`.
+        """
+        if isinstance(archive, str):
+            with open(archive, "rb") as f:
+                return self.upload_bulk(domain, f)
+        params = {"domain": domain, "path": path} if path else {"domain": domain}
+        response = self._http.post("/upload/bulk", params=params, content=archive)
+        raise_for_status(response)
+        self._domains.clear()
+        return response.json()
+
+    def bulk_job(self, job_id: str) -> dict:
+        response = self._http.get(f"/upload/bulk/{job_id}")
+        raise_for_status(response)
+        return response.json()
+
+    def documents(self) -> list[dict]:
+        response = self._http.get("/documents")
+        raise_for_status(response)
+        return response.json()
+
+    def domains(self, refresh: bool = False) -> list[str]:
+        cached = None if refresh else self._domains.get()
+        if cached is None:
+            cached = domains_from_documents(self.documents())
+            self._domains.set(cached)
+        return cached
+
+    def ready(self) -> bool:
+        try:
+            return self._http.get(self.base_url + "/ready").status_code == 200
+        except httpx.HTTPError:
+            return False
+
+    # --- Lifecycle ---
+
+    def close(self):
+        with self._ws_lock:
+            idle, self._idle_ws = self._idle_ws, []
+        for websocket in idle:
+            websocket.close()
+        self._http.close()
+
+    def __enter__(self) -> "AgentClient":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
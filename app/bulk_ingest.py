@@ -0,0 +1,323 @@
+"""
+Bulk ingest: one job that unpacks a zip/tar archive (or copies a server-local directory)
+into UPLOAD_DIR/{domain} and indexes every file. Files are unpacked into a hidden staging
+folder and moved into the domain folder only once the whole archive is within its limits.
+
+Files are extracted in parallel through the extraction process pool, chunked in a worker
+thread one batch at a time, and their chunks are pooled across files into embedding batches
+of BULK_EMBED_BATCH_SIZE. Per-file upload batches are usually far smaller, which wastes
+embedding throughput. Each batch takes an ingest slot, so a bulk job shares the embedding
+CPU fairly with other tenants' uploads. Jobs live in memory in the worker process that
+runs them.
+"""
+import asyncio
+import itertools
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+import uuid
+import zipfile
+from collections import OrderedDict
+from datetime import datetime
+from typing import Iterator
+
+from app.config import settings
+from app.chunking import get_chunking_config, iter_file_chunks
+from app.extraction import cached_text_path, extractor_pool, resolve_content_type
+from app.metrics import metrics
+from app.scheduling import Tenant, ingest_scheduler
+from app.schemas import BulkIngestJob
+from app.vector_store import vector_store
+
+MAX_ERRORS = 100  # Per-file errors kept on a job
+
+
+class BulkIngestError(Exception):
+    """The archive or directory cannot be ingested at all."""
+
+    def __init__(self, detail: str, status_code: int = 400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+
+def member_filename(name: str) -> str | None:
+    """
+    Flattens an archive path into a file name in the domain folder ("guides/intro.md" ->
+    "guides__intro.md"); /documents derives the domain from the folder, so no subfolders.
+    Returns None for entries to skip: hidden files, OS metadata and unsafe paths.
+    """
+    parts = [p for p in name.replace("\\", "/").split("/") if p not in ("", ".")]
+    if not parts or ".." in parts or name.startswith("/"):
+        return None
+    if any(p.startswith(".") or p == "__MACOSX" for p in parts):
+        return None
+    return "__".join(parts)
+
+
+def resolve_local_dir(path: str) -> str:
+    """Only directories under BULK_INGEST_ALLOWED_DIRS may be ingested from the server's disk."""
+    real = os.path.realpath(path)
+    for allowed in settings.BULK_INGEST_ALLOWED_DIRS:
+        root = os.path.realpath(allowed)
+        if os.path.commonpath([real, root]) == root:
+            if not os.path.isdir(real):
+                raise BulkIngestError(f"Not a directory: {path}")
+            return real
+    raise BulkIngestError("Path is not under an allowed directory (BULK_INGEST_ALLOWED_DIRS)", 403)
+
+
+class BulkJob:
+    def __init__(self, domain: str):
+        self.id = uuid.uuid4().hex
+        self.domain = domain
+        self.status = "unpacking"
+        self.created_at = datetime.now()
+        self.files_total = 0
+        self.files_done = 0
+        self.files_failed = 0
+        self.chunks_indexed = 0
+        self.chunks_failed = 0
+        self.bytes_total = 0
+        self.errors: list[str] = []
+        self._start = time.perf_counter()
+        self._end: float | None = None
+
+    def error(self, message: str):
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append(message)
+
+    def fail_file(self, name: str, message: str):
+        self.files_failed += 1
+        self.error(f"{name}: {message}")
+
+    def finish(self, status: str):
+        self.status = status
+        self._end = time.perf_counter()
+        metrics.observe("bulk.job_seconds", self._end - self._start)
+
+    def to_schema(self) -> BulkIngestJob:
+        elapsed = (self._end or time.perf_counter()) - self._start
+        return BulkIngestJob(
+            id=self.id,
+            domain=self.domain,
+            status=self.status,
+            created_at=self.created_at,
+            files_total=self.files_total,
+            files_done=self.files_done,
+            files_failed=self.files_failed,
+            chunks_indexed=self.chunks_indexed,
+            chunks_failed=self.chunks_failed,
+            bytes_total=self.bytes_total,
+            elapsed_seconds=round(elapsed, 3),
+            files_per_second=round(self.files_done / elapsed, 2) if elapsed else 0.0,
+            chunks_per_second=round(self.chunks_indexed / elapsed, 2) if elapsed else 0.0,
+            errors=self.errors,
+        )
+
+
+def _write_member(source, target: str, job: BulkJob):
+    # Limits are checked while copying, so an archive bomb cannot fill the disk
+    job.files_total += 1
+    if job.files_total > settings.BULK_MAX_FILES:
+        raise BulkIngestError(f"Too many files (max {settings.BULK_MAX_FILES})", 413)
+    with open(target, "wb") as out:
+        while block := source.read(1 << 20):
+            job.bytes_total += len(block)
+            if job.bytes_total > settings.BULK_MAX_BYTES:
+                raise BulkIngestError(f"Unpacked size exceeds {settings.BULK_MAX_BYTES} bytes", 413)
+            out.write(block)
+
+
+def _move_into(files: list[tuple[str, str]], target_dir: str) -> list[tuple[str, str]]:
+    """Moves staged files into the domain folder; staging is on the same disk, so each move is a rename."""
+    os.makedirs(target_dir, exist_ok=True)
+    moved = []
+    for name, staged in files:
+        target = os.path.join(target_dir, name)
+        os.replace(staged, target)
+        moved.append((name, target))
+    return moved
+
+
+def check_archive(archive_path: str):
+    if not (zipfile.is_zipfile(archive_path) or tarfile.is_tarfile(archive_path)):
+        raise BulkIngestError("Not a zip or tar archive", 415)
+
+
+def unpack(archive_path: str, target_dir: str, job: BulkJob) -> list[tuple[str, str]]:
+    """Writes the archive's files into `target_dir`, one member at a time. Returns (name, path) pairs."""
+    files = []
+    if zipfile.is_zipfile(archive_path):
+        with zipfile.ZipFile(archive_path) as archive:
+            for info in archive.infolist():
+                name = member_filename(info.filename)
+                if info.is_dir() or name is None:
+                    continue
+                target = os.path.join(target_dir, name)
+                with archive.open(info) as source:
+                    _write_member(source, target, job)
+                files.append((name, target))
+        return files
+    try:
+        # Stream mode ("r|*"): reads the (possibly compressed) tar sequentially, no seeking
+        with tarfile.open(archive_path, mode="r|*") as archive:
+            for member in archive:
+                name = member_filename(member.name)
+                if not member.isfile() or name is None:
+                    continue  # Also skips links and devices
+                target = os.path.join(target_dir, name)
+                _write_member(archive.extractfile(member), target, job)
+                files.append((name, target))
+    except tarfile.ReadError:
+        raise BulkIngestError("Not a zip or tar archive", 415)
+    return files
+
+
+def copy_directory(source_dir: str, target_dir: str, job: BulkJob) -> list[tuple[str, str]]:
+    files = []
+    for root, dirs, names in os.walk(source_dir):
+        dirs.sort()
+        for file_name in sorted(names):
+            source = os.path.join(root, file_name)
+            name = member_filename(os.path.relpath(source, source_dir))
+            if name is None or not os.path.isfile(source) or os.path.islink(source):
+                continue
+            target = os.path.join(target_dir, name)
+            with open(source, "rb") as f:
+                _write_member(f, target, job)
+            files.append((name, target))
+    return files
+
+
+def _chunk_records(domain: str, name: str, file_path: str, text_path: str) -> Iterator[tuple[str, dict]]:
+    config = get_chunking_config(domain)
+    for chunk in iter_file_chunks(text_path, config):
+        yield chunk.text, {"source": name, "domain": domain, "path": file_path, **chunk.metadata}
+
+
+def _take(records: Iterator[tuple[str, dict]], count: int) -> list[tuple[str, dict]]:
+    return list(itertools.islice(records, count))
+
+
+async def _index(job: BulkJob, records: list[tuple[str, dict]], tenant: Tenant):
+    documents = [text for text, _ in records]
+    metadatas = [metadata for _, metadata in records]
+    ids = [str(uuid.uuid4()) for _ in records]
+    try:
+        async with ingest_scheduler.slot(tenant):
+            await asyncio.to_thread(vector_store.add_documents, job.domain, documents, metadatas, ids)
+    except Exception as e:  # Including RateLimited (timed out waiting for a slot)
+        job.chunks_failed += len(records)
+        job.error(f"Indexing a batch of {len(records)} chunks failed: {e}")
+        return
+    job.chunks_indexed += len(records)
+    metrics.incr("bulk.chunks_indexed", len(records))
+
+
+async def ingest_files(job: BulkJob, files: list[tuple[str, str]], tenant: Tenant):
+    """Extracts files in parallel and indexes their chunks in cross-file batches."""
+    # No more files in flight than workers: a queued file has no worker to time out on
+    semaphore = asyncio.Semaphore(extractor_pool.workers)
+
+    async def extract(name: str, path: str):
+        async with semaphore:
+            try:
+                return name, path, await extractor_pool.extract(path, resolve_content_type(name)), None
+            except Exception as e:  # One bad file must not fail the job
+                return name, path, None, str(e)
+
+    async def fail(name: str, path: str, message: str):
+        job.fail_file(name, message)
+        # Not indexed (or only in part), so it must not stay listed by /documents
+        await asyncio.to_thread(_remove_files, [path, cached_text_path(path)])
+
+    tasks = [asyncio.create_task(extract(name, path)) for name, path in files]
+    batch_size = settings.BULK_EMBED_BATCH_SIZE
+    pending: list[tuple[str, dict]] = []
+    try:
+        # Embedding a full batch overlaps with extraction of the following files
+        for next_done in asyncio.as_completed(tasks):
+            name, path, text_path, error = await next_done
+            if error:
+                await fail(name, path, error)
+                continue
+            # A file is read in steps of at most one batch, so a large file is never held whole
+            records = _chunk_records(job.domain, name, path, text_path)
+            try:
+                while batch := await asyncio.to_thread(_take, records, batch_size - len(pending)):
+                    pending.extend(batch)
+                    if len(pending) >= batch_size:
+                        batch, pending = pending, []
+                        await _index(job, batch, tenant)
+            except Exception as e:
+                pending = [record for record in pending if record[1]["path"] != path]
+                await fail(name, path, str(e))
+                continue
+            job.files_done += 1
+            metrics.incr("bulk.files")
+    finally:
+        for task in tasks:
+            task.cancel()
+        # Files already chunked are indexed even if the loop stopped early
+        if pending:
+            await _index(job, pending, tenant)
+
+
+def _remove_files(paths: list[str]):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+async def run_job(job: BulkJob, tenant: Tenant, archive_path: str | None = None, source_dir: str | None = None):
+    staging_dir = None
+    try:
+        # Hidden, so /documents does not list it; under UPLOAD_DIR, so files move by rename
+        await asyncio.to_thread(os.makedirs, settings.UPLOAD_DIR, exist_ok=True)
+        staging_dir = await asyncio.to_thread(tempfile.mkdtemp, prefix=".bulk-", dir=settings.UPLOAD_DIR)
+        if archive_path:
+            files = await asyncio.to_thread(unpack, archive_path, staging_dir, job)
+        else:
+            files = await asyncio.to_thread(copy_directory, source_dir, staging_dir, job)
+        # Only a complete unpack touches the domain folder (same names replace older files)
+        files = await asyncio.to_thread(_move_into, files, os.path.join(settings.UPLOAD_DIR, job.domain))
+        job.status = "ingesting"
+        await ingest_files(job, files, tenant)
+        job.finish("completed")
+    except Exception as e:
+        job.error(str(e.detail if isinstance(e, BulkIngestError) else e))
+        job.finish("failed")
+    finally:
+        if staging_dir:
+            await asyncio.to_thread(shutil.rmtree, staging_dir, ignore_errors=True)
+        if archive_path and os.path.exists(archive_path):
+            os.remove(archive_path)
+
+
+class JobRegistry:
+    """Recent bulk jobs of this process; running jobs are kept until they finish."""
+
+    def __init__(self, max_jobs: int = 100):
+        self.max_jobs = max_jobs
+        self._jobs: OrderedDict[str, BulkJob] = OrderedDict()
+        self._tasks: set[asyncio.Task] = set()
+
+    def get(self, job_id: str) -> BulkJob | None:
+        return self._jobs.get(job_id)
+
+    def start(self, job: BulkJob, tenant: Tenant, **source) -> BulkJob:
+        self._jobs[job.id] = job
+        finished = [j for j in self._jobs.values() if j.status in ("completed", "failed")]
+        for old in finished[:max(0, len(self._jobs) - self.max_jobs)]:
+            del self._jobs[old.id]
+        task = asyncio.create_task(run_job(job, tenant, **source))
+        # Keep a reference so the task is not garbage collected while running
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+
+jobs = JobRegistry()
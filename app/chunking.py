@@ -0,0 +1,257 @@
+import re
+from collections import deque
+from dataclasses import dataclass
+from typing import Iterable, Iterator
+
+from app.config import settings
+
+# Strategies:
+# - "fixed": plain character windows (the old behaviour, plus optional overlap)
+# - "token": windows of `chunk_size` tokens, never splitting a word
+# - "sentence": whole sentences packed up to `chunk_size` characters
+# - "paragraph": whole paragraphs packed up to `chunk_size` characters
+STRATEGIES = ("fixed", "token", "sentence", "paragraph")
+
+# Cheap approximation of a BPE tokenizer: every word and every punctuation mark
+# counts as one token. Leading whitespace is attached so the text can be rebuilt.
+_TOKEN_RE = re.compile(r"\s*(?:\w+|[^\w\s])")
+_SENTENCE_END_RE = re.compile(r"[.!?]+[\"')\]]*\s+|\n\s*\n")
+_PARAGRAPH_END_RE = re.compile(r"\n\s*\n")
+
+
+def count_tokens(text: str) -> int:
+    return len(_TOKEN_RE.findall(text))
+
+
+@dataclass(frozen=True)
+class ChunkingConfig:
+    strategy: str = "sentence"
+    chunk_size: int = 1000  # tokens for "token", characters otherwise
+    chunk_overlap: int = 150
+
+    def __post_init__(self):
+        if self.strategy not in STRATEGIES:
+            raise ValueError(f"Unknown chunking strategy '{self.strategy}'. Expected one of {STRATEGIES}")
+        if self.chunk_size <= 0:
+            raise ValueError("chunk_size must be positive")
+        if not 0 <= self.chunk_overlap < self.chunk_size:
+            raise ValueError("chunk_overlap must be >= 0 and smaller than chunk_size")
+
+    def metadata(self) -> dict:
+        return {
+            "chunk_strategy": self.strategy,
+            "chunk_size": self.chunk_size,
+            "chunk_overlap": self.chunk_overlap,
+        }
+
+
+@dataclass
+class Chunk:
+    text: str
+    index: int
+    start: int  # character offset of the chunk in the source text
+    config: ChunkingConfig
+
+    @property
+    def metadata(self) -> dict:
+        return {**self.config.metadata(), "chunk_index": self.index, "chunk_start": self.start}
+
+
+def get_chunking_config(domain: str | None = None) -> ChunkingConfig:
+    """Resolve chunking parameters, applying per-domain overrides from CHUNK_DOMAIN_SETTINGS."""
+    params = {
+        "strategy": settings.CHUNK_STRATEGY,
+        "chunk_size": settings.CHUNK_SIZE,
+        "chunk_overlap": settings.CHUNK_OVERLAP,
+    }
+    if domain and domain in settings.CHUNK_DOMAIN_SETTINGS:
+        override = settings.CHUNK_DOMAIN_SETTINGS[domain]
+        params.update(override)
+        if "chunk_size" in override and "chunk_overlap" not in override:
+            # Keep the global overlap ratio when a domain only changes the size
+            params["chunk_overlap"] = min(settings.CHUNK_OVERLAP,
+                                          params["chunk_size"] * settings.CHUNK_OVERLAP // settings.CHUNK_SIZE)
+    return ChunkingConfig(**params)
+
+
+def validate_chunking_settings():
+    """Raises ValueError for an invalid global or per-domain setting; run at startup."""
+    get_chunking_config()
+    for domain in settings.CHUNK_DOMAIN_SETTINGS:
+        try:
+            get_chunking_config(domain)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Invalid CHUNK_DOMAIN_SETTINGS for '{domain}': {e}") from None
+
+
+def _resume_point(buffer: str, lo: int, starts: str, chars: str) -> int:
+    # A boundary that may still be incomplete lies in the trailing run of characters a
+    # boundary can consist of; scanning resumes at the first possible start in that run
+    i = len(buffer)
+    while i > lo and (buffer[i - 1].isspace() or buffer[i - 1] in chars):
+        i -= 1
+    return next((j for j in range(i, len(buffer)) if buffer[j] in starts), len(buffer))
+
+
+def _iter_units(pieces: Iterable[str], strategy: str, limit: int) -> Iterator[tuple[str, int]]:
+    # Yields (unit_text, start_offset). Only emits a unit once its end boundary has been
+    # seen, so text arriving in arbitrary pieces is segmented exactly like the whole string.
+    # Each piece is scanned once, and boundary-free text longer than `limit` is emitted in
+    # the parts _split_oversized would cut anyway, so the buffer stays small on logs or code.
+    if strategy == "sentence":
+        pattern, starts, chars = _SENTENCE_END_RE, ".!?\n", ".!?\"')]"
+    else:
+        pattern, starts, chars = _PARAGRAPH_END_RE, "\n", ""
+    buffer = ""
+    offset = 0
+    scanned = 0  # no boundary starts before this index in buffer
+    for piece in pieces:
+        buffer += piece
+        consumed = 0
+        tail = len(buffer)
+        while tail and buffer[tail - 1].isspace():
+            tail -= 1
+        for match in pattern.finditer(buffer, scanned):
+            # A boundary reaching into trailing whitespace may keep growing
+            if match.end() >= tail:
+                break
+            yield buffer[consumed:match.end()], offset + consumed
+            consumed = match.end()
+        scanned = _resume_point(buffer, consumed, starts, chars)
+        while scanned - consumed > limit:
+            part, _ = next(_split_oversized(buffer[consumed:consumed + limit + 1], 0, limit))
+            yield part, offset + consumed
+            consumed += len(part)
+        buffer = buffer[consumed:]
+        offset += consumed
+        scanned -= consumed
+    if buffer:
+        yield buffer, offset
+
+
+def _split_oversized(text: str, start: int, limit: int) -> Iterator[tuple[str, int]]:
+    # Hard-split a sentence/paragraph longer than the chunk size, preferring whitespace
+    while len(text) > limit:
+        cut = text.rfind(" ", 0, limit) + 1 or limit
+        yield text[:cut], start
+        text, start = text[cut:], start + cut
+    if text:
+        yield text, start
+
+
+def _fixed_chunks(pieces: Iterable[str], config: ChunkingConfig) -> Iterator[Chunk]:
+    step = config.chunk_size - config.chunk_overlap
+    buffer = ""
+    offset = 0
+    index = 0
+    for piece in pieces:
+        buffer += piece
+        while len(buffer) >= config.chunk_size:
+            yield Chunk(buffer[:config.chunk_size], index, offset, config)
+            index += 1
+            buffer = buffer[step:]
+            offset += step
+    # Skip a trailing window that is entirely overlap with the previous chunk
+    if buffer and (index == 0 or len(buffer) > config.chunk_overlap):
+        yield Chunk(buffer, index, offset, config)
+
+
+def _token_chunks(pieces: Iterable[str], config: ChunkingConfig) -> Iterator[Chunk]:
+    # Works on token start offsets and slices the buffer directly, which is much faster
+    # than packing one token at a time.
+    size, step = config.chunk_size, config.chunk_size - config.chunk_overlap
+    buffer = ""
+    base = 0  # offset of buffer[0] in the source text
+    starts: list[int] = []  # token start offsets in buffer
+    head = 0  # index in `starts` of the first token of the current window
+    scanned = 0
+    index = 0
+
+    def scan(final: bool):
+        nonlocal scanned
+        # A word touching the end of the buffer may continue in the next piece, so only
+        # scan up to the last whitespace unless this is the last piece
+        limit = len(buffer) if final else max(max(buffer.rfind(c) for c in " \t\r\n") + 1, scanned)
+        matches = list(_TOKEN_RE.finditer(buffer, scanned, limit))
+        if matches:
+            starts.extend([m.start() for m in matches])
+            # Resume at the end of the last token so following whitespace stays attached
+            scanned = matches[-1].end()
+
+    for piece in pieces:
+        # Drop already chunked text once per piece rather than once per chunk
+        if head:
+            cut = starts[head]
+            buffer = buffer[cut:]
+            base += cut
+            scanned -= cut
+            starts = [s - cut for s in starts[head:]]
+            head = 0
+        buffer += piece
+        scan(final=False)
+        while len(starts) - head > size:
+            yield Chunk(buffer[starts[head]:starts[head + size]], index, base + starts[head], config)
+            index += 1
+            head += step
+
+    scan(final=True)
+    while len(starts) > head:
+        remaining = len(starts) - head
+        end = starts[head + size] if remaining > size else len(buffer)
+        # Skip a trailing window that is entirely overlap with the previous chunk
+        if index == 0 or remaining > config.chunk_overlap:
+            yield Chunk(buffer[starts[head]:end], index, base + starts[head], config)
+            index += 1
+        if remaining <= size:
+            break
+        head += step
+
+
+def iter_chunks(pieces: Iterable[str], config: ChunkingConfig) -> Iterator[Chunk]:
+    """
+    Streaming chunker. `pieces` can be any iterable of text (e.g. blocks read from a file),
+    so memory use is bounded by the chunk size rather than the document size.
+    """
+    if config.strategy == "fixed":
+        yield from _fixed_chunks(pieces, config)
+        return
+    if config.strategy == "token":
+        yield from _token_chunks(pieces, config)
+        return
+
+    window: deque[tuple[str, int, int]] = deque()  # (text, size, start)
+    window_size = 0
+    index = 0
+    pending = False  # window holds text not yet emitted in any chunk
+
+    for unit, start in _iter_units(pieces, config.strategy, config.chunk_size):
+        for text, part_start in _split_oversized(unit, start, config.chunk_size):
+            size = len(text)
+            if window and window_size + size > config.chunk_size:
+                yield Chunk("".join(u[0] for u in window), index, window[0][2], config)
+                index += 1
+                pending = False
+                # Keep trailing units as overlap, but always leave room for the new unit
+                while window and (window_size > config.chunk_overlap or window_size + size > config.chunk_size):
+                    window_size -= window.popleft()[1]
+            window.append((text, size, part_start))
+            window_size += size
+            pending = pending or bool(text.strip())
+
+    if window and pending:
+        yield Chunk("".join(u[0] for u in window), index, window[0][2], config)
+
+
+def chunk_text(text: str, config: ChunkingConfig | None = None) -> list[Chunk]:
+    return list(iter_chunks([text], config or get_chunking_config()))
+
+
+def read_blocks(file_obj, block_size: int = 64 * 1024) -> Iterator[str]:
+    while block := file_obj.read(block_size):
+        yield block
+
+
+def iter_file_chunks(path: str, config: ChunkingConfig) -> Iterator[Chunk]:
+    """Streams a text file through the chunker; undecodable bytes are replaced."""
+    with open(path, "r", encoding="utf-8", errors="replace", newline="") as f:
+        yield from iter_chunks(read_blocks(f), config)
@@ -1,14 +1,79 @@
+from typing import Literal
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     OPENAI_API_KEY: str | None = None
     OPENAI_BASE_URL: str | None = None
+    # Optional list of upstream replicas; conversations stick to one replica so its prefix/KV
+    # cache is reused, e.g. OPENAI_BASE_URLS='["http://vllm-0:8000/v1", "http://vllm-1:8000/v1"]'
+    OPENAI_BASE_URLS: list[str] = []
     MODEL_NAME: str = "gpt-3.5-turbo"
+    # "legacy": context in the system prompt. "prefix_cache": stable system/summary/history
+    # prefix with retrieved context attached to the latest user turn.
+    PROMPT_LAYOUT: Literal["legacy", "prefix_cache"] = "legacy"
+    STREAM_INCLUDE_USAGE: bool = False # Request usage (incl. cached tokens) on streamed responses; needs upstream stream_options support
     SUMMARY_THRESHOLD: int = 15
     SUMMARY_MAX_TOKENS: int = 200
+    SUMMARY_CACHE_SIZE: int = 1024 # Memoized summaries kept in memory (0 disables the cache)
+    SUMMARY_INCREMENTAL: bool = True # Only summarize messages not already covered by the incoming summary
     CHROMA_DB_HOST: str = "chromadb"
     CHROMA_DB_PORT: int = 8000
     UPLOAD_DIR: str = "uploads" # We will ignore this for file persistence
+    WARMUP_ON_STARTUP: bool = True # Load the embedding model in the background at startup
+
+    # Chunking (see app/chunking.py). CHUNK_SIZE is in tokens for the "token" strategy
+    # and characters otherwise. CHUNK_DOMAIN_SETTINGS overrides per domain, e.g.
+    # CHUNK_DOMAIN_SETTINGS='{"legal": {"strategy": "paragraph", "chunk_size": 2000}}'
+    CHUNK_STRATEGY: str = "sentence"
+    CHUNK_SIZE: int = 1000
+    CHUNK_OVERLAP: int = 150
+    CHUNK_DOMAIN_SETTINGS: dict[str, dict] = {}
+    INGEST_BATCH_SIZE: int = 64 # Chunks sent to the vector store per add call
+
+    # Text extraction for HTML/DOCX/PDF uploads (see app/extraction.py)
+    EXTRACT_WORKERS: int | None = None # Process pool size (default: CPU count)
+    EXTRACT_TIMEOUT: float = 60.0 # Seconds per file once a worker starts it
+    EXTRACT_MEMORY_LIMIT_MB: int | None = 1024 # Address-space limit per worker process
+
+    # Bulk ingest (/upload/bulk, see app/bulk_ingest.py)
+    BULK_EMBED_BATCH_SIZE: int = 256 # Chunks per embedding batch, pooled across files
+    BULK_MAX_FILES: int = 50000
+    BULK_MAX_BYTES: int = 10 * 1024 ** 3 # Archive and unpacked size limit per job
+    BULK_INGEST_ALLOWED_DIRS: list[str] = [] # Server-local directories that may be ingested by path
+
+    # Retrieval post-processing (see app/retrieval.py). RETRIEVAL_DOMAIN_SETTINGS overrides
+    # per domain, e.g. '{"support": {"mmr": false, "rerank": false}}' for latency-critical domains
+    RETRIEVAL_TOP_K: int = 3 # Chunks packed into the prompt
+    RETRIEVAL_FETCH_K: int = 12 # Candidates over-fetched for MMR / reranking
+    RETRIEVAL_MMR: bool = True
+    RETRIEVAL_MMR_LAMBDA: float = 0.7
+    RETRIEVAL_RERANK: bool = False # Requires sentence-transformers
+    RERANKER_MODEL: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    RETRIEVAL_MAX_CONTEXT_TOKENS: int | None = None
+    RETRIEVAL_DOMAIN_SETTINGS: dict[str, dict] = {}
+
+    # Batch chat (/chat/batch)
+    BATCH_MAX_CONCURRENCY: int = 8 # Concurrent generations per batch
+    BATCH_MAX_ITEMS: int = 10000
+    BATCH_EMBED_SIZE: int = 64 # Queries embedded per retrieval call
+
+    # Tenants and fair scheduling (see app/scheduling.py). TENANTS maps X-API-Key values to
+    # tenant settings, e.g. TENANTS='{"k-123": {"name": "acme", "weight": 2,
+    # "max_concurrency": 4, "tokens_per_minute": 60000}}'. Callers without a known key use
+    # DEFAULT_TENANT (same fields) unless REQUIRE_API_KEY is set.
+    TENANTS: dict[str, dict] = {}
+    DEFAULT_TENANT: dict = {"name": "default"}
+    REQUIRE_API_KEY: bool = False
+    GENERATION_SLOTS: int = 32 # Concurrent chat turns across all tenants
+    INGEST_SLOTS: int = 4 # Concurrent upload ingests across all tenants
+    QUEUE_TIMEOUT: float | None = 60.0 # Seconds a request may wait for a slot (503 after)
+
+    # Event-loop monitoring and profiling (see app/profiling.py)
+    LOOP_MONITOR: bool = True # Heartbeat + watchdog thread; cheap enough to leave on
+    LOOP_MONITOR_INTERVAL: float = 0.1
+    LOOP_SLOW_THRESHOLD: float = 0.25 # Stalls longer than this are logged with the loop thread's stack
+    ADMIN_API_KEY: str | None = None # Enables /api/v1/admin/* and the X-Profile request header
+    PROFILE_MAX_RESULTS: int = 16 # Profiles kept in memory for download
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,369 @@
+"""
+Text extraction for uploaded documents.
+
+Extractors are registered per content type. Plain-text types need no extraction and are
+streamed from the original file. Everything else is parsed in a process pool (EXTRACT_WORKERS,
+default one per core), so CPU-bound parsing never runs on the event loop and a
+pathological file can only take down a worker: each file gets EXTRACT_TIMEOUT seconds once
+it starts running (queueing does not count) and each worker an address-space limit of
+EXTRACT_MEMORY_LIMIT_MB. The extracted text is
+cached next to the original as a hidden file (`uploads/docs/.report.pdf.txt`), so
+re-indexing an unchanged file never parses it again.
+
+PDF support requires `pypdf` (listed in requirements.txt; PDFs are rejected without it); HTML
+and DOCX use the standard library.
+"""
+import asyncio
+import mimetypes
+import multiprocessing
+import os
+import re
+import signal
+import threading
+import time
+import weakref
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from html.parser import HTMLParser
+from typing import Callable, Iterator
+from xml.etree import ElementTree
+
+from app.config import settings
+from app.metrics import metrics
+
+
+class ExtractionError(Exception):
+    """The file could not be turned into text (corrupt, timed out, out of memory)."""
+    status_code = 422
+
+
+class UnsupportedFileType(ExtractionError):
+    status_code = 415
+
+
+class ExtractionTimeout(ExtractionError):
+    pass
+
+
+TEXT = "text/plain"
+HTML = "text/html"
+DOCX = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+PDF = "application/pdf"
+
+# Extensions win over the declared content type: clients often send application/octet-stream
+EXTENSIONS = {
+    ".txt": TEXT, ".md": "text/markdown", ".csv": "text/csv", ".json": "application/json",
+    ".html": HTML, ".htm": HTML, ".xhtml": HTML, ".docx": DOCX, ".pdf": PDF,
+}
+TEXT_TYPES = {"application/json", "application/xml", "application/x-yaml", "application/yaml",
+              "application/javascript", "application/x-sh"}
+
+EXTRACTORS: dict[str, Callable[[str], Iterator[str]]] = {}
+
+
+def register_extractor(*content_types: str):
+    """Registers a function `path -> iterator of text pieces`. It runs in a worker process,
+    so it must be defined at module level in a module the workers import."""
+    def decorator(extractor):
+        for content_type in content_types:
+            EXTRACTORS[content_type] = extractor
+        return extractor
+    return decorator
+
+
+def resolve_content_type(filename: str, declared: str | None = None) -> str:
+    extension = os.path.splitext(filename)[1].lower()
+    if extension in EXTENSIONS:
+        return EXTENSIONS[extension]
+    guessed, _ = mimetypes.guess_type(filename)
+    declared = (declared or "").split(";")[0].strip().lower()
+    return guessed or declared or "application/octet-stream"
+
+
+def is_text_type(content_type: str) -> bool:
+    return content_type not in EXTRACTORS and (content_type.startswith("text/") or content_type in TEXT_TYPES)
+
+
+def cached_text_path(file_path: str) -> str:
+    # Hidden, so /documents does not list it
+    directory, name = os.path.split(file_path)
+    return os.path.join(directory, f".{name}.txt")
+
+
+def _is_cached(file_path: str, cache_path: str) -> bool:
+    try:
+        return os.stat(cache_path).st_mtime_ns >= os.stat(file_path).st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+
+def _looks_binary(file_path: str) -> bool:
+    with open(file_path, "rb") as f:
+        return b"\x00" in f.read(8192)
+
+
+# --- Extractors ---
+
+class _HTMLText(HTMLParser):
+    SKIP = {"script", "style", "noscript", "template", "svg"}
+    LINE = {"br", "li", "tr", "dt", "dd"}
+    BLOCK = {"p", "div", "section", "article", "header", "footer", "main", "aside", "nav", "title",
+             "h1", "h2", "h3", "h4", "h5", "h6", "pre", "blockquote", "table", "ul", "ol", "dl", "hr"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: list[str] = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self._skip += 1
+        elif tag in self.BLOCK:
+            self.parts.append("\n\n")
+        elif tag in self.LINE:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP:
+            self._skip = max(0, self._skip - 1)
+        elif tag in self.BLOCK:
+            self.parts.append("\n\n")
+
+    def handle_data(self, data):
+        if not self._skip:
+            # Source line breaks are just whitespace; structure comes from the tags
+            self.parts.append(re.sub(r"\s+", " ", data))
+
+    def drain(self) -> str:
+        text, self.parts = "".join(self.parts), []
+        text = re.sub(r" *\n *", "\n", text)
+        return re.sub(r"\n{3,}", "\n\n", text)
+
+
+@register_extractor(HTML, "application/xhtml+xml")
+def extract_html(path: str) -> Iterator[str]:
+    parser = _HTMLText()
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        while block := f.read(1 << 16):
+            parser.feed(block)
+            yield parser.drain()
+    parser.close()
+    yield parser.drain()
+
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+@register_extractor(DOCX)
+def extract_docx(path: str) -> Iterator[str]:
+    try:
+        archive = zipfile.ZipFile(path)
+    except zipfile.BadZipFile:
+        raise ExtractionError("Not a valid DOCX file")
+    with archive:
+        try:
+            document = archive.open("word/document.xml")
+        except KeyError:
+            raise ExtractionError("DOCX file has no word/document.xml")
+        with document:
+            parts, in_run = [], 0
+            # Streamed: paragraphs are emitted and freed as they are parsed
+            for event, element in ElementTree.iterparse(document, events=("start", "end")):
+                tag = element.tag
+                if tag == _W + "r":
+                    in_run += 1 if event == "start" else -1
+                elif event == "start":
+                    continue
+                elif tag == _W + "t":
+                    parts.append(element.text or "")
+                elif tag == _W + "tab" and in_run:
+                    parts.append("\t")
+                elif tag in (_W + "br", _W + "cr"):
+                    parts.append("\n")
+                elif tag == _W + "p":
+                    parts.append("\n\n")
+                    yield "".join(parts)
+                    parts = []
+                    element.clear()
+            if parts:
+                yield "".join(parts)
+
+
+@register_extractor(PDF)
+def extract_pdf(path: str) -> Iterator[str]:
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise UnsupportedFileType("PDF extraction requires pypdf (pip install pypdf)")
+    try:
+        reader = PdfReader(path)
+        for page in reader.pages:
+            yield (page.extract_text() or "") + "\n\n"
+    except (ExtractionError, MemoryError):
+        raise
+    except Exception as e:
+        raise ExtractionError(f"Could not read PDF: {e}")
+
+
+# --- Worker process ---
+
+def _init_worker(memory_limit_mb: int | None):
+    if memory_limit_mb:
+        try:
+            import resource
+            limit = memory_limit_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ImportError, ValueError, OSError):
+            pass  # Not supported on this platform
+
+
+def _on_alarm(signum, frame):
+    raise ExtractionTimeout("Extraction timed out")
+
+
+def extract_to_file(content_type: str, file_path: str, cache_path: str, timeout: float | None = None) -> int:
+    """
+    Runs `content_type`'s extractor and writes the text to `cache_path`. Returns characters
+    written. In a worker process, `timeout` is enforced with SIGALRM where available.
+    """
+    extractor = EXTRACTORS.get(content_type)
+    if extractor is None:
+        raise UnsupportedFileType(f"No extractor for content type '{content_type}'")
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    chars = 0
+    alarm = bool(timeout) and hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread()
+    try:
+        if alarm:
+            signal.signal(signal.SIGALRM, _on_alarm)
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+        with open(tmp_path, "w", encoding="utf-8") as out:
+            for piece in extractor(file_path):
+                out.write(piece)
+                chars += len(piece)
+        os.replace(tmp_path, cache_path)
+    except MemoryError:
+        raise ExtractionError("Extraction exceeded the worker memory limit")
+    except ExtractionTimeout:
+        raise ExtractionTimeout(f"Extraction timed out after {timeout}s")
+    except ExtractionError:
+        raise
+    except Exception as e:
+        # Parser errors (malformed XML, bad compression, I/O) are a bad file, not a server error
+        raise ExtractionError(f"Could not extract text: {e}")
+    finally:
+        if alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return chars
+
+
+# Extra time the pool waits beyond the per-file timeout (worker start-up) before it assumes a
+# worker is stuck where SIGALRM cannot interrupt it (inside C code, or no SIGALRM at all)
+STUCK_WORKER_GRACE = 10.0
+
+
+class ExtractorPool:
+    """
+    Lazily started process pool for extraction, with per-file timeouts. At most `workers`
+    files are submitted at once, so a file's timeout starts when a worker picks it up.
+    """
+
+    def __init__(self, workers: int | None = None, timeout: float | None = None,
+                 memory_limit_mb: int | None = None):
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self._pool: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self._slots: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()  # event loop -> Semaphore
+
+    def _slot(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        slot = self._slots.get(loop)
+        if slot is None:
+            slot = self._slots[loop] = asyncio.Semaphore(self.workers)
+        return slot
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn: workers start lean instead of inheriting the server's address
+                # space (chromadb, the embedding model), which RLIMIT_AS would count
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.memory_limit_mb,),
+                )
+            return self._pool
+
+    def _discard(self, pool: ProcessPoolExecutor, terminate: bool = False):
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        if terminate:
+            # A running task cannot be cancelled, and a ProcessPoolExecutor cannot outlive one
+            # of its workers being killed, so the whole pool goes. Other in-flight files see
+            # BrokenProcessPool and are retried on a new pool with a fresh timeout.
+            for process in list((pool._processes or {}).values()):
+                process.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    async def extract(self, file_path: str, content_type: str) -> str:
+        """
+        Returns the path of a plain-text file for the chunker: the original for text types,
+        otherwise the cached extraction (parsed in a worker if missing or stale).
+        """
+        if is_text_type(content_type):
+            return file_path
+        if content_type not in EXTRACTORS:
+            if await asyncio.to_thread(_looks_binary, file_path):
+                raise UnsupportedFileType(f"Unsupported file type '{content_type}'")
+            return file_path  # Unknown but textual (source code, logs, ...)
+
+        cache_path = cached_text_path(file_path)
+        if _is_cached(file_path, cache_path):
+            metrics.incr("extract.cache_hits")
+            return cache_path
+
+        start = time.perf_counter()
+        backstop = self.timeout + STUCK_WORKER_GRACE if self.timeout else None
+        async with self._slot():
+            for attempt in range(2):
+                pool = self._get_pool()
+                future = pool.submit(extract_to_file, content_type, file_path, cache_path, self.timeout)
+                try:
+                    chars = await asyncio.wait_for(asyncio.wrap_future(future), backstop)
+                    break
+                except asyncio.TimeoutError:
+                    self._discard(pool, terminate=True)
+                    metrics.incr("extract.timeouts")
+                    raise ExtractionTimeout(f"Extraction timed out after {self.timeout}s")
+                except BrokenProcessPool:
+                    # Recycled after another file's stuck worker was killed, or a worker crashed
+                    self._discard(pool)
+                    if attempt:
+                        metrics.incr("extract.errors")
+                        raise ExtractionError("Extraction worker crashed")
+                except ExtractionTimeout:
+                    metrics.incr("extract.timeouts")
+                    metrics.incr("extract.errors")
+                    raise
+                except ExtractionError:
+                    metrics.incr("extract.errors")
+                    raise
+        metrics.observe("extract.seconds", time.perf_counter() - start)
+        metrics.incr("extract.files")
+        metrics.incr("extract.chars", chars)
+        return cache_path
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+extractor_pool = ExtractorPool(settings.EXTRACT_WORKERS, settings.EXTRACT_TIMEOUT, settings.EXTRACT_MEMORY_LIMIT_MB)
@@ -1,12 +1,85 @@
+import hashlib
+import itertools
 from openai import AsyncOpenAI
 from app.config import settings
+from app.metrics import metrics
+from app.chunking import count_tokens
+from app.scheduling import current_tenant
 
 client = AsyncOpenAI(
     api_key=settings.OPENAI_API_KEY,
     base_url=settings.OPENAI_BASE_URL
 )
 
-async def generate_chat_response(messages: list[dict], stream: bool = False, **kwargs):
+# Replica clients for session-affinity routing (OPENAI_BASE_URLS), created on first use
+_replica_clients: dict[str, AsyncOpenAI] = {}
+_round_robin = itertools.count()
+
+def pick_replica(session_key: str | None) -> str | None:
+    """
+    Rendezvous hashing: a session always maps to the same replica (so its prompt prefix
+    stays in that replica's KV cache), and only sessions of a removed replica move.
+    Requests without a session key are spread round-robin.
+    """
+    replicas = settings.OPENAI_BASE_URLS
+    if not replicas:
+        return None
+    if session_key is None:
+        return replicas[next(_round_robin) % len(replicas)]
+    return max(replicas, key=lambda url: hashlib.sha256(f"{session_key}|{url}".encode()).digest())
+
+def get_client(session_key: str | None = None) -> tuple[AsyncOpenAI, str | None]:
+    replica = pick_replica(session_key)
+    if replica is None:
+        return client, None
+    if replica not in _replica_clients:
+        _replica_clients[replica] = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, base_url=replica)
+    return _replica_clients[replica], replica
+
+def record_usage(usage, replica: str | None = None, already_charged: int = 0):
+    # Tracks prompt-cache effectiveness from the upstream `usage` block and charges the
+    # current tenant's token budget (minus streamed tokens charged already)
+    if usage is None:
+        return
+    prompt = usage.prompt_tokens or 0
+    completion = usage.completion_tokens or 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = (getattr(details, "cached_tokens", None) or 0) if details else 0
+    tenant = current_tenant.get()
+    if tenant:
+        tenant.record_usage(prompt, completion, already_charged)
+    metrics.incr("llm.requests_with_usage")
+    metrics.incr("llm.prompt_tokens", prompt)
+    metrics.incr("llm.completion_tokens", completion)
+    metrics.incr("llm.cached_prompt_tokens", cached)
+    if replica:
+        metrics.incr(f"llm.replica.{replica}.prompt_tokens", prompt)
+        metrics.incr(f"llm.replica.{replica}.cached_prompt_tokens", cached)
+    total_prompt = metrics.counters["llm.prompt_tokens"]
+    if total_prompt:
+        metrics.set_gauge("llm.cached_token_ratio", metrics.counters["llm.cached_prompt_tokens"] / total_prompt)
+
+async def _stream_with_usage(stream, replica: str | None):
+    # Usage arrives in a final chunk without choices; record it and hide it from callers.
+    # Deltas are charged to the tenant as they stream so long generations count early.
+    tenant = current_tenant.get()
+    streamed, has_usage = 0, False
+    async for chunk in stream:
+        if getattr(chunk, "usage", None) is not None:
+            record_usage(chunk.usage, replica, already_charged=streamed)
+            has_usage = True
+        if chunk.choices:
+            content = chunk.choices[0].delta.content
+            if tenant and content:
+                tokens = count_tokens(content)
+                tenant.charge(tokens)
+                streamed += tokens
+            yield chunk
+    if tenant and not has_usage:
+        # Upstream sent no usage: keep the streamed estimate
+        tenant.record_usage(0, streamed, already_charged=streamed)
+
+async def generate_chat_response(messages: list[dict], stream: bool = False, session_key: str | None = None, **kwargs):
     api_kwargs = {
         "messages": messages,
         "stream": stream,
@@ -17,18 +90,29 @@ async def generate_chat_response(messages: list[dict], stream: bool = False, **k
     if not api_kwargs.get("model") and settings.MODEL_NAME:
         api_kwargs["model"] = settings.MODEL_NAME
 
+    if stream and settings.STREAM_INCLUDE_USAGE:
+        api_kwargs["stream_options"] = {"include_usage": True}
+
     # Remove keys with None values (e.g. max_tokens if not set)
     api_kwargs = {k: v for k, v in api_kwargs.items() if v is not None}
 
-    response = await client.chat.completions.create(**api_kwargs)
+    llm, replica = get_client(session_key)
+    response = await llm.chat.completions.create(**api_kwargs)
+    if stream:
+        return _stream_with_usage(response, replica)
+    record_usage(getattr(response, "usage", None), replica)
     return response
 
+SUMMARY_PROMPT = "Summarize the following conversation concisely in under {max_tokens} tokens. Focus on retaining key context, user preferences, and important details for future interactions:\n\n{history}"
+
 async def summarize_conversation(history_text: str):
-    prompt = f"Summarize the following conversation concisely in under {settings.SUMMARY_MAX_TOKENS} tokens. Focus on retaining key context, user preferences, and important details for future interactions:\n\n{history_text}"
-    response = await client.chat.completions.create(
+    prompt = SUMMARY_PROMPT.format(max_tokens=settings.SUMMARY_MAX_TOKENS, history=history_text)
+    llm, replica = get_client()
+    response = await llm.chat.completions.create(
         model=settings.MODEL_NAME,
         messages=[{"role": "user", "content": prompt}],
         max_tokens=settings.SUMMARY_MAX_TOKENS,
         stream=False
     )
+    record_usage(getattr(response, "usage", None), replica)
     return response.choices[0].message.content
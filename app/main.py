@@ -1,10 +1,52 @@
-from fastapi import FastAPI
+import time
+
+_process_start = time.perf_counter()
+
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import chat, document
+from fastapi.responses import JSONResponse
+from app.routers import admin, chat, document
+from app.vector_store import vector_store
+from app.metrics import metrics
+from app.scheduling import RateLimited
+from app.profiling import ProfileMiddleware, loop_monitor
+from app.extraction import extractor_pool
+from app.chunking import validate_chunking_settings
+from app.config import settings
 # Database deps removed
 import asyncio
 
-app = FastAPI(title="Local AI Agent App")
+startup_seconds: float | None = None
+
+async def warmup():
+    # Load chromadb and the embedding model off the event loop so the first real
+    # request does not pay the cold-start cost.
+    global startup_seconds
+    try:
+        await asyncio.to_thread(vector_store.warmup)
+    except Exception as e:
+        print(f"Warmup failed: {e}")
+        return
+    startup_seconds = time.perf_counter() - _process_start
+    metrics.set_gauge("startup.warmup_seconds", vector_store.warmup_seconds)
+    metrics.set_gauge("startup.ready_seconds", startup_seconds)
+    print(f"Warmup finished in {vector_store.warmup_seconds:.2f}s (startup to ready: {startup_seconds:.2f}s)")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Fail at startup rather than on every upload to a misconfigured domain
+    validate_chunking_settings()
+    warmup_task = asyncio.create_task(warmup()) if settings.WARMUP_ON_STARTUP else None
+    if settings.LOOP_MONITOR:
+        loop_monitor.start()
+    yield
+    loop_monitor.stop()
+    extractor_pool.shutdown()
+    if warmup_task and not warmup_task.done():
+        warmup_task.cancel()
+
+app = FastAPI(title="Local AI Agent App", lifespan=lifespan)
 
 # Tables should be managed via Alembic migrations
 
@@ -15,10 +57,34 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Per-request cProfile for requests sent with X-Profile: 1 (and X-Admin-Key)
+app.add_middleware(ProfileMiddleware)
+
+@app.exception_handler(RateLimited)
+async def rate_limited_handler(request: Request, exc: RateLimited):
+    return JSONResponse(status_code=exc.status_code, content={"detail": exc.detail}, headers=exc.headers)
 
 app.include_router(chat.router, prefix="/api/v1")
 app.include_router(document.router, prefix="/api/v1")
+app.include_router(admin.router, prefix="/api/v1")
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the Local AI Agent App"}
+
+@app.get("/ready")
+def readiness():
+    # With warmup disabled the model loads lazily on first use, so report ready immediately
+    if vector_store.ready or not settings.WARMUP_ON_STARTUP:
+        return {
+            "status": "ready",
+            "warm": vector_store.ready,
+            "warmup_seconds": vector_store.warmup_seconds,
+            "startup_seconds": startup_seconds,
+        }
+    status = "error" if vector_store.warmup_error else "warming_up"
+    return JSONResponse(status_code=503, content={"status": status, "detail": vector_store.warmup_error})
+
+@app.get("/metrics")
+def get_metrics():
+    return metrics.snapshot()
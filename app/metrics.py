@@ -0,0 +1,77 @@
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+
+class Metrics:
+    """
+    Minimal in-process metrics: monotonically increasing counters, gauges and timings.
+    Timings keep a bounded window of recent samples for percentiles plus all-time totals.
+    Exposed as JSON on GET /metrics.
+    """
+
+    def __init__(self, window: int = 1024):
+        self._lock = threading.Lock()
+        self._window = window
+        self.counters: dict[str, float] = defaultdict(float)
+        self.gauges: dict[str, float] = {}
+        self._samples: dict[str, deque] = defaultdict(lambda: deque(maxlen=self._window))
+        self._totals: dict[str, list] = defaultdict(lambda: [0, 0.0])  # count, sum
+
+    def incr(self, name: str, value: float = 1):
+        with self._lock:
+            self.counters[name] += value
+
+    def set_gauge(self, name: str, value: float):
+        with self._lock:
+            self.gauges[name] = value
+
+    def observe(self, name: str, seconds: float):
+        with self._lock:
+            self._samples[name].append(seconds)
+            totals = self._totals[name]
+            totals[0] += 1
+            totals[1] += seconds
+
+    @contextmanager
+    def timer(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            timings = {}
+            for name, samples in self._samples.items():
+                ordered = sorted(samples)
+                count, total = self._totals[name]
+                timings[name] = {
+                    "count": count,
+                    "avg_ms": round(total / count * 1000, 3),
+                    "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+                    "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+                    "max_ms": round(ordered[-1] * 1000, 3),
+                }
+            return {"counters": dict(self.counters), "gauges": dict(self.gauges), "timings": timings}
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self._samples.clear()
+            self._totals.clear()
+
+
+def percentile(ordered: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return 0.0
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+metrics = Metrics()
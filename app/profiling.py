@@ -0,0 +1,311 @@
+"""
+Event-loop lag monitoring and on-demand profiling.
+
+LoopMonitor runs a heartbeat task on the event loop and a watchdog thread. When the
+heartbeat is overdue by LOOP_SLOW_THRESHOLD the watchdog captures the loop thread's
+current stack (whatever is blocking it) and logs it; lag is recorded as the `loop.lag`
+timing. Both wake every LOOP_MONITOR_INTERVAL, so the monitor can stay on in production.
+
+ProfileManager runs one profiling session at a time: `cprofile` (deterministic, event
+loop thread only) or `sampling` (periodic stack samples of all threads, collapsed-stack
+output for flame graphs). ProfileMiddleware profiles single requests sent with an
+`X-Profile: 1` header. Results are kept in memory and served by the admin router.
+"""
+import asyncio
+import cProfile
+import io
+import logging
+import marshal
+import pstats
+import sys
+import threading
+import time
+import traceback
+import uuid
+from collections import Counter, OrderedDict, deque
+from dataclasses import dataclass, field
+
+from app.config import settings
+from app.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = ("cprofile", "sampling")
+
+
+class LoopMonitor:
+    def __init__(self, interval: float = 0.1, threshold: float = 0.25, max_stalls: int = 32):
+        self.interval = interval
+        self.threshold = threshold
+        self.stalls: deque[dict] = deque(maxlen=max_stalls)
+        self._last_beat = time.monotonic()
+        self._pending: dict | None = None  # stall captured for the current heartbeat
+        self._loop_thread_id: int | None = None
+        self._task: asyncio.Task | None = None
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Must be called from the event loop thread."""
+        if self.running:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        # A fresh event per start: a watchdog from a previous start that has not woken up
+        # yet still sees its own event set and exits
+        self._stop = threading.Event()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, args=(self._stop,), name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _heartbeat(self):
+        while True:
+            beat = time.monotonic()
+            self._last_beat = beat
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - beat - self.interval)
+            metrics.observe("loop.lag", lag)
+            pending = self._pending
+            if pending is not None and pending["beat"] == beat:
+                # The watchdog saw this stall while it was happening; record its full length
+                pending["blocked_seconds"] = round(lag, 4)
+                self._pending = None
+
+    def _watch(self, stop: threading.Event):
+        captured = None
+        while not stop.wait(self.interval):
+            beat = self._last_beat
+            overdue = time.monotonic() - beat - self.interval
+            if overdue < self.threshold or captured == beat:
+                continue
+            captured = beat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else ""
+            stall = {"at": time.time(), "beat": beat, "blocked_seconds": round(overdue, 4), "stack": stack}
+            self._pending = stall
+            self.stalls.append(stall)
+            metrics.incr("loop.stalls")
+            logger.warning("Event loop blocked for %.3fs; loop thread stack:\n%s", overdue, stack)
+
+    def report(self) -> dict:
+        timing = metrics.snapshot()["timings"].get("loop.lag")
+        stalls = [{k: v for k, v in stall.items() if k != "beat"} for stall in self.stalls]
+        return {"running": self.running, "threshold_seconds": self.threshold, "lag": timing, "stalls": stalls}
+
+
+class SamplingProfiler:
+    """Samples the stacks of all threads every `interval` seconds from a background thread."""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        # One "frame;frame;frame count" line per distinct stack (flamegraph.pl / speedscope)
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+@dataclass
+class ProfileResult:
+    id: str
+    mode: str
+    started_at: float
+    duration_seconds: float
+    text: str  # Human readable summary
+    data: bytes  # Raw download: marshalled pstats or collapsed stacks
+    path: str | None = None  # Request path for per-request profiles
+    extra: dict = field(default_factory=dict)
+
+    @property
+    def filename(self) -> str:
+        return f"{self.id}.pstats" if self.mode == "cprofile" else f"{self.id}.collapsed.txt"
+
+    def info(self) -> dict:
+        return {
+            "id": self.id,
+            "mode": self.mode,
+            "started_at": self.started_at,
+            "duration_seconds": round(self.duration_seconds, 4),
+            "path": self.path,
+            **self.extra,
+        }
+
+
+def _cprofile_result(profiler: cProfile.Profile, result_id: str, started_at: float, duration: float,
+                     path: str | None = None, limit: int = 40) -> ProfileResult:
+    stream = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stream)
+    stats.sort_stats("cumulative").print_stats(limit)
+    # Same format pstats.Stats.dump_stats writes, so downloads open with `python -m pstats`
+    data = marshal.dumps(stats.stats)
+    return ProfileResult(result_id, "cprofile", started_at, duration, stream.getvalue(), data, path)
+
+
+class ProfileManager:
+    def __init__(self, max_results: int = 16):
+        self.max_results = max_results
+        self.results: OrderedDict[str, ProfileResult] = OrderedDict()
+        self._session: dict | None = None
+        self._lock = threading.Lock()
+        # Only one cProfile can be active on the event loop thread at a time
+        self._cprofile_busy = False
+
+    @property
+    def session(self) -> dict | None:
+        if self._session is None:
+            return None
+        return {"mode": self._session["mode"], "started_at": self._session["started_at"]}
+
+    def _store(self, result: ProfileResult):
+        with self._lock:
+            self.results[result.id] = result
+            while len(self.results) > self.max_results:
+                self.results.popitem(last=False)
+
+    def get(self, result_id: str) -> ProfileResult | None:
+        return self.results.get(result_id)
+
+    def start(self, mode: str = "sampling", interval: float = 0.005):
+        """Starts a session. Call from the event loop thread (cProfile profiles the caller's thread)."""
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode '{mode}', expected one of {PROFILE_MODES}")
+        with self._lock:
+            if self._session is not None:
+                raise RuntimeError("A profiling session is already running")
+            if mode == "cprofile":
+                if self._cprofile_busy:
+                    raise RuntimeError("cProfile is busy profiling a request")
+                self._cprofile_busy = True
+            # Reserved under the lock; released again below if the profiler fails to start
+            self._session = {"mode": mode, "started_at": time.time(), "start": time.perf_counter()}
+        try:
+            if mode == "cprofile":
+                profiler = cProfile.Profile()
+                profiler.enable()
+            else:
+                profiler = SamplingProfiler(interval)
+                profiler.start()
+        except Exception as e:
+            with self._lock:
+                self._session = None
+                if mode == "cprofile":
+                    self._cprofile_busy = False
+            raise RuntimeError(f"Could not start the {mode} profiler: {e}") from e
+        self._session["profiler"] = profiler
+
+    def stop(self) -> ProfileResult:
+        with self._lock:
+            session, self._session = self._session, None
+        if session is None:
+            raise RuntimeError("No profiling session is running")
+        profiler = session["profiler"]
+        duration = time.perf_counter() - session["start"]
+        result_id = f"session-{uuid.uuid4().hex[:8]}"
+        if session["mode"] == "cprofile":
+            profiler.disable()
+            self._cprofile_busy = False
+            result = _cprofile_result(profiler, result_id, session["started_at"], duration)
+        else:
+            profiler.stop()
+            collapsed = profiler.collapsed()
+            result = ProfileResult(result_id, "sampling", session["started_at"], duration, collapsed,
+                                   collapsed.encode(), extra={"samples": sum(profiler.samples.values())})
+        self._store(result)
+        return result
+
+    def try_begin_request(self) -> cProfile.Profile | None:
+        with self._lock:
+            if self._cprofile_busy:
+                return None
+            self._cprofile_busy = True
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def end_request(self, profiler: cProfile.Profile, result_id: str, started_at: float, duration: float,
+                    path: str) -> ProfileResult:
+        profiler.disable()
+        self._cprofile_busy = False
+        result = _cprofile_result(profiler, result_id, started_at, duration, path)
+        self._store(result)
+        return result
+
+
+class ProfileMiddleware:
+    """
+    ASGI middleware: a request with `X-Profile: 1` and a valid `X-Admin-Key` is run under
+    cProfile (including a streamed body); the response carries `X-Profile-Id`. cProfile
+    sees everything on the event loop thread meanwhile, including concurrent requests.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._requested(scope):
+            await self.app(scope, receive, send)
+            return
+        profiler = profiles.try_begin_request()
+        if profiler is None:
+            await self.app(scope, receive, send)
+            return
+
+        # The id is chosen up front: headers go out before a streamed body is profiled
+        result_id = f"request-{uuid.uuid4().hex[:8]}"
+        started_at, start = time.time(), time.perf_counter()
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", result_id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profiles.end_request(profiler, result_id, started_at, time.perf_counter() - start, scope["path"])
+
+    @staticmethod
+    def _requested(scope) -> bool:
+        if not settings.ADMIN_API_KEY:
+            return False
+        headers = dict(scope.get("headers") or [])
+        return (headers.get(b"x-profile", b"").lower() in (b"1", b"true")
+                and headers.get(b"x-admin-key", b"").decode() == settings.ADMIN_API_KEY)
+
+
+loop_monitor = LoopMonitor(settings.LOOP_MONITOR_INTERVAL, settings.LOOP_SLOW_THRESHOLD)
+profiles = ProfileManager(settings.PROFILE_MAX_RESULTS)
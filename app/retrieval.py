@@ -0,0 +1,250 @@
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from app.config import settings
+from app.chunking import count_tokens
+from app.metrics import metrics
+from app.vector_store import vector_store
+
+# Retrieval post-processing pipeline:
+#   embed -> search (over-fetch `fetch_k`) -> [rerank] -> [mmr] -> pack (`top_k`, token budget)
+# Every stage is timed so it can be switched off per domain when latency matters more
+# than prompt size (see RETRIEVAL_DOMAIN_SETTINGS).
+
+
+@dataclass(frozen=True)
+class RetrievalConfig:
+    top_k: int = 3
+    fetch_k: int = 12
+    mmr: bool = True
+    mmr_lambda: float = 0.7  # 1.0 = pure relevance, 0.0 = pure diversity
+    rerank: bool = False
+    max_context_tokens: int | None = None
+
+    def __post_init__(self):
+        if self.top_k <= 0:
+            raise ValueError("top_k must be positive")
+        if not 0.0 <= self.mmr_lambda <= 1.0:
+            raise ValueError("mmr_lambda must be between 0 and 1")
+
+    @property
+    def candidates(self) -> int:
+        # Only over-fetch when a post-processing stage will use the extra candidates
+        return max(self.fetch_k, self.top_k) if (self.mmr or self.rerank) else self.top_k
+
+
+@dataclass
+class RetrievalResult:
+    documents: list[str] = field(default_factory=list)
+    timings: dict[str, float] = field(default_factory=dict)  # stage -> seconds
+    context_tokens: int = 0
+
+
+def get_retrieval_config(domain: str | None = None) -> RetrievalConfig:
+    params = {
+        "top_k": settings.RETRIEVAL_TOP_K,
+        "fetch_k": settings.RETRIEVAL_FETCH_K,
+        "mmr": settings.RETRIEVAL_MMR,
+        "mmr_lambda": settings.RETRIEVAL_MMR_LAMBDA,
+        "rerank": settings.RETRIEVAL_RERANK,
+        "max_context_tokens": settings.RETRIEVAL_MAX_CONTEXT_TOKENS,
+    }
+    if domain and domain in settings.RETRIEVAL_DOMAIN_SETTINGS:
+        params.update(settings.RETRIEVAL_DOMAIN_SETTINGS[domain])
+    return RetrievalConfig(**params)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def mmr_select(query_embedding, candidate_embeddings, k: int, lambda_: float = 0.7, relevance=None) -> list[int]:
+    """
+    Maximal marginal relevance. Greedily picks the candidate maximising
+    lambda * relevance - (1 - lambda) * max similarity to already selected candidates.
+    `relevance` defaults to cosine similarity with the query (e.g. pass reranker scores).
+    Returns candidate indices in selection order.
+    """
+    candidates = _normalize(np.asarray(candidate_embeddings, dtype=np.float32))
+    if len(candidates) == 0:
+        return []
+    if relevance is None:
+        query = _normalize(np.asarray(query_embedding, dtype=np.float32))
+        relevance = candidates @ query
+    else:
+        relevance = np.asarray(relevance, dtype=np.float32)
+    similarity = candidates @ candidates.T
+
+    selected = [int(np.argmax(relevance))]
+    max_sim = similarity[selected[0]].copy()
+    remaining = np.ones(len(candidates), dtype=bool)
+    remaining[selected[0]] = False
+    while len(selected) < min(k, len(candidates)):
+        scores = lambda_ * relevance - (1 - lambda_) * max_sim
+        scores[~remaining] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        remaining[best] = False
+        max_sim = np.maximum(max_sim, similarity[best])
+    return selected
+
+
+class Reranker:
+    """Optional local cross-encoder (CPU). Requires `sentence-transformers`; disabled if missing."""
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self._model = None
+        self._lock = threading.Lock()
+        self.available = True
+
+    def _load(self):
+        with self._lock:
+            if self._model is None and self.available:
+                try:
+                    from sentence_transformers import CrossEncoder
+                except ImportError:
+                    print("Reranking disabled: sentence-transformers is not installed")
+                    self.available = False
+                    return
+                try:
+                    self._model = CrossEncoder(self.model_name, device="cpu")
+                except Exception as e:  # e.g. no network to download the model
+                    print(f"Reranking disabled: could not load {self.model_name}: {e}")
+                    self.available = False
+
+    def score(self, query: str, documents: list[str]) -> list[float] | None:
+        """
+        Relevance scores min-max scaled to [0, 1], so they weigh like cosine similarities
+        in MMR. Returns None when reranking is unavailable; callers fall back to vector order.
+        """
+        if self._model is None:
+            self._load()
+        if self._model is None:
+            return None
+        try:
+            scores = np.asarray(self._model.predict([(query, d) for d in documents]), dtype=np.float32)
+        except Exception as e:
+            print(f"Reranking disabled: {self.model_name} failed: {e}")
+            self.available = False
+            self._model = None
+            return None
+        low, high = float(scores.min()), float(scores.max())
+        if high == low:
+            return [1.0] * len(scores)
+        return [float(s) for s in (scores - low) / (high - low)]
+
+
+reranker = Reranker(settings.RERANKER_MODEL)
+
+
+def _pack(documents: list[str], max_tokens: int | None) -> tuple[list[str], int]:
+    packed, used = [], 0
+    for document in documents:
+        tokens = count_tokens(document)
+        if max_tokens is not None and packed and used + tokens > max_tokens:
+            break
+        packed.append(document)
+        used += tokens
+    return packed, used
+
+
+def select_documents(query: str, query_embedding, candidates: list[dict], config: RetrievalConfig,
+                     timings: dict[str, float]) -> RetrievalResult:
+    """Run the post-processing stages on already fetched candidates."""
+    documents = [c["document"] for c in candidates]
+    relevance = None
+
+    if config.rerank and candidates:
+        start = time.perf_counter()
+        relevance = reranker.score(query, documents)
+        timings["rerank"] = time.perf_counter() - start
+
+    if config.mmr and candidates:
+        start = time.perf_counter()
+        order = mmr_select(query_embedding, [c["embedding"] for c in candidates], config.top_k,
+                           config.mmr_lambda, relevance)
+        timings["mmr"] = time.perf_counter() - start
+    elif relevance is not None:
+        order = sorted(range(len(candidates)), key=lambda i: relevance[i], reverse=True)[:config.top_k]
+    else:
+        # Vector store results are already ordered by distance
+        order = list(range(min(config.top_k, len(candidates))))
+
+    start = time.perf_counter()
+    packed, tokens = _pack([documents[i] for i in order], config.max_context_tokens)
+    timings["pack"] = time.perf_counter() - start
+
+    result = RetrievalResult(documents=packed, timings=timings, context_tokens=tokens)
+    _record(result, len(candidates))
+    return result
+
+
+def _record(result: RetrievalResult, candidate_count: int):
+    for stage, seconds in result.timings.items():
+        metrics.observe(f"retrieval.{stage}", seconds)
+    metrics.observe("retrieval.total", sum(result.timings.values()))
+    metrics.incr("retrieval.requests")
+    metrics.incr("retrieval.candidates", candidate_count)
+    metrics.incr("retrieval.documents_packed", len(result.documents))
+    metrics.incr("retrieval.context_tokens", result.context_tokens)
+
+
+def retrieve(domain: str | None, query: str, config: RetrievalConfig | None = None) -> RetrievalResult:
+    """Retrieve context for a query. Blocking (embedding + chromadb); call from a worker thread."""
+    config = config or get_retrieval_config(domain)
+    timings: dict[str, float] = {}
+    try:
+        start = time.perf_counter()
+        query_embedding = vector_store.embed([query])[0]
+        timings["embed"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        candidates = vector_store.query_candidates(domain, [query_embedding], config.candidates)[0]
+        timings["search"] = time.perf_counter() - start
+    except Exception as e:
+        print(f"Error querying ChromaDB: {e}")
+        return RetrievalResult(timings=timings)
+
+    return select_documents(query, query_embedding, candidates, config, timings)
+
+
+def retrieve_many(queries: list[tuple[str | None, str]]) -> list[RetrievalResult]:
+    """
+    Batched retrieve() for (domain, query) pairs: all queries are embedded in one call and
+    each domain is searched with a single multi-query request. Shared stage timings are
+    amortized over the items in the batch.
+    """
+    results = [RetrievalResult() for _ in queries]
+    if not queries:
+        return results
+    try:
+        start = time.perf_counter()
+        embeddings = vector_store.embed([query for _, query in queries])
+        embed_time = (time.perf_counter() - start) / len(queries)
+    except Exception as e:
+        print(f"Error embedding batch: {e}")
+        return results
+
+    by_domain: dict[str | None, list[int]] = defaultdict(list)
+    for i, (domain, _) in enumerate(queries):
+        by_domain[domain].append(i)
+
+    for domain, indices in by_domain.items():
+        config = get_retrieval_config(domain)
+        try:
+            start = time.perf_counter()
+            candidate_lists = vector_store.query_candidates(domain, [embeddings[i] for i in indices], config.candidates)
+            search_time = (time.perf_counter() - start) / len(indices)
+        except Exception as e:
+            print(f"Error querying ChromaDB: {e}")
+            continue
+        for i, candidates in zip(indices, candidate_lists):
+            timings = {"embed": embed_time, "search": search_time}
+            results[i] = select_documents(queries[i][1], embeddings[i], candidates, config, timings)
+    return results
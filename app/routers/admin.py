@@ -0,0 +1,52 @@
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse, Response
+from app.config import settings
+from app.profiling import loop_monitor, profiles
+
+async def require_admin(x_admin_key: Optional[str] = Header(None)):
+    # Admin endpoints are disabled unless ADMIN_API_KEY is configured
+    if not settings.ADMIN_API_KEY or x_admin_key != settings.ADMIN_API_KEY:
+        raise HTTPException(status_code=403, detail="Admin API key required")
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+
+@router.get("/loop")
+async def loop_report():
+    """Event-loop lag percentiles and recent stalls with the stack that blocked the loop."""
+    return loop_monitor.report()
+
+@router.post("/profile/start")
+async def start_profile(mode: Literal["cprofile", "sampling"] = "sampling", interval: float = Query(0.005, ge=0.001)):
+    # Async on purpose: cProfile must be enabled on the event loop thread
+    try:
+        profiles.start(mode, interval)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"status": "started", **profiles.session}
+
+@router.post("/profile/stop")
+async def stop_profile():
+    try:
+        result = profiles.stop()
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return result.info()
+
+@router.get("/profiles")
+async def list_profiles():
+    return {"session": profiles.session, "results": [r.info() for r in reversed(profiles.results.values())]}
+
+@router.get("/profiles/{profile_id}")
+async def download_profile(profile_id: str, format: Literal["raw", "text"] = "raw"):
+    """`raw` is a pstats file (cprofile) or collapsed stacks (sampling); `text` is a readable summary."""
+    result = profiles.get(profile_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "text":
+        return PlainTextResponse(result.text)
+    return Response(
+        content=result.data,
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="{result.filename}"'},
+    )
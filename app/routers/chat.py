@@ -1,26 +1,87 @@
-from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
-from app.schemas import ChatRequest, ChatResponse, Message
-from app import llm_client
-from app.vector_store import vector_store
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect, UploadFile, File, Form
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+from app.schemas import ChatRequest, ChatResponse, Message, BatchChatRequest, BatchChatItem
+from app import llm_client, retrieval
+from app.chunking import count_tokens
 from app.config import settings
+from app.metrics import metrics
+from app.summary_cache import summary_cache, message_digest
+from app.scheduling import RateLimited, Tenant, generation_scheduler, get_tenant, tenants
+from typing import Optional
+import asyncio
 import json
 
 router = APIRouter()
 
-async def process_summary(current_summary: str | None, messages: list[Message]) -> str:
-    # Summarize the conversation history
+def _summary_text(current_summary: str | None, messages: list[Message]) -> str:
     text_to_summarize = ""
     if current_summary:
         text_to_summarize += f"Previous Summary: {current_summary}\n"
     text_to_summarize += "\n".join([f"{m.role}: {m.content}" for m in messages])
-    
-    new_summary = await llm_client.summarize_conversation(text_to_summarize)
+    return text_to_summarize
+
+async def process_summary(current_summary: str | None, messages: list[Message]) -> str:
+    # Summarize the conversation history
+    digests = [message_digest(m.role, m.content) for m in messages]
+    # A summary made by another model or prompt is neither reused nor trusted for coverage
+    context = summary_cache.context(settings.MODEL_NAME, llm_client.SUMMARY_PROMPT, settings.SUMMARY_MAX_TOKENS)
+
+    if settings.SUMMARY_INCREMENTAL and current_summary:
+        # Skip messages the incoming summary already covers (e.g. a client resending full history)
+        covered = summary_cache.covered_prefix(current_summary, digests, context)
+        if covered:
+            metrics.incr("summary.incremental_skipped_messages", covered)
+            metrics.incr("summary.tokens_saved", count_tokens(_summary_text(None, messages[:covered])))
+            messages, digests = messages[covered:], digests[covered:]
+        if not messages:
+            return current_summary
+
+    text_to_summarize = _summary_text(current_summary, messages)
+    if settings.SUMMARY_CACHE_SIZE <= 0:
+        metrics.incr("summary.cache_misses")
+        return await llm_client.summarize_conversation(text_to_summarize)
+
+    key = summary_cache.key(current_summary, digests, context)
+    coverage = summary_cache.coverage(current_summary, context) + digests
+    new_summary, cached = await summary_cache.get_or_compute(
+        key, coverage, lambda: llm_client.summarize_conversation(text_to_summarize), context
+    )
+    if cached:
+        metrics.incr("summary.cache_hits")
+        # Estimated from the prompt and the summary we did not have to generate
+        metrics.incr("summary.tokens_saved", count_tokens(text_to_summarize) + count_tokens(new_summary))
+    else:
+        metrics.incr("summary.cache_misses")
     return new_summary
 
-async def prepare_chat_context(request: ChatRequest):
+def resolve_search_domain(domain_req: str | None) -> tuple[bool, str | None]:
+    # Returns (use_rag, search_domain); search_domain None means all domains
+    if not domain_req or domain_req.lower() == "none":
+        return False, None
+    if domain_req.lower() == "all":
+        return True, None
+    return True, domain_req
+
+def conversation_key(request: ChatRequest) -> str | None:
+    # Used for sticky routing to an upstream replica. Prefer the client's session_id;
+    # otherwise the opening exchange (first message and reply) identifies the conversation
+    # until it is summarized away. A first turn has no reply yet and is routed round-robin,
+    # so conversations opening with the same greeting do not all land on one replica.
+    if request.session_id:
+        return request.session_id
+    opening = request.messages[:2]
+    if len(opening) < 2:
+        return None
+    return message_digest("conversation", "\n".join(f"{m.role}: {m.content}" for m in opening))
+
+async def prepare_chat_context(request: ChatRequest, retrieved: retrieval.RetrievalResult | None = None):
+    # `retrieved` lets callers that already ran retrieval (e.g. batch) skip step 3
     # 1. Prepare Context & History
     messages = request.messages
     current_summary = request.summary
+    session_key = conversation_key(request)
     
     # Add the new user message to the history for processing
     user_message = Message(role="user", content=request.message)
@@ -38,22 +99,18 @@ async def prepare_chat_context(request: ChatRequest):
         
         updated_summary = await process_summary(current_summary, to_summarize)
         
-    # 3. Build Context from Vector Store
-    context_text = ""
     # 3. Build Context from Vector Store
     context_text = ""
     # Logic:
     # - None or "none": Pure LLM (No RAG)
     # - "all": Search ALL documents (RAG with no filter)
     # - "specific": Search specific domain (RAG with filter)
-    
-    domain_req = request.domain
-    if domain_req and domain_req.lower() != "none":
-        search_domain = None # Default to None (All) if "all"
-        if domain_req.lower() != "all":
-            search_domain = domain_req
-            
-        documents = vector_store.query_documents(search_domain, request.message)
+    use_rag, search_domain = resolve_search_domain(request.domain)
+    if use_rag:
+        if retrieved is None:
+            # Over-fetch, diversify (MMR) and pack; blocking embedding/search runs in a worker thread
+            retrieved = await run_in_threadpool(retrieval.retrieve, search_domain, request.message)
+        documents = retrieved.documents
         if documents:
             context_text = "\n\nRelevant Context:\n" + "\n".join(documents)
 
@@ -64,12 +121,25 @@ async def prepare_chat_context(request: ChatRequest):
     system_content = base_system_prompt
     if updated_summary:
         system_content += f"\n\nPrevious Conversation Summary:\n{updated_summary}"
-    if context_text:
-        system_content += context_text
 
-    llm_messages = [{"role": "system", "content": system_content}]
-    for msg in active_history:
-        llm_messages.append({"role": msg.role, "content": msg.content})
+    layout = request.prompt_layout or settings.PROMPT_LAYOUT
+    if layout == "prefix_cache":
+        # Stable prefix (system prompt, summary, history) so upstream prefix/KV caches can be
+        # reused across turns; the per-turn context goes next to the latest user message.
+        llm_messages = [{"role": "system", "content": system_content}]
+        for msg in active_history[:-1]:
+            llm_messages.append({"role": msg.role, "content": msg.content})
+        latest = active_history[-1].content
+        if context_text:
+            latest = context_text.lstrip("\n") + "\n\n" + latest
+        llm_messages.append({"role": "user", "content": latest})
+    else:
+        if context_text:
+            system_content += context_text
+
+        llm_messages = [{"role": "system", "content": system_content}]
+        for msg in active_history:
+            llm_messages.append({"role": msg.role, "content": msg.content})
     
     # 5. Prepare Generation Args
     gen_kwargs = {
@@ -79,53 +149,65 @@ async def prepare_chat_context(request: ChatRequest):
         "max_tokens": request.max_tokens,
         "presence_penalty": request.presence_penalty,
         "frequency_penalty": request.frequency_penalty,
+        "session_key": session_key,
     }
     
     return llm_messages, active_history, updated_summary, gen_kwargs
 
-@router.websocket("/ws/chat")
-async def websocket_endpoint(websocket: WebSocket):
-    await websocket.accept()
-    try:
-        data = await websocket.receive_json()
-        # Parse into ChatRequest
-        request = ChatRequest(**data)
-        
+async def stream_chat_turn(websocket: WebSocket, data: dict, tenant: Tenant):
+    # Parse into ChatRequest
+    request = ChatRequest(**data)
+    
+    full_response = ""
+    async with generation_scheduler.slot(tenant, check_budget=True):
         llm_messages, active_history, updated_summary, gen_kwargs = await prepare_chat_context(request)
-        
-        full_response = ""
+
         async for chunk in await llm_client.generate_chat_response(llm_messages, stream=True, **gen_kwargs):
             content = chunk.choices[0].delta.content
             if content:
                 full_response += content
                 await websocket.send_json({"content": content})
-        
-        # Final packet with metadata
-        assistant_message = Message(role="assistant", content=full_response)
-        final_history = active_history + [assistant_message]
-        
-        metadata = {
-            "updated_summary": updated_summary,
-            "updated_history": [m.model_dump() for m in final_history]
-        }
-        await websocket.send_json({"metadata": metadata})
-        # Optional: verify if we need to send a close frame or keep connection open for next message
-        # Typically chat WS might stay open, but here we treat it as request-response stream
-        # Verify user preference. For now, we just finish this generation. 
-        # Waiting for next message or closing? 
-        # LLM streaming usually ends here for one turn.
-        
+    
+    # Final packet with metadata
+    assistant_message = Message(role="assistant", content=full_response)
+    final_history = active_history + [assistant_message]
+    
+    metadata = {
+        "updated_summary": updated_summary,
+        "updated_history": [m.model_dump() for m in final_history]
+    }
+    await websocket.send_json({"metadata": metadata})
+
+@router.websocket("/ws/chat")
+async def websocket_endpoint(websocket: WebSocket):
+    tenant = tenants.resolve(websocket.headers.get("x-api-key"))
+    if tenant is None:
+        await websocket.close(code=1008, reason="Invalid or missing API key")
+        return
+    await websocket.accept()
+    # The connection stays open for further turns so clients can reuse it. Each turn ends
+    # with a "metadata" (or "error") packet; clients that close after one turn still work.
+    try:
+        while True:
+            text = await websocket.receive_text()
+            try:
+                await stream_chat_turn(websocket, json.loads(text), tenant)
+            except WebSocketDisconnect:
+                raise
+            except RateLimited as e:
+                await websocket.send_json({"error": e.detail, "retry_after": e.retry_after})
+            except Exception as e:
+                await websocket.send_json({"error": str(e)})
     except WebSocketDisconnect:
         print("Client disconnected")
-    except Exception as e:
-        await websocket.send_json({"error": str(e)})
 
-@router.post("/chat", response_model=ChatResponse)
-async def chat_endpoint(request: ChatRequest):
-    llm_messages, active_history, updated_summary, gen_kwargs = await prepare_chat_context(request)
-    
-    # Non-streaming only
-    response = await llm_client.generate_chat_response(llm_messages, stream=False, **gen_kwargs)
+async def generate_chat(request: ChatRequest, retrieved: retrieval.RetrievalResult | None = None,
+                        tenant: Tenant | None = None) -> ChatResponse:
+    async with generation_scheduler.slot(tenant or tenants.resolve(None), check_budget=True):
+        llm_messages, active_history, updated_summary, gen_kwargs = await prepare_chat_context(request, retrieved)
+
+        # Non-streaming only
+        response = await llm_client.generate_chat_response(llm_messages, stream=False, **gen_kwargs)
     content = response.choices[0].message.content
     
     assistant_message = Message(role="assistant", content=content)
@@ -136,3 +218,109 @@ async def chat_endpoint(request: ChatRequest):
         updated_summary=updated_summary,
         updated_history=final_history
     )
+
+@router.post("/chat", response_model=ChatResponse)
+async def chat_endpoint(request: ChatRequest, tenant: Tenant = Depends(get_tenant)):
+    return await generate_chat(request, tenant=tenant)
+
+async def run_batch(items: list[ChatRequest | str], max_concurrency: int, tenant: Tenant | None = None):
+    """
+    Yields NDJSON lines (BatchChatItem) in completion order. `items` holds parsed requests,
+    or an error string for entries that failed to parse.
+    Retrieval runs in embedding batches of BATCH_EMBED_SIZE while earlier items are already
+    generating; generations are bounded by `max_concurrency` and compete with other
+    requests of `tenant` for its fair share of generation slots.
+    """
+    results: asyncio.Queue[BatchChatItem] = asyncio.Queue()
+    semaphore = asyncio.Semaphore(max_concurrency)
+    tasks: set[asyncio.Task] = set()
+
+    async def run_one(index: int, request: ChatRequest, retrieved):
+        async with semaphore:
+            try:
+                item = BatchChatItem(index=index, response=await generate_chat(request, retrieved, tenant))
+            except Exception as e:
+                item = BatchChatItem(index=index, error=str(e))
+        await results.put(item)
+
+    async def produce():
+        handled: set[int] = set()  # items whose result line is queued or owned by a task
+        try:
+            valid = []
+            for index, item in enumerate(items):
+                if isinstance(item, str):
+                    await results.put(BatchChatItem(index=index, error=item))
+                    handled.add(index)
+                else:
+                    valid.append((index, item))
+
+            for start in range(0, len(valid), settings.BATCH_EMBED_SIZE):
+                group = valid[start:start + settings.BATCH_EMBED_SIZE]
+                rag_indices, queries = [], []
+                for index, request in group:
+                    use_rag, search_domain = resolve_search_domain(request.domain)
+                    if use_rag:
+                        rag_indices.append(index)
+                        queries.append((search_domain, request.message))
+                try:
+                    retrieved = dict(zip(rag_indices, await run_in_threadpool(retrieval.retrieve_many, queries)))
+                except Exception as e:
+                    for index, _ in group:
+                        await results.put(BatchChatItem(index=index, error=str(e)))
+                        handled.add(index)
+                    continue
+                for index, request in group:
+                    task = asyncio.create_task(run_one(index, request, retrieved.get(index)))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                    handled.add(index)
+        except Exception as e:
+            # The consumer expects one line per item; without them it would wait forever
+            for index in range(len(items)):
+                if index not in handled:
+                    await results.put(BatchChatItem(index=index, error=f"Batch failed: {e}"))
+
+    producer = asyncio.create_task(produce())
+    try:
+        for _ in range(len(items)):
+            item = await results.get()
+            yield item.model_dump_json(exclude_none=True) + "\n"
+        await producer
+    finally:
+        # Client went away or we are done: stop any outstanding work
+        producer.cancel()
+        for task in list(tasks):
+            task.cancel()
+
+def _batch_concurrency(requested: int | None) -> int:
+    return max(1, min(requested or settings.BATCH_MAX_CONCURRENCY, settings.BATCH_MAX_CONCURRENCY))
+
+def _check_batch_size(count: int):
+    if count > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch too large: {count} items (max {settings.BATCH_MAX_ITEMS})")
+
+@router.post("/chat/batch")
+async def chat_batch_endpoint(batch: BatchChatRequest, tenant: Tenant = Depends(get_tenant)):
+    _check_batch_size(len(batch.requests))
+    return StreamingResponse(
+        run_batch(batch.requests, _batch_concurrency(batch.max_concurrency), tenant),
+        media_type="application/x-ndjson",
+    )
+
+@router.post("/chat/batch/upload")
+async def chat_batch_upload_endpoint(
+    file: UploadFile = File(...),
+    max_concurrency: Optional[int] = Form(None),
+    tenant: Tenant = Depends(get_tenant)
+):
+    # JSONL: one ChatRequest per line. Lines that fail to parse become per-item errors.
+    items: list[ChatRequest | str] = []
+    for line in (await file.read()).decode("utf-8", errors="replace").splitlines():
+        if not line.strip():
+            continue
+        try:
+            items.append(ChatRequest.model_validate_json(line))
+        except ValidationError as e:
+            items.append(f"Invalid request: {e.errors(include_url=False)}")
+    _check_batch_size(len(items))
+    return StreamingResponse(run_batch(items, _batch_concurrency(max_concurrency), tenant), media_type="application/x-ndjson")
@@ -1,6 +1,12 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, Request
+from starlette.concurrency import run_in_threadpool
 from app.vector_store import vector_store
-from app.schemas import UploadResponse
+from app.schemas import UploadResponse, BulkIngestJob
+from app.chunking import get_chunking_config, iter_file_chunks
+from app.scheduling import RateLimited, Tenant, get_tenant, ingest_scheduler
+from app.extraction import ExtractionError, cached_text_path, extractor_pool, resolve_content_type
+from app.bulk_ingest import BulkIngestError, BulkJob, check_archive, jobs, resolve_local_dir
+from typing import Optional
 import uuid
 from datetime import datetime
 
@@ -8,13 +14,49 @@ router = APIRouter()
 
 import os
 import shutil
+import tempfile
 from app.config import settings
 
+def ingest_file(domain: str, filename: str, file_path: str, text_path: str | None = None) -> int:
+    """
+    Chunk a saved file and add it to the vector store in batches. Returns the chunk count.
+    `text_path` is the extracted text of a binary upload (see app/extraction.py).
+    """
+    config = get_chunking_config(domain)
+    documents, metadatas = [], []
+    total = 0
+
+    def flush():
+        nonlocal documents, metadatas
+        if documents:
+            ids = [str(uuid.uuid4()) for _ in documents]
+            # Hand over the batch and start new lists (the store may keep references)
+            vector_store.add_documents(domain, documents, metadatas, ids)
+            documents, metadatas = [], []
+
+    for chunk in iter_file_chunks(text_path or file_path, config):
+        documents.append(chunk.text)
+        metadatas.append({"source": filename, "domain": domain, "path": file_path, **chunk.metadata})
+        total += 1
+        if len(documents) >= settings.INGEST_BATCH_SIZE:
+            flush()
+    flush()
+    return total
+
+def remove_upload(file_path: str):
+    # A file that was not indexed must not stay listed by /documents; its extracted text
+    # (possibly partial) goes too, so a re-upload under the same name starts clean
+    for path in (file_path, cached_text_path(file_path)):
+        if os.path.exists(path):
+            os.remove(path)
+
 @router.post("/upload", response_model=UploadResponse)
 async def upload_document(
     file: UploadFile = File(...),
-    domain: str = Form(...)
+    domain: str = Form(...),
+    tenant: Tenant = Depends(get_tenant)
 ):
+    file_path = None
     try:
         # 1. Processing and Persistence
         # Ensure upload directory exists - Create domain specific folder
@@ -30,24 +72,17 @@ async def upload_document(
         with open(file_path, "wb") as buffer:
             shutil.copyfileobj(file.file, buffer)
             
-        # 2. Read File Content (for embedding)
-        # We can read from the saved file now, or just seek back the UploadFile if we didn't close it
-        # Since shutil.copyfileobj might consume the file, let's read from the saved file to be safe
-        with open(file_path, "rb") as f:
-            content = f.read()
+        # 2. Extract text (HTML/DOCX/PDF, in a process pool) then chunk and index it
+        # The text is streamed through the chunker in blocks, so large uploads are never
+        # held in memory at once. Runs in a worker thread to keep the event loop free;
+        # ingest slots are shared fairly between tenants.
+        content_type = resolve_content_type(file.filename, file.content_type)
+        async with ingest_scheduler.slot(tenant):
+            text_path = await extractor_pool.extract(file_path, content_type)
+            await run_in_threadpool(ingest_file, domain, file.filename, file_path, text_path)
 
         # 3. Track in DB - SKIPPED (Stateless)
         # db_document = await crud.create_document(db, file.filename, domain, file_path)
-        
-        # 4. Process Content for ChromaDB
-        text_content = content.decode("utf-8", errors="replace") # Simplified text extraction (improve for PDF/DOCX)
-        
-        # Simple chunking logic (can be improved)
-        chunks = [text_content[i:i+1000] for i in range(0, len(text_content), 1000)]
-        ids = [str(uuid.uuid4()) for _ in chunks]
-        metadatas = [{"source": file.filename, "domain": domain, "path": file_path} for _ in chunks]
-
-        vector_store.add_documents(domain, chunks, metadatas, ids)
 
         # Return dummy ID since we don't have a DB
         return UploadResponse(
@@ -60,8 +95,66 @@ async def upload_document(
         )
     
     except Exception as e:
+        if file_path:
+            await run_in_threadpool(remove_upload, file_path)
+        if isinstance(e, RateLimited):
+            raise
+        if isinstance(e, ExtractionError):
+            raise HTTPException(status_code=e.status_code, detail=str(e))
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/upload/bulk", response_model=BulkIngestJob, status_code=202)
+async def upload_bulk(
+    request: Request,
+    domain: str,
+    path: Optional[str] = None,
+    tenant: Tenant = Depends(get_tenant)
+):
+    """
+    Ingest many files as one background job. The request body is a zip or tar (optionally
+    compressed) archive, streamed to a temporary file rather than held in memory. Or pass
+    `path`, a server-local directory under BULK_INGEST_ALLOWED_DIRS, and no body.
+    Poll GET /upload/bulk/{job_id} for progress.
+    """
+    if domain in ("", ".", "..") or "/" in domain or "\\" in domain:
+        raise HTTPException(status_code=400, detail="Invalid domain name")
+    try:
+        if path:
+            source_dir = resolve_local_dir(path)
+            return jobs.start(BulkJob(domain), tenant, source_dir=source_dir).to_schema()
+
+        fd, archive_path = tempfile.mkstemp(prefix="bulk-", suffix=".archive")
+        try:
+            received = 0
+            buffer = bytearray()
+            with os.fdopen(fd, "wb") as f:
+                # Disk writes run in a thread, in ~1 MiB blocks, so they never stall the loop
+                async for block in request.stream():
+                    received += len(block)
+                    if received > settings.BULK_MAX_BYTES:
+                        raise BulkIngestError(f"Archive exceeds {settings.BULK_MAX_BYTES} bytes", 413)
+                    buffer += block
+                    if len(buffer) >= 1 << 20:
+                        await run_in_threadpool(f.write, bytes(buffer))
+                        buffer.clear()
+                if buffer:
+                    await run_in_threadpool(f.write, bytes(buffer))
+            await run_in_threadpool(check_archive, archive_path)
+        except BaseException:
+            os.remove(archive_path)
+            raise
+        # The job owns the archive from here and deletes it when done
+        return jobs.start(BulkJob(domain), tenant, archive_path=archive_path).to_schema()
+    except BulkIngestError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+@router.get("/upload/bulk/{job_id}", response_model=BulkIngestJob)
+async def bulk_job_status(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_schema()
+
 from typing import List
 from app.schemas import DocumentInfo
 import pathlib
@@ -83,6 +176,7 @@ async def list_documents():
 
     # Walk through directory
     for root, dirs, files in os.walk(upload_path):
+        dirs[:] = [d for d in dirs if not d.startswith(".")] # Skip hidden folders (bulk ingest staging)
         for file in files:
             if file.startswith("."): continue # Skip hidden files
             
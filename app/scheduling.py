@@ -0,0 +1,269 @@
+"""
+Per-tenant fair scheduling and token budgets.
+
+Callers identify themselves with an `X-API-Key` header that maps to a tenant in TENANTS;
+callers without a (known) key share the DEFAULT_TENANT. Generation and ingest each have a
+fixed number of slots shared by all tenants. When a scheduler is saturated, waiting
+requests are admitted in weighted fair order (start-time fair queuing: every admission
+advances the tenant's virtual clock by 1/weight) and never beyond a tenant's
+max_concurrency. Tokens-per-minute budgets are token buckets charged from upstream
+`usage` and streamed deltas (see llm_client); a tenant in debt is answered with 429.
+"""
+import asyncio
+import hashlib
+import math
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+from fastapi import Header, HTTPException
+
+from app.config import settings
+from app.metrics import metrics
+
+
+class RateLimited(Exception):
+    """Refused by a token budget (429) or timed out waiting for a slot (503)."""
+
+    def __init__(self, detail: str, status_code: int = 429, retry_after: float = 1.0):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    @property
+    def headers(self) -> dict:
+        return {"Retry-After": str(max(1, math.ceil(self.retry_after)))}
+
+
+class TokenBudget:
+    """
+    Token bucket holding up to `tokens_per_minute` tokens, refilled continuously.
+    Charges may push the balance below zero (usage is only known after generation);
+    new requests are admitted again once the debt has been refilled.
+    """
+
+    def __init__(self, tokens_per_minute: int, clock: Callable[[], float] = time.monotonic):
+        self.tokens_per_minute = tokens_per_minute
+        self._rate = tokens_per_minute / 60.0
+        self._clock = clock
+        self._balance = float(tokens_per_minute)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self._balance = min(self.tokens_per_minute, self._balance + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def available(self) -> float:
+        with self._lock:
+            self._refill()
+            return self._balance
+
+    def charge(self, tokens: float):
+        with self._lock:
+            self._refill()
+            # Negative charges refund over-estimated streamed tokens
+            self._balance = min(self.tokens_per_minute, self._balance - tokens)
+
+    def retry_after(self) -> float:
+        """Seconds until at least one token is available."""
+        with self._lock:
+            self._refill()
+            return max(0.0, (1 - self._balance) / self._rate)
+
+
+class Tenant:
+    def __init__(self, name: str, weight: float = 1.0, max_concurrency: int | None = None,
+                 tokens_per_minute: int | None = None, spec: dict | None = None):
+        self.name = name
+        self.weight = weight
+        self.max_concurrency = max_concurrency
+        self.budget = TokenBudget(tokens_per_minute) if tokens_per_minute else None
+        self.spec = spec
+
+    @classmethod
+    def from_spec(cls, name: str, spec: dict) -> "Tenant":
+        return cls(
+            name=name,
+            weight=float(spec.get("weight", 1.0)),
+            max_concurrency=spec.get("max_concurrency"),
+            tokens_per_minute=spec.get("tokens_per_minute"),
+            spec=spec,
+        )
+
+    def check_budget(self):
+        if self.budget and self.budget.available() < 1:
+            metrics.incr(f"tenant.{self.name}.rate_limited")
+            raise RateLimited(f"Token budget exceeded for tenant '{self.name}'", 429, self.budget.retry_after())
+
+    def charge(self, tokens: float):
+        # Streamed deltas are charged as they arrive; usage reconciles them at the end
+        if self.budget and tokens:
+            self.budget.charge(tokens)
+
+    def record_usage(self, prompt_tokens: int, completion_tokens: int, already_charged: float = 0):
+        self.charge(prompt_tokens + completion_tokens - already_charged)
+        metrics.incr(f"tenant.{self.name}.prompt_tokens", prompt_tokens)
+        metrics.incr(f"tenant.{self.name}.completion_tokens", completion_tokens)
+
+
+# Tenant of the request being handled; read by llm_client to charge upstream usage
+current_tenant: ContextVar[Optional[Tenant]] = ContextVar("current_tenant", default=None)
+
+
+class TenantRegistry:
+    """Resolves API keys to Tenant objects, which keep their budgets across requests."""
+
+    def __init__(self):
+        self._tenants: dict[str, Tenant] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, api_key: str | None) -> Tenant | None:
+        """Returns None for a missing or unknown key when REQUIRE_API_KEY is set."""
+        spec = settings.TENANTS.get(api_key) if api_key else None
+        if spec is not None:
+            # Never put the key itself into metric names
+            name = spec.get("name") or "key-" + hashlib.sha256(api_key.encode()).hexdigest()[:8]
+        elif settings.REQUIRE_API_KEY:
+            return None
+        else:
+            spec = settings.DEFAULT_TENANT
+            name = spec.get("name", "default")
+        with self._lock:
+            tenant = self._tenants.get(name)
+            if tenant is None or tenant.spec != spec:
+                tenant = self._tenants[name] = Tenant.from_spec(name, spec)
+            return tenant
+
+    def clear(self):
+        with self._lock:
+            self._tenants.clear()
+
+
+tenants = TenantRegistry()
+
+
+async def get_tenant(x_api_key: Optional[str] = Header(None)) -> Tenant:
+    """FastAPI dependency identifying the caller by its X-API-Key header."""
+    tenant = tenants.resolve(x_api_key)
+    if tenant is None:
+        raise HTTPException(status_code=401, detail="Invalid or missing API key")
+    return tenant
+
+
+class FairScheduler:
+    """
+    Weighted fair admission to `capacity` concurrent slots. Must be used from one event
+    loop; waiting requests give up with RateLimited(503) after `queue_timeout` seconds.
+    """
+
+    def __init__(self, name: str, capacity: int, queue_timeout: float | None = None):
+        self.name = name
+        self.capacity = capacity
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._vtime = 0.0
+        self._finish: dict[str, float] = {}  # virtual finish tag of each tenant's last admission
+        self._running: dict[str, int] = {}
+        self._waiting: dict[str, deque[asyncio.Future]] = {}
+        self._tenants: dict[str, Tenant] = {}
+
+    @property
+    def queued(self) -> int:
+        return sum(len(queue) for queue in self._waiting.values())
+
+    def _eligible(self, tenant: Tenant) -> bool:
+        cap = tenant.max_concurrency
+        return cap is None or self._running.get(tenant.name, 0) < cap
+
+    def _admit(self, tenant: Tenant):
+        start = max(self._finish.get(tenant.name, 0.0), self._vtime)
+        self._vtime = start
+        self._finish[tenant.name] = start + 1.0 / tenant.weight
+        self._running[tenant.name] = self._running.get(tenant.name, 0) + 1
+        self.active += 1
+
+    def _dispatch(self):
+        while self.active < self.capacity:
+            candidates = [
+                self._tenants[name] for name, queue in self._waiting.items()
+                if queue and self._eligible(self._tenants[name])
+            ]
+            if not candidates:
+                break
+            tenant = min(candidates, key=lambda t: max(self._finish.get(t.name, 0.0), self._vtime))
+            future = self._waiting[tenant.name].popleft()
+            if future.done():
+                continue  # cancelled while queued
+            self._admit(tenant)
+            future.set_result(None)
+
+    def _update_gauges(self):
+        metrics.set_gauge(f"scheduler.{self.name}.active", self.active)
+        metrics.set_gauge(f"scheduler.{self.name}.queued", self.queued)
+
+    async def acquire(self, tenant: Tenant) -> float:
+        """Waits for a slot; returns the time spent queued in seconds."""
+        self._tenants[tenant.name] = tenant
+        queue = self._waiting.setdefault(tenant.name, deque())
+        if not queue and self.active < self.capacity and self._eligible(tenant):
+            self._admit(tenant)
+            self._update_gauges()
+            return 0.0
+
+        future = asyncio.get_running_loop().create_future()
+        queue.append(future)
+        self._update_gauges()
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                self.release(tenant)  # admitted just as we gave up
+            else:
+                future.cancel()
+                if future in queue:
+                    queue.remove(future)
+                self._update_gauges()
+            if isinstance(e, asyncio.TimeoutError):
+                metrics.incr(f"tenant.{tenant.name}.{self.name}.timeouts")
+                raise RateLimited(f"Timed out waiting for a {self.name} slot", 503, retry_after=1.0) from None
+            raise
+        self._update_gauges()
+        return time.perf_counter() - start
+
+    def release(self, tenant: Tenant):
+        self.active -= 1
+        self._running[tenant.name] -= 1
+        self._dispatch()
+        self._update_gauges()
+
+    @asynccontextmanager
+    async def slot(self, tenant: Tenant, check_budget: bool = False):
+        """
+        Holds one slot for `tenant`, recording per-tenant queue wait and latency, and
+        marks it as the current tenant for usage accounting.
+        """
+        if check_budget:
+            tenant.check_budget()
+        wait = await self.acquire(tenant)
+        prefix = f"tenant.{tenant.name}.{self.name}"
+        metrics.incr(f"{prefix}.requests")
+        metrics.observe(f"{prefix}.queue_wait", wait)
+        token = current_tenant.set(tenant)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            current_tenant.reset(token)
+            metrics.observe(f"{prefix}.latency", time.perf_counter() - start)
+            self.release(tenant)
+
+
+generation_scheduler = FairScheduler("generation", settings.GENERATION_SLOTS, settings.QUEUE_TIMEOUT)
+ingest_scheduler = FairScheduler("ingest", settings.INGEST_SLOTS, settings.QUEUE_TIMEOUT)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Literal
 from datetime import datetime
 from uuid import UUID
 
@@ -20,12 +20,24 @@ class ChatRequest(BaseModel):
     presence_penalty: float = 0.0
     frequency_penalty: float = 0.0
     system_prompt: Optional[str] = None
+    session_id: Optional[str] = None # Routes the conversation to the same upstream replica
+    prompt_layout: Optional[Literal["legacy", "prefix_cache"]] = None # Defaults to PROMPT_LAYOUT
 
 class ChatResponse(BaseModel):
     response: str
     updated_summary: Optional[str] = None
     updated_history: List[Message] = []
 
+class BatchChatRequest(BaseModel):
+    requests: List[ChatRequest]
+    max_concurrency: Optional[int] = None # Capped at BATCH_MAX_CONCURRENCY
+
+class BatchChatItem(BaseModel):
+    # One NDJSON line of a /chat/batch response, emitted in completion order
+    index: int
+    response: Optional[ChatResponse] = None
+    error: Optional[str] = None
+
 
 class UploadResponse(BaseModel):
     id: int
@@ -35,6 +47,23 @@ class UploadResponse(BaseModel):
     created_at: datetime
     status: str
 
+class BulkIngestJob(BaseModel):
+    # Progress of a /upload/bulk job; rates are over the job's elapsed time so far
+    id: str
+    domain: str
+    status: Literal["unpacking", "ingesting", "completed", "failed"]
+    created_at: datetime
+    files_total: int = 0 # Files unpacked so far
+    files_done: int = 0
+    files_failed: int = 0
+    chunks_indexed: int = 0
+    chunks_failed: int = 0
+    bytes_total: int = 0
+    elapsed_seconds: float = 0.0
+    files_per_second: float = 0.0
+    chunks_per_second: float = 0.0
+    errors: List[str] = []
+
 class DocumentInfo(BaseModel):
     filename: str
     domain: str
@@ -0,0 +1,109 @@
+import asyncio
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+from app.config import settings
+from app.metrics import metrics
+
+# Rolling summaries are deterministic enough to memoize: retries, regenerations and
+# several tabs on one conversation send the same (previous summary, message span) again.
+# The cache also remembers which messages each summary covers, so a client that sends
+# its full history together with a summary only pays for the messages not yet summarized.
+
+
+def _digest(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode()).hexdigest()
+
+
+def message_digest(role: str, content: str) -> str:
+    return _digest(role, content)[:16]
+
+
+class SummaryCache:
+    def __init__(self, max_entries: int = 1024, max_coverage: int = 1000):
+        self.max_entries = max_entries
+        self.max_coverage = max_coverage
+        self._summaries: OrderedDict[str, str] = OrderedDict()  # key -> summary
+        self._coverage: OrderedDict[str, list[str]] = OrderedDict()  # summary digest -> message digests
+        self._inflight: dict[str, asyncio.Task] = {}
+
+    @staticmethod
+    def context(model: str, prompt: str, max_tokens: int) -> str:
+        """How summaries are produced; summaries and coverage are only reused within one context."""
+        return _digest(model, prompt, max_tokens)[:16]
+
+    @staticmethod
+    def key(previous_summary: str | None, digests: list[str], context: str) -> str:
+        return _digest(previous_summary, digests, context)
+
+    def _remember(self, store: OrderedDict, key: str, value):
+        store[key] = value
+        store.move_to_end(key)
+        while len(store) > self.max_entries:
+            store.popitem(last=False)
+
+    def get(self, key: str) -> str | None:
+        summary = self._summaries.get(key)
+        if summary is not None:
+            self._summaries.move_to_end(key)
+        return summary
+
+    def coverage(self, summary: str | None, context: str = "") -> list[str]:
+        """Digests of the messages (oldest first) folded into `summary`, if we produced it in `context`."""
+        if not summary:
+            return []
+        return self._coverage.get(_digest(context, summary), [])
+
+    def covered_prefix(self, summary: str | None, digests: list[str], context: str = "") -> int:
+        """Number of leading messages in `digests` that `summary` already covers."""
+        covered = self.coverage(summary, context)
+        if not covered or not digests:
+            return 0
+        # The client history may start anywhere inside the covered span; it must then
+        # match the covered span all the way to its end.
+        for start, digest in enumerate(covered):
+            if digest == digests[0]:
+                tail = covered[start:]
+                if digests[:len(tail)] == tail:
+                    return len(tail)
+        return 0
+
+    def put(self, key: str, summary: str, coverage: list[str], context: str = ""):
+        self._remember(self._summaries, key, summary)
+        self._remember(self._coverage, _digest(context, summary), coverage[-self.max_coverage:])
+        metrics.set_gauge("summary.cache_entries", len(self._summaries))
+
+    async def get_or_compute(self, key: str, coverage: list[str],
+                             compute: Callable[[], Awaitable[str]], context: str = "") -> tuple[str, bool]:
+        """
+        Returns (summary, cached). Concurrent identical requests share one upstream call,
+        which keeps running (and fills the cache) even if the caller goes away.
+        """
+        summary = self.get(key)
+        if summary is not None:
+            return summary, True
+        task = self._inflight.get(key)
+        if task is not None:
+            return await asyncio.shield(task), True
+
+        async def run() -> str:
+            try:
+                summary = await compute()
+                self.put(key, summary, coverage, context)
+                return summary
+            finally:
+                self._inflight.pop(key, None)
+
+        task = asyncio.ensure_future(run())
+        self._inflight[key] = task
+        return await asyncio.shield(task), False
+
+    def clear(self):
+        self._summaries.clear()
+        self._coverage.clear()
+        self._inflight.clear()
+
+
+summary_cache = SummaryCache(settings.SUMMARY_CACHE_SIZE)
@@ -1,20 +1,63 @@
-import chromadb
-from chromadb.config import Settings
+import threading
+import time
 from app.config import settings
 
 class VectorStore:
     def __init__(self):
+        # Construction is cheap: chromadb is imported, the client created and the embedding
+        # model loaded on first use (or ahead of time by warmup() from the app lifespan).
+        self._client = None
+        self._collection = None
+        self._embedding_function = None
+        self._lock = threading.Lock()
+        self.ready = False
+        self.warmup_seconds: float | None = None
+        self.warmup_error: str | None = None
+
+    def _initialize(self):
+        import chromadb
+        from chromadb.config import Settings
+        from chromadb.utils import embedding_functions
+
+        self._embedding_function = embedding_functions.DefaultEmbeddingFunction()
         # Use EphemeralClient for in-memory, non-persisted vector store
-        self.client = chromadb.EphemeralClient(
+        self._client = chromadb.EphemeralClient(
             settings=Settings(anonymized_telemetry=False)
         )
-        self.collection = self.client.get_or_create_collection(name="knowledge_base")
+        self._collection = self._client.get_or_create_collection(
+            name="knowledge_base",
+            embedding_function=self._embedding_function,
+        )
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            with self._lock:
+                if self._collection is None:
+                    self._initialize()
+        return self._collection
+
+    def embed(self, texts: list[str]) -> list:
+        self.collection  # ensure the embedding function exists
+        return self._embedding_function(texts)
+
+    def warmup(self):
+        """Create the client and load the embedding model and tokenizer by embedding a sample."""
+        start = time.perf_counter()
+        try:
+            self.embed(["warmup"])
+        except Exception as e:
+            self.warmup_error = str(e)
+            raise
+        self.warmup_seconds = time.perf_counter() - start
+        self.warmup_error = None
+        self.ready = True
 
     def add_documents(self, domain_name: str, documents: list[str], metadatas: list[dict], ids: list[str]):
         # Ensure metadata contains domain
         for meta in metadatas:
             meta["domain"] = domain_name
-            
+
         self.collection.add(
             documents=documents,
             metadatas=metadatas,
@@ -26,7 +69,7 @@ class VectorStore:
             where_filter = None
             if domain_name and domain_name.lower() != "all":
                 where_filter = {"domain": domain_name}
-                
+
             results = self.collection.query(
                 query_texts=[query_text],
                 n_results=n_results,
@@ -37,4 +80,32 @@ class VectorStore:
             print(f"Error querying ChromaDB: {e}")
             return []
 
+    def query_candidates(self, domain_name: str | None, query_embeddings: list, n_results: int) -> list[list[dict]]:
+        """
+        Nearest neighbours for precomputed query embeddings, including the stored embeddings
+        so callers can post-process (e.g. MMR) without re-embedding. One list per query.
+        """
+        where_filter = None
+        if domain_name and domain_name.lower() != "all":
+            where_filter = {"domain": domain_name}
+
+        results = self.collection.query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            where=where_filter,
+            include=["documents", "embeddings", "distances", "metadatas"],
+        )
+        candidates = []
+        for i in range(len(query_embeddings)):
+            candidates.append([
+                {
+                    "document": document,
+                    "embedding": results["embeddings"][i][j],
+                    "distance": results["distances"][i][j],
+                    "metadata": results["metadatas"][i][j],
+                }
+                for j, document in enumerate(results["documents"][i])
+            ])
+        return candidates
+
 vector_store = VectorStore()
@@ -0,0 +1,76 @@
+"""
+Chunking throughput benchmark.
+
+    python -m benchmarks.chunking                 # synthetic corpus
+    python -m benchmarks.chunking --file big.txt  # real document
+"""
+import argparse
+import json
+import random
+import time
+
+from app.chunking import STRATEGIES, ChunkingConfig, iter_chunks
+
+WORDS = "the quick brown fox jumps over lazy dog retrieval vector embedding model context token".split()
+
+
+def synthetic_corpus(size_mb: float, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    parts = []
+    total = 0
+    target = int(size_mb * 1024 * 1024)
+    while total < target:
+        sentence = " ".join(rng.choices(WORDS, k=rng.randint(5, 25))).capitalize() + ". "
+        if rng.random() < 0.1:
+            sentence += "\n\n"
+        parts.append(sentence)
+        total += len(sentence)
+    return "".join(parts)
+
+
+def blocks(text: str, block_size: int):
+    for i in range(0, len(text), block_size):
+        yield text[i:i + block_size]
+
+
+def run(text: str, chunk_size: int, chunk_overlap: int, token_chunk_size: int, block_size: int) -> list[dict]:
+    results = []
+    for strategy in STRATEGIES:
+        size = token_chunk_size if strategy == "token" else chunk_size
+        overlap = min(chunk_overlap, size // 4) if strategy == "token" else chunk_overlap
+        config = ChunkingConfig(strategy=strategy, chunk_size=size, chunk_overlap=overlap)
+        start = time.perf_counter()
+        count = sum(1 for _ in iter_chunks(blocks(text, block_size), config))
+        elapsed = time.perf_counter() - start
+        results.append({
+            **config.metadata(),
+            "chunks": count,
+            "seconds": round(elapsed, 4),
+            "mb_per_second": round(len(text) / (1024 * 1024) / elapsed, 2),
+            "chunks_per_second": round(count / elapsed, 1),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure chunking throughput per strategy")
+    parser.add_argument("--file", help="Text file to chunk (default: synthetic corpus)")
+    parser.add_argument("--size-mb", type=float, default=5.0, help="Synthetic corpus size")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=150)
+    parser.add_argument("--token-chunk-size", type=int, default=256)
+    parser.add_argument("--block-size", type=int, default=64 * 1024)
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, encoding="utf-8", errors="replace") as f:
+            text = f.read()
+    else:
+        text = synthetic_corpus(args.size_mb)
+
+    results = run(text, args.chunk_size, args.chunk_overlap, args.token_chunk_size, args.block_size)
+    print(json.dumps({"benchmark": "chunking", "input_chars": len(text), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
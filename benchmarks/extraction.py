@@ -0,0 +1,152 @@
+"""
+Text extraction throughput benchmark.
+
+Parses synthetic HTML, DOCX and PDF files (PDF requires pypdf) inline in this process,
+one file at a time, and through the extraction process pool, and reports files/s and MB/s.
+
+    python -m benchmarks.extraction --files 40 --paragraphs 200 --workers 4
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import tempfile
+import time
+import zipfile
+from xml.sax.saxutils import escape
+
+from app.extraction import DOCX, EXTRACTORS, HTML, PDF, ExtractorPool, cached_text_path, extract_to_file
+
+WORDS = "the quick brown fox jumps over lazy dog retrieval vector embedding model context token".split()
+
+
+def paragraphs(count: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    return [" ".join(rng.choices(WORDS, k=rng.randint(20, 60))).capitalize() + "." for _ in range(count)]
+
+
+def make_html(texts: list[str]) -> bytes:
+    body = "".join(f"<h2>Section {i}</h2>\n<p>{escape(t)}</p>\n" for i, t in enumerate(texts))
+    return f"<html><head><title>Doc</title><style>p {{}}</style></head><body>{body}</body></html>".encode()
+
+
+def make_docx(texts: list[str]) -> bytes:
+    ns = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+    body = "".join(f"<w:p><w:r><w:t>{escape(t)}</w:t></w:r></w:p>" for t in texts)
+    document = f'<?xml version="1.0" encoding="UTF-8"?><w:document xmlns:w="{ns}"><w:body>{body}</w:body></w:document>'
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", '<?xml version="1.0"?><Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types"/>')
+        archive.writestr("word/document.xml", document)
+    return buffer.getvalue()
+
+
+def make_pdf(texts: list[str], lines_per_page: int = 40) -> bytes:
+    """Minimal valid PDF (Helvetica, one text line per paragraph)."""
+    pages = [texts[i:i + lines_per_page] for i in range(0, len(texts), lines_per_page)] or [[]]
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for lines in pages:
+        ops = ["BT /F1 10 Tf 40 780 Td 12 TL"]
+        for line in lines:
+            ops.append("(" + line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ") '")
+        ops.append("ET")
+        stream = "\n".join(ops)
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {len(objects)} 0 R "
+                       f"/Resources << /Font << /F1 3 0 R >> >> >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1"))
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+    for offset in offsets:
+        out.write(f"{offset:010d} 00000 n \n".encode())
+    out.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+    return out.getvalue()
+
+
+FORMATS = {HTML: (".html", make_html), DOCX: (".docx", make_docx), PDF: (".pdf", make_pdf)}
+
+
+def _clear_cache(paths: list[str]):
+    for path in paths:
+        cache = cached_text_path(path)
+        if os.path.exists(cache):
+            os.remove(cache)
+
+
+def _result(content_type: str, mode: str, paths: list[str], elapsed: float) -> dict:
+    size = sum(os.path.getsize(p) for p in paths)
+    return {
+        "content_type": content_type,
+        "mode": mode,
+        "files": len(paths),
+        "seconds": round(elapsed, 4),
+        "files_per_second": round(len(paths) / elapsed, 1),
+        "mb_per_second": round(size / (1024 * 1024) / elapsed, 2),
+    }
+
+
+async def _run_pool(pool: ExtractorPool, content_type: str, paths: list[str]):
+    await asyncio.gather(*(pool.extract(path, content_type) for path in paths))
+
+
+def run(directory: str, files: int, n_paragraphs: int, workers: int) -> list[dict]:
+    texts = paragraphs(n_paragraphs)
+    pool = ExtractorPool(workers=workers)
+    results = []
+    try:
+        # Start the workers before timing
+        warm = os.path.join(directory, "warm.html")
+        with open(warm, "wb") as f:
+            f.write(make_html(texts[:1]))
+        asyncio.run(_run_pool(pool, HTML, [warm]))
+
+        for content_type, (extension, make) in FORMATS.items():
+            data = make(texts)
+            paths = []
+            for i in range(files):
+                path = os.path.join(directory, f"doc{i}{extension}")
+                with open(path, "wb") as f:
+                    f.write(data)
+                paths.append(path)
+            try:
+                start = time.perf_counter()
+                for path in paths:
+                    extract_to_file(content_type, path, cached_text_path(path))
+                results.append(_result(content_type, "inline", paths, time.perf_counter() - start))
+            except Exception as e:
+                results.append({"content_type": content_type, "error": str(e)})
+                continue
+            _clear_cache(paths)
+            start = time.perf_counter()
+            asyncio.run(_run_pool(pool, content_type, paths))
+            results.append(_result(content_type, f"pool[{pool.workers}]", paths, time.perf_counter() - start))
+    finally:
+        pool.shutdown()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure text extraction throughput per format")
+    parser.add_argument("--files", type=int, default=20, help="Files per format")
+    parser.add_argument("--paragraphs", type=int, default=200, help="Paragraphs per file")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        results = run(directory, args.files, args.paragraphs, args.workers)
+    print(json.dumps({"extractors": sorted(EXTRACTORS), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Fake OpenAI-compatible server for offline benchmarks and tests.
+
+Implements /v1/chat/completions (streaming and non-streaming) and /v1/models with
+configurable time-to-first-token, generation speed and error rate. It also simulates a
+prefix cache at whole-message granularity, so `usage.prompt_tokens_details.cached_tokens`
+reflects how much of each prompt repeats a previously seen prefix.
+
+    python -m benchmarks.fake_openai --port 9100 --ttft 0.2 --tokens-per-second 50 --error-rate 0.01
+    OPENAI_BASE_URL=http://127.0.0.1:9100/v1 OPENAI_API_KEY=fake uvicorn app.main:app
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+import uuid
+from collections import OrderedDict
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from app.chunking import count_tokens
+
+WORDS = "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor".split()
+
+
+def create_app(ttft: float = 0.1, tokens_per_second: float = 50.0, completion_tokens: int = 64,
+               error_rate: float = 0.0, seed: int | None = None, prefix_cache_size: int = 10000) -> FastAPI:
+    app = FastAPI(title="Fake OpenAI")
+    rng = random.Random(seed)
+    app.state.requests = 0
+    prefixes: OrderedDict[str, None] = OrderedDict()
+
+    def cached_prefix_tokens(messages: list[dict]) -> int:
+        # Longest run of leading messages seen in an earlier prompt counts as cached
+        cached, counted, digest = 0, 0, hashlib.sha256()
+        for message in messages:
+            digest.update(json.dumps([message.get("role"), message.get("content")]).encode())
+            key = digest.hexdigest()
+            tokens = count_tokens(str(message.get("content") or ""))
+            if key in prefixes and counted == cached:
+                cached += tokens
+                prefixes.move_to_end(key)
+            else:
+                prefixes[key] = None
+            counted += tokens
+        while len(prefixes) > prefix_cache_size:
+            prefixes.popitem(last=False)
+        return cached
+
+    def error_response():
+        return JSONResponse(status_code=500, content={
+            "error": {"message": "Injected failure", "type": "server_error", "code": "fake_error"}
+        })
+
+    @app.get("/v1/models")
+    async def list_models():
+        return {"object": "list", "data": [{"id": "fake-model", "object": "model", "owned_by": "fake"}]}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.requests += 1
+        if rng.random() < error_rate:
+            await asyncio.sleep(ttft)
+            return error_response()
+
+        model = body.get("model") or "fake-model"
+        messages = body.get("messages", [])
+        prompt_tokens = sum(count_tokens(str(m.get("content") or "")) for m in messages)
+        cached_tokens = cached_prefix_tokens(messages) if prefix_cache_size else 0
+        n_tokens = min(body.get("max_tokens") or completion_tokens, completion_tokens)
+        tokens = [WORDS[i % len(WORDS)] + " " for i in range(n_tokens)]
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": n_tokens,
+            "total_tokens": prompt_tokens + n_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens},
+        }
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        interval = 1.0 / tokens_per_second if tokens_per_second > 0 else 0.0
+
+        if not body.get("stream"):
+            await asyncio.sleep(ttft + interval * max(n_tokens - 1, 0))
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            }
+
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+        def chunk(delta: dict, finish_reason=None, **extra) -> str:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                **extra,
+            }
+            return f"data: {json.dumps(payload)}\n\n"
+
+        async def stream():
+            await asyncio.sleep(ttft)
+            yield chunk({"role": "assistant", "content": ""})
+            for i, token in enumerate(tokens):
+                if i:
+                    await asyncio.sleep(interval)
+                yield chunk({"content": token})
+            yield chunk({}, finish_reason="stop")
+            if include_usage:
+                payload = {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                           "model": model, "choices": [], "usage": usage}
+                yield f"data: {json.dumps(payload)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--ttft", type=float, default=0.1, help="Seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--completion-tokens", type=int, default=64)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 500")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--prefix-cache-size", type=int, default=10000, help="Simulated prefix cache entries (0 disables)")
+    args = parser.parse_args()
+
+    import uvicorn
+    app = create_app(args.ttft, args.tokens_per_second, args.completion_tokens, args.error_rate, args.seed,
+                     args.prefix_cache_size)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
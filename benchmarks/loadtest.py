@@ -0,0 +1,383 @@
+"""
+End-to-end load test for /chat, /ws/chat and /upload.
+
+By default starts a fake OpenAI server (benchmarks/fake_openai.py) and the app as
+subprocesses on free local ports, so it runs fully offline:
+
+    python -m benchmarks.loadtest --requests 200 --concurrency 16 --output results.json
+    python -m benchmarks.loadtest --baseline results.json   # exit code 1 on regression
+
+Use --target http://host:8000 to drive an already running deployment instead.
+Note: /upload embeds documents, which needs the embedding model in the local cache
+(the Docker image pre-downloads it); without it uploads are reported as errors.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+
+from app.metrics import percentile
+
+SCENARIOS = ("chat", "ws", "upload")
+
+CHAT_PAYLOAD = {"message": "Summarize the benchmark setup in one sentence.", "domain": "none"}
+
+
+def rss_bytes(pid: int) -> int | None:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+class RssSampler:
+    """Polls the resident set size of a process in a background thread."""
+
+    def __init__(self, pid: int | None, interval: float = 0.2):
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self.last = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.sample()
+            self._stop.wait(self.interval)
+
+    def sample(self):
+        if self.pid is None:
+            return
+        value = rss_bytes(self.pid)
+        if value:
+            self.last = value
+            self.peak = max(self.peak, value)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+
+    def report(self) -> dict | None:
+        if not self.peak:
+            return None
+        return {"peak_mb": round(self.peak / 2**20, 1), "end_mb": round(self.last / 2**20, 1)}
+
+
+def distribution(samples: list[float]) -> dict | None:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return {
+        "p50_ms": round(percentile(ordered, 50) * 1000, 2),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 2),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 2),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
+
+
+class ScenarioStats:
+    def __init__(self, name: str, concurrency: int):
+        self.name = name
+        self.concurrency = concurrency
+        self.latencies: list[float] = []
+        self.ttfts: list[float] = []
+        self.errors = 0
+        self.tokens = 0
+        self.elapsed = 0.0
+        self.error_samples: list[str] = []
+
+    def error(self, message: str):
+        self.errors += 1
+        if len(self.error_samples) < 5:
+            self.error_samples.append(message)
+
+    def report(self) -> dict:
+        total = len(self.latencies) + self.errors
+        report = {
+            "requests": total,
+            "errors": self.errors,
+            "error_rate": round(self.errors / total, 4) if total else 0.0,
+            "concurrency": self.concurrency,
+            "elapsed_s": round(self.elapsed, 3),
+            "throughput_rps": round(len(self.latencies) / self.elapsed, 2) if self.elapsed else 0.0,
+            "latency": distribution(self.latencies),
+        }
+        if self.ttfts:
+            report["ttft"] = distribution(self.ttfts)
+        if self.tokens:
+            report["tokens_per_s"] = round(self.tokens / self.elapsed, 2)
+        if self.error_samples:
+            report["error_samples"] = self.error_samples
+        return report
+
+
+async def run_scenario(stats: ScenarioStats, requests: int, one_request):
+    queue: asyncio.Queue[int] = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(i)
+
+    async def worker():
+        while not queue.empty():
+            i = queue.get_nowait()
+            try:
+                await one_request(i)
+            except Exception as e:
+                stats.error(f"{type(e).__name__}: {e}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(stats.concurrency)))
+    stats.elapsed = time.perf_counter() - start
+    return stats
+
+
+async def chat_scenario(base_url: str, requests: int, concurrency: int) -> ScenarioStats:
+    stats = ScenarioStats("chat", concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        async def one(_):
+            start = time.perf_counter()
+            response = await client.post("/api/v1/chat", json=CHAT_PAYLOAD)
+            if response.status_code != 200:
+                stats.error(f"HTTP {response.status_code}: {response.text[:200]}")
+                return
+            stats.latencies.append(time.perf_counter() - start)
+        return await run_scenario(stats, requests, one)
+
+
+async def ws_scenario(base_url: str, requests: int, concurrency: int) -> ScenarioStats:
+    import websockets
+
+    stats = ScenarioStats("ws", concurrency)
+    uri = base_url.replace("http", "ws", 1) + "/api/v1/ws/chat"
+
+    async def one(_):
+        start = time.perf_counter()
+        first_token = None
+        async with websockets.connect(uri) as websocket:
+            await websocket.send(json.dumps(CHAT_PAYLOAD))
+            while True:
+                data = json.loads(await websocket.recv())
+                if "content" in data:
+                    if first_token is None:
+                        first_token = time.perf_counter() - start
+                    stats.tokens += 1
+                elif "metadata" in data:
+                    break
+                elif "error" in data:
+                    stats.error(data["error"])
+                    return
+        stats.latencies.append(time.perf_counter() - start)
+        if first_token is not None:
+            stats.ttfts.append(first_token)
+
+    return await run_scenario(stats, requests, one)
+
+
+async def upload_scenario(base_url: str, requests: int, concurrency: int, size_kb: int) -> ScenarioStats:
+    stats = ScenarioStats("upload", concurrency)
+    sentence = b"The load test uploads synthetic documents to measure ingest latency. "
+    content = (sentence * (size_kb * 1024 // len(sentence) + 1))[:size_kb * 1024]
+    async with httpx.AsyncClient(base_url=base_url, timeout=300) as client:
+        async def one(i):
+            start = time.perf_counter()
+            response = await client.post(
+                "/api/v1/upload",
+                files={"file": (f"loadtest-{i}.txt", content, "text/plain")},
+                data={"domain": "loadtest"},
+            )
+            if response.status_code != 200:
+                stats.error(f"HTTP {response.status_code}: {response.text[:200]}")
+                return
+            stats.latencies.append(time.perf_counter() - start)
+        return await run_scenario(stats, requests, one)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url: str, timeout: float = 60.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(url, timeout=1).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+
+def start_stack(args, upload_dir: str) -> tuple[list[subprocess.Popen], str, int]:
+    """Start the fake upstream and the app. Returns (processes, app base URL, app pid)."""
+    fake_port, app_port = free_port(), free_port()
+    fake = subprocess.Popen([
+        sys.executable, "-m", "benchmarks.fake_openai", "--port", str(fake_port),
+        "--ttft", str(args.ttft), "--tokens-per-second", str(args.tokens_per_second),
+        "--completion-tokens", str(args.completion_tokens), "--error-rate", str(args.error_rate),
+    ])
+    env = {
+        **os.environ,
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{fake_port}/v1",
+        "OPENAI_API_KEY": "fake",
+        "MODEL_NAME": "fake-model",
+        "UPLOAD_DIR": upload_dir,
+        "WARMUP_ON_STARTUP": "false",
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(app_port),
+         "--log-level", "warning"],
+        env=env,
+    )
+    processes = [fake, server]
+    try:
+        wait_for(f"http://127.0.0.1:{fake_port}/v1/models")
+        wait_for(f"http://127.0.0.1:{app_port}/")
+    except Exception:
+        stop_stack(processes)
+        raise
+    return processes, f"http://127.0.0.1:{app_port}", server.pid
+
+
+def stop_stack(processes: list[subprocess.Popen]):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+# (metric path, higher_is_better)
+COMPARED_METRICS = [
+    (("latency", "p50_ms"), False),
+    (("latency", "p95_ms"), False),
+    (("latency", "p99_ms"), False),
+    (("ttft", "p95_ms"), False),
+    (("throughput_rps",), True),
+]
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[dict]:
+    """Return metrics that regressed by more than `tolerance` (a fraction) against the baseline."""
+    regressions = []
+    for name, current in results.get("scenarios", {}).items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        for path, higher_is_better in COMPARED_METRICS:
+            old, new = previous, current
+            for key in path:
+                old = old.get(key) if isinstance(old, dict) else None
+                new = new.get(key) if isinstance(new, dict) else None
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append({
+                    "scenario": name, "metric": ".".join(path),
+                    "baseline": old, "current": new, "change_pct": round(change * 100, 1),
+                })
+        if current.get("error_rate", 0) > previous.get("error_rate", 0) + tolerance / 10:
+            regressions.append({
+                "scenario": name, "metric": "error_rate",
+                "baseline": previous.get("error_rate", 0), "current": current["error_rate"],
+            })
+    return regressions
+
+
+async def run(args, base_url: str, pid: int | None) -> dict:
+    scenarios = {}
+    with RssSampler(pid) as rss:
+        for name in args.scenarios:
+            if name == "chat":
+                stats = await chat_scenario(base_url, args.requests, args.concurrency)
+            elif name == "ws":
+                stats = await ws_scenario(base_url, args.requests, args.concurrency)
+            else:
+                stats = await upload_scenario(base_url, args.upload_requests, args.concurrency, args.upload_size_kb)
+            scenarios[name] = stats.report()
+    return {
+        "benchmark": "loadtest",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": {
+            "target": args.target or "local",
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "ttft": args.ttft,
+            "tokens_per_second": args.tokens_per_second,
+            "completion_tokens": args.completion_tokens,
+            "error_rate": args.error_rate,
+        },
+        "scenarios": scenarios,
+        "rss": rss.report(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test /chat, /ws/chat and /upload")
+    parser.add_argument("--target", help="Base URL of a running app (default: start a local stack)")
+    parser.add_argument("--pid", type=int, help="Server pid to sample RSS from when using --target")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        type=lambda s: [x for x in s.split(",") if x in SCENARIOS])
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--upload-requests", type=int, default=20)
+    parser.add_argument("--upload-size-kb", type=int, default=64)
+    parser.add_argument("--ttft", type=float, default=0.1, help="Fake upstream time to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=100.0)
+    parser.add_argument("--completion-tokens", type=int, default=32)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--output", help="Write results JSON to this file")
+    parser.add_argument("--baseline", help="Compare against a previous results JSON")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed regression as a fraction")
+    args = parser.parse_args()
+
+    processes = []
+    with tempfile.TemporaryDirectory() as upload_dir:
+        if args.target:
+            base_url, pid = args.target.rstrip("/"), args.pid
+        else:
+            processes, base_url, pid = start_stack(args, upload_dir)
+        try:
+            results = asyncio.run(run(args, base_url, pid))
+        finally:
+            stop_stack(processes)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            results["regressions"] = compare(results, json.load(f), args.tolerance)
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    if results.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
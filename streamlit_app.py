@@ -1,16 +1,19 @@
 import streamlit as st
-import requests
-import json
-import asyncio
-import websockets
-from datetime import datetime
+from agent_client import AgentClient, AgentClientError
 
 # Page config
 st.set_page_config(page_title="AI Agent Chat", page_icon="🤖", layout="wide")
 
 # Constants
-API_BASE_URL = "http://localhost:8000/api/v1"
-WS_BASE_URL = "ws://localhost:8000/api/v1"
+API_URL = "http://localhost:8000"
+
+@st.cache_resource
+def get_client() -> AgentClient:
+    # One client per Streamlit server: pooled HTTP connections, reused WebSockets
+    # and a cached domain list across reruns
+    return AgentClient(API_URL, domains_ttl=30)
+
+client = get_client()
 
 # Initialize session state
 if "messages" not in st.session_state:
@@ -19,6 +22,8 @@ if "summary" not in st.session_state:
     st.session_state.summary = None
 if "history_for_api" not in st.session_state:
     st.session_state.history_for_api = []
+if "session_id" not in st.session_state:
+    st.session_state.session_id = None  # Set by the first reply; keeps the chat on one upstream replica
 if "page" not in st.session_state:
     st.session_state.page = "chat"
 
@@ -28,16 +33,11 @@ def navigate_to(page):
 
 # --- CHAT PAGE ---
 if st.session_state.page == "chat":
-    # Fetc available domains for selection
+    # Fetch available domains for selection (cached by the client)
     available_domains = ["No Context", "All"]
     try:
-        response = requests.get(f"{API_BASE_URL}/documents")
-        if response.status_code == 200:
-            documents = response.json()
-            if documents:
-                domains = set(doc['domain'] for doc in documents)
-                available_domains.extend(sorted(list(domains)))
-    except:
+        available_domains.extend(client.domains())
+    except Exception:
         pass
 
     # Sidebar settings
@@ -74,6 +74,7 @@ if st.session_state.page == "chat":
             st.session_state.messages = []
             st.session_state.summary = None
             st.session_state.history_for_api = []
+            st.session_state.session_id = None
             st.rerun()
 
         st.markdown("---")
@@ -103,11 +104,8 @@ if st.session_state.page == "chat":
         with st.chat_message("user"):
             st.markdown(prompt)
 
-        # Prepare payload
-        payload = {
-            "message": prompt,
-            "messages": st.session_state.history_for_api, # Send previous history
-            "summary": st.session_state.summary,
+        # Prepare request parameters (None values are dropped by the client)
+        params = {
             "domain": api_domain,
             "model": model_name,
             "system_prompt": system_prompt if system_prompt else None,
@@ -116,96 +114,49 @@ if st.session_state.page == "chat":
             "max_tokens": max_tokens if max_tokens and max_tokens > 0 else None,
             "presence_penalty": presence_penalty,
             "frequency_penalty": frequency_penalty,
-            "stream": enable_streaming # API ignores this for WS, POST ignores it too now
         }
-        
-        # Filter out None values
-        payload = {k: v for k, v in payload.items() if v is not None}
 
         with st.chat_message("assistant"):
             message_placeholder = st.empty()
             full_response = ""
+            result = None
 
-            if enable_streaming:
-                async def run_websocket():
-                    uri = f"{WS_BASE_URL}/ws/chat"
+            try:
+                if enable_streaming:
+                    # Streams over a pooled WebSocket connection
+                    stream = client.stream_chat(
+                        prompt, messages=st.session_state.history_for_api, summary=st.session_state.summary,
+                        session_id=st.session_state.session_id, **params
+                    )
                     current_text = ""
-                    try:
-                        async with websockets.connect(uri) as websocket:
-                            await websocket.send(json.dumps(payload))
-                            
-                            while True:
-                                try:
-                                    response = await websocket.recv()
-                                    data = json.loads(response)
-                                    
-                                    if "content" in data:
-                                        content = data["content"]
-                                        current_text += content
-                                        message_placeholder.markdown(current_text + "▌")
-                                    
-                                    elif "metadata" in data:
-                                        message_placeholder.markdown(current_text)
-                                        return current_text, data["metadata"]
-                                    
-                                    elif "error" in data:
-                                        st.error(f"Error: {data['error']}")
-                                        return None, None
-                                        
-                                except websockets.exceptions.ConnectionClosed:
-                                    break
-                    except Exception as e:
-                        st.error(f"Connection failed: {e}")
-                        return None, None
-                    return current_text, None
-
-                # Run async loop
-                result_text, metadata = asyncio.run(run_websocket())
-                
-                if result_text:
-                    full_response = result_text
-                    # Update state from metadata if available
-                    if metadata:
-                        new_summary = metadata.get("updated_summary")
-                        if new_summary and new_summary != st.session_state.summary:
-                            st.session_state.summary = new_summary
-                            st.toast("Conversation summarized!", icon="📝")
-                        # We could update history from API, but for UI consistency let's just append our local assistant msg
-                        # Actually, API returns the FULL updated history including the new assistant message.
-                        # It's safer to use that for the next request context.
-                        api_history = metadata.get("updated_history", [])
-                        # Convert dicts back to clean format if needed, primarily we just need the list of dicts/objects
-                        # Pydantic models dump to dicts in api response
-                        
-                        # We need to construct the list of Message objects (or dicts matching schema) for the next call
-                        # The schemas.Message has 'role' and 'content'.
-                        # api_history is list of dicts.
-                        st.session_state.history_for_api = []
-                        for msg in api_history:
-                            st.session_state.history_for_api.append({"role": msg["role"], "content": msg["content"]})
-            
-            else:
-                # Non-streaming HTTP
-                try:
-                    response = requests.post(f"{API_BASE_URL}/chat", json=payload)
-                    response.raise_for_status()
-                    data = response.json()
-                    
-                    full_response = data["response"]
-                    message_placeholder.markdown(full_response)
-                    
-                    # Update state
-                    new_summary = data.get("updated_summary")
-                    if new_summary and new_summary != st.session_state.summary:
-                         st.session_state.summary = new_summary
-                         st.toast("Conversation summarized!", icon="📝")
-                    api_history = data.get("updated_history", [])
-                    st.session_state.history_for_api = []
-                    for msg in api_history:
-                         st.session_state.history_for_api.append({"role": msg["role"], "content": msg["content"]})
-
-                except Exception as e:
-                     st.error(f"API Error: {e}")
+                    for content in stream:
+                        current_text += content
+                        message_placeholder.markdown(current_text + "▌")
+                    message_placeholder.markdown(current_text)
+                    result = stream.result
+                else:
+                    # Non-streaming HTTP
+                    result = client.chat(
+                        prompt, messages=st.session_state.history_for_api, summary=st.session_state.summary,
+                        session_id=st.session_state.session_id, **params
+                    )
+                    message_placeholder.markdown(result.response)
+            except AgentClientError as e:
+                st.error(f"Error: {e}")
+            except Exception as e:
+                st.error(f"Connection failed: {e}")
+
+            if result:
+                full_response = result.response
+                # Update state from the API
+                new_summary = result.updated_summary
+                if new_summary and new_summary != st.session_state.summary:
+                    st.session_state.summary = new_summary
+                    st.toast("Conversation summarized!", icon="📝")
+                # The API returns the FULL updated history including the new assistant message.
+                # It's safer to use that for the next request context.
+                st.session_state.history_for_api = result.updated_history
+                st.session_state.session_id = result.session_id
 
         # Append assistant response to UI history
         if full_response:
@@ -227,14 +178,11 @@ elif st.session_state.page == "uploads":
         submit_button = st.form_submit_button("Upload")
         
         if submit_button and uploaded_file:
-            files = {"file": (uploaded_file.name, uploaded_file, uploaded_file.type)}
-            data = {"domain": domain}
             try:
-                response = requests.post(f"{API_BASE_URL}/upload", files=files, data=data)
-                if response.status_code == 200:
-                    st.success(f"Uploaded {uploaded_file.name} to domain '{domain}' successfully!")
-                else:
-                    st.error(f"Upload failed: {response.text}")
+                client.upload(uploaded_file, domain, filename=uploaded_file.name, content_type=uploaded_file.type)
+                st.success(f"Uploaded {uploaded_file.name} to domain '{domain}' successfully!")
+            except AgentClientError as e:
+                st.error(f"Upload failed: {e}")
             except Exception as e:
                 st.error(f"Error: {e}")
 
@@ -242,25 +190,23 @@ elif st.session_state.page == "uploads":
     st.subheader("Existing Documents")
     
     try:
-        response = requests.get(f"{API_BASE_URL}/documents")
-        if response.status_code == 200:
-            documents = response.json()
-            if documents:
-                # Group by domain
-                domains = {}
-                for doc in documents:
-                    domain = doc['domain']
-                    if domain not in domains:
-                        domains[domain] = []
-                    domains[domain].append(doc)
-                
-                for domain, docs in domains.items():
-                    with st.expander(f"📁 {domain}", expanded=True):
-                        for doc in docs:
-                            st.text(f"📄 {doc['filename']} ({doc['size']} bytes) - {doc['created_at']}")
-            else:
-                st.info("No documents found.")
+        documents = client.documents()
+        if documents:
+            # Group by domain
+            domains = {}
+            for doc in documents:
+                domain = doc['domain']
+                if domain not in domains:
+                    domains[domain] = []
+                domains[domain].append(doc)
+            
+            for domain, docs in domains.items():
+                with st.expander(f"📁 {domain}", expanded=True):
+                    for doc in docs:
+                        st.text(f"📄 {doc['filename']} ({doc['size']} bytes) - {doc['created_at']}")
         else:
-            st.error("Failed to fetch documents.")
+            st.info("No documents found.")
+    except AgentClientError:
+        st.error("Failed to fetch documents.")
     except Exception as e:
         st.error(f"Error: {e}")
@@ -0,0 +1,150 @@
+import asyncio
+import socket
+import threading
+import time
+import httpx
+import pytest
+import uvicorn
+from openai import AsyncOpenAI
+from unittest.mock import patch
+from app.main import app
+from agent_client import AgentClient, AsyncAgentClient, AgentClientError
+from agent_client._common import TTLCache
+from benchmarks.fake_openai import create_app
+
+
+@pytest.fixture(scope="module")
+def base_url(tmp_path_factory):
+    """Runs the app in-process on a uvicorn thread against the fake upstream."""
+    fake = create_app(ttft=0, tokens_per_second=0, completion_tokens=4)
+    llm = AsyncOpenAI(api_key="fake", base_url="http://fake/v1",
+                      http_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=fake)))
+    upload_dir = tmp_path_factory.mktemp("uploads")
+    (upload_dir / "docs").mkdir()
+    (upload_dir / "docs" / "a.txt").write_text("a")
+    (upload_dir / "faq").mkdir()
+    (upload_dir / "faq" / "b.txt").write_text("b")
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="off"))
+    with patch("app.llm_client.client", llm), \
+         patch("app.routers.document.settings.UPLOAD_DIR", str(upload_dir)):
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        while not server.started:
+            time.sleep(0.01)
+        yield f"http://127.0.0.1:{port}"
+        server.should_exit = True
+        thread.join()
+
+
+def test_sync_chat(base_url):
+    with AgentClient(base_url) as client:
+        result = client.chat("hello", temperature=0.1)
+        assert result.response == "lorem ipsum dolor sit "
+        assert [m["role"] for m in result.updated_history] == ["user", "assistant"]
+
+        # A new conversation gets its own session id, which later turns keep
+        assert result.session_id and client.chat("hi").session_id != result.session_id
+        follow_up = client.chat("again", messages=result.updated_history, summary=result.updated_summary,
+                                session_id=result.session_id)
+        assert len(follow_up.updated_history) == 4
+        assert follow_up.session_id == result.session_id
+
+
+def test_sync_stream_reuses_websocket(base_url):
+    with AgentClient(base_url) as client:
+        stream = client.stream_chat("hello")
+        assert list(stream) == ["lorem ", "ipsum ", "dolor ", "sit "]
+        assert stream.result.response == "lorem ipsum dolor sit "
+        first = client._idle_ws[0]
+
+        second = client.stream_chat("again", messages=stream.result.updated_history)
+        assert second.text() == "lorem ipsum dolor sit "
+        assert len(second.result.updated_history) == 4
+        assert client._idle_ws == [first]
+
+
+def test_sync_stream_error_keeps_connection(base_url):
+    with AgentClient(base_url) as client:
+        with pytest.raises(AgentClientError):
+            client.stream_chat("bad", temperature="not a number").text()
+        assert len(client._idle_ws) == 1
+        assert client.stream_chat("ok").text() == "lorem ipsum dolor sit "
+
+
+def test_abandoned_stream_is_not_pooled(base_url):
+    with AgentClient(base_url) as client:
+        stream = iter(client.stream_chat("hello"))
+        next(stream)
+        stream.close()
+        assert client._idle_ws == []
+
+
+def test_sync_domains_are_cached(base_url):
+    with AgentClient(base_url, domains_ttl=60) as client:
+        assert client.domains() == ["docs", "faq"]
+        with patch.object(client, "documents", side_effect=AssertionError("should be cached")):
+            assert client.domains() == ["docs", "faq"]
+        assert client.domains(refresh=True) == ["docs", "faq"]
+
+
+def test_sync_batch(base_url):
+    with AgentClient(base_url) as client:
+        items = list(client.chat_batch([{"message": "a"}, {"message": "b"}], max_concurrency=2))
+        assert sorted(item["index"] for item in items) == [0, 1]
+
+
+def test_async_client(base_url):
+    async def main():
+        async with AsyncAgentClient(base_url) as client:
+            result = await client.chat("hello")
+            assert result.response == "lorem ipsum dolor sit "
+
+            stream = client.stream_chat("hello")
+            deltas = [delta async for delta in stream]
+            assert "".join(deltas) == stream.result.response
+            first = client._idle_ws[0]
+            assert await client.stream_chat("again").text() == "lorem ipsum dolor sit "
+            assert client._idle_ws == [first]
+
+            assert await client.domains() == ["docs", "faq"]
+            items = [item async for item in client.chat_batch([{"message": "a"}])]
+            assert items[0]["response"]["response"] == "lorem ipsum dolor sit "
+
+    asyncio.run(main())
+
+
+def test_http_errors_raise(base_url):
+    with AgentClient(base_url) as client:
+        with pytest.raises(AgentClientError) as error:
+            client.chat("hi", temperature="not a number")
+        assert error.value.status_code == 422
+
+
+def test_ttl_cache_expires():
+    now = [0.0]
+    cache = TTLCache(ttl=10, clock=lambda: now[0])
+    cache.set(["x"])
+    assert cache.get() == ["x"]
+    now[0] = 11
+    assert cache.get() is None
+
+
+def test_upload_bulk_streams_archive(base_url, tmp_path):
+    archive = tmp_path / "corpus.zip"
+    archive.write_bytes(b"not an archive")
+    with AgentClient(base_url) as client:
+        with pytest.raises(AgentClientError) as error:
+            client.upload_bulk("docs", str(archive))
+        assert error.value.status_code == 415
+
+    async def main():
+        async with AsyncAgentClient(base_url) as client:
+            with pytest.raises(AgentClientError) as error:
+                await client.upload_bulk("docs", str(archive))
+            assert error.value.status_code == 415
+
+    asyncio.run(main())
@@ -0,0 +1,124 @@
+import asyncio
+import json
+from types import SimpleNamespace
+from unittest.mock import patch, MagicMock
+from fastapi.testclient import TestClient
+from app.main import app
+
+client = TestClient(app)
+
+
+def make_generate(delays=None, fail_on=None, state=None):
+    async def generate(messages, stream=False, **kwargs):
+        question = messages[-1]["content"]
+        if state is not None:
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+        try:
+            await asyncio.sleep((delays or {}).get(question, 0.01))
+            if question == fail_on:
+                raise RuntimeError("upstream failed")
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f"echo {question}"))])
+        finally:
+            if state is not None:
+                state["active"] -= 1
+    return generate
+
+
+def parse(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_batch_streams_in_completion_order():
+    delays = {"slow": 0.3, "fast": 0.01}
+    with patch("app.routers.chat.llm_client.generate_chat_response", make_generate(delays)):
+        response = client.post("/api/v1/chat/batch", json={
+            "requests": [{"message": "slow"}, {"message": "fast"}],
+        })
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    items = parse(response)
+    assert [item["index"] for item in items] == [1, 0]
+    assert items[0]["response"]["response"] == "echo fast"
+
+
+def test_batch_reports_per_item_errors():
+    with patch("app.routers.chat.llm_client.generate_chat_response", make_generate(fail_on="bad")):
+        response = client.post("/api/v1/chat/batch", json={
+            "requests": [{"message": "good"}, {"message": "bad"}],
+        })
+    items = {item["index"]: item for item in parse(response)}
+    assert items[0]["response"]["response"] == "echo good"
+    assert "upstream failed" in items[1]["error"]
+    assert "response" not in items[1]
+
+
+def test_batch_bounds_concurrency():
+    state = {"active": 0, "peak": 0}
+    with patch("app.routers.chat.llm_client.generate_chat_response", make_generate(state=state)):
+        response = client.post("/api/v1/chat/batch", json={
+            "requests": [{"message": f"q{i}"} for i in range(10)],
+            "max_concurrency": 3,
+        })
+    assert len(parse(response)) == 10
+    assert state["peak"] == 3
+
+
+def test_batch_embeds_queries_together():
+    store = MagicMock()
+    store.embed.side_effect = lambda texts: [[1.0, 0.0] for _ in texts]
+    store.query_candidates.side_effect = lambda domain, embeddings, n: [
+        [{"document": f"{domain} doc", "embedding": [1.0, 0.0], "distance": 0.0, "metadata": {}}] for _ in embeddings
+    ]
+    captured = []
+
+    async def generate(messages, stream=False, **kwargs):
+        captured.append(messages[0]["content"])
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="ok"))])
+
+    with patch("app.retrieval.vector_store", store), \
+         patch("app.routers.chat.llm_client.generate_chat_response", generate):
+        response = client.post("/api/v1/chat/batch", json={"requests": [
+            {"message": "a", "domain": "docs"},
+            {"message": "b", "domain": "docs"},
+            {"message": "c", "domain": "faq"},
+            {"message": "d"},
+        ]})
+    assert len(parse(response)) == 4
+    store.embed.assert_called_once_with(["a", "b", "c"])
+    assert store.query_candidates.call_count == 2  # one search per domain
+    assert sum("docs doc" in c for c in captured) == 2
+    assert sum("faq doc" in c for c in captured) == 1
+
+
+def test_batch_jsonl_upload():
+    lines = "\n".join([
+        json.dumps({"message": "one"}),
+        "{not json",
+        "",
+        json.dumps({"message": "two"}),
+    ])
+    with patch("app.routers.chat.llm_client.generate_chat_response", make_generate()):
+        response = client.post("/api/v1/chat/batch/upload",
+                               files={"file": ("eval.jsonl", lines.encode(), "application/jsonl")})
+    items = {item["index"]: item for item in parse(response)}
+    assert items[0]["response"]["response"] == "echo one"
+    assert items[1]["error"].startswith("Invalid request")
+    assert items[2]["response"]["response"] == "echo two"
+
+
+def test_batch_size_limit():
+    with patch("app.routers.chat.settings.BATCH_MAX_ITEMS", 1):
+        response = client.post("/api/v1/chat/batch", json={"requests": [{"message": "a"}, {"message": "b"}]})
+    assert response.status_code == 413
+
+
+def test_batch_producer_failure_ends_stream():
+    with patch("app.routers.chat.llm_client.generate_chat_response", make_generate()), \
+         patch("app.routers.chat.resolve_search_domain", side_effect=RuntimeError("bad domain config")):
+        response = client.post("/api/v1/chat/batch", json={
+            "requests": [{"message": "a"}, {"message": "b"}],
+        })
+    items = parse(response)
+    assert sorted(item["index"] for item in items) == [0, 1]
+    assert all("bad domain config" in item["error"] for item in items)
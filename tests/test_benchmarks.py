@@ -0,0 +1,82 @@
+import json
+import httpx
+from openai import AsyncOpenAI
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+from app.main import app
+from benchmarks.fake_openai import create_app
+from benchmarks.loadtest import compare, distribution
+
+
+def fake_llm_client(**kwargs):
+    fake = create_app(ttft=0, tokens_per_second=0, **kwargs)
+    http_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=fake))
+    return AsyncOpenAI(api_key="fake", base_url="http://fake/v1", http_client=http_client)
+
+
+def test_fake_server_completion():
+    client = TestClient(create_app(ttft=0, completion_tokens=5))
+    response = client.post("/v1/chat/completions", json={"messages": [{"role": "user", "content": "hi there"}]})
+    data = response.json()
+    assert data["usage"] == {"prompt_tokens": 2, "completion_tokens": 5, "total_tokens": 7,
+                             "prompt_tokens_details": {"cached_tokens": 0}}
+    assert len(data["choices"][0]["message"]["content"].split()) == 5
+
+
+def test_fake_server_stream_with_usage():
+    client = TestClient(create_app(ttft=0, tokens_per_second=0, completion_tokens=3))
+    response = client.post("/v1/chat/completions", json={
+        "messages": [{"role": "user", "content": "hi"}],
+        "stream": True,
+        "stream_options": {"include_usage": True},
+        "max_tokens": 2,
+    })
+    events = [line[len("data: "):] for line in response.text.splitlines() if line.startswith("data: ")]
+    assert events[-1] == "[DONE]"
+    chunks = [json.loads(e) for e in events[:-1]]
+    deltas = [c["choices"][0]["delta"].get("content") for c in chunks if c["choices"]]
+    assert "".join(d for d in deltas if d).split() == ["lorem", "ipsum"]
+    assert chunks[-1]["choices"] == [] and chunks[-1]["usage"]["completion_tokens"] == 2
+
+
+def test_fake_server_error_rate():
+    client = TestClient(create_app(ttft=0, error_rate=1.0))
+    response = client.post("/v1/chat/completions", json={"messages": []})
+    assert response.status_code == 500
+    assert response.json()["error"]["code"] == "fake_error"
+
+
+def test_app_against_fake_upstream():
+    with patch("app.llm_client.client", fake_llm_client(completion_tokens=4)):
+        client = TestClient(app)
+        response = client.post("/api/v1/chat", json={"message": "hello"})
+        assert response.status_code == 200
+        assert response.json()["response"] == "lorem ipsum dolor sit "
+
+        with client.websocket_connect("/api/v1/ws/chat") as websocket:
+            websocket.send_json({"message": "hello"})
+            tokens = []
+            while "metadata" not in (data := websocket.receive_json()):
+                tokens.append(data["content"])
+        assert "".join(tokens) == "lorem ipsum dolor sit "
+
+
+def test_distribution_percentiles():
+    stats = distribution([i / 1000 for i in range(1, 101)])
+    assert stats["p50_ms"] == 50.0
+    assert stats["p95_ms"] == 95.0
+    assert stats["p99_ms"] == 99.0
+    assert distribution([]) is None
+
+
+def test_compare_flags_regressions():
+    baseline = {"scenarios": {"chat": {"latency": {"p50_ms": 100, "p95_ms": 200, "p99_ms": 300},
+                                       "throughput_rps": 50, "error_rate": 0.0}}}
+    same = {"scenarios": {"chat": {"latency": {"p50_ms": 105, "p95_ms": 210, "p99_ms": 310},
+                                   "throughput_rps": 48, "error_rate": 0.0}}}
+    assert compare(same, baseline, tolerance=0.1) == []
+
+    worse = {"scenarios": {"chat": {"latency": {"p50_ms": 100, "p95_ms": 260, "p99_ms": 300},
+                                    "throughput_rps": 30, "error_rate": 0.05}}}
+    metrics = {r["metric"] for r in compare(worse, baseline, tolerance=0.1)}
+    assert metrics == {"latency.p95_ms", "throughput_rps", "error_rate"}
@@ -0,0 +1,191 @@
+import io
+import tarfile
+import time
+import zipfile
+import pytest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from app.main import app
+from app import bulk_ingest
+from app.bulk_ingest import member_filename
+from app.extraction import ExtractorPool
+from benchmarks.extraction import make_docx, paragraphs
+
+TEXT = "Onboarding starts on Monday. Bring your laptop. " * 5
+
+
+@pytest.fixture
+def bulk(tmp_path):
+    """Persistent client (background jobs need a long-lived event loop) with a mocked vector store."""
+    batches = []
+
+    def add_documents(domain, documents, metadatas, ids):
+        batches.append(list(metadatas))
+
+    pool = ExtractorPool(workers=1, timeout=30)
+    with patch("app.main.settings.WARMUP_ON_STARTUP", False), \
+         patch("app.main.settings.LOOP_MONITOR", False), \
+         patch("app.bulk_ingest.settings.UPLOAD_DIR", str(tmp_path / "uploads")), \
+         patch("app.bulk_ingest.settings.BULK_EMBED_BATCH_SIZE", 4), \
+         patch("app.bulk_ingest.settings.CHUNK_SIZE", 60), \
+         patch("app.bulk_ingest.settings.CHUNK_OVERLAP", 10), \
+         patch("app.bulk_ingest.extractor_pool", pool), \
+         patch("app.bulk_ingest.vector_store.add_documents", add_documents), \
+         TestClient(app) as client:
+        client.batches = batches
+        yield client
+    pool.shutdown()
+
+
+def wait_for(client, job_id, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = client.get(f"/api/v1/upload/bulk/{job_id}").json()
+        if job["status"] in ("completed", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"Job did not finish: {job}")
+
+
+def make_zip(files: dict) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def test_member_filename():
+    assert member_filename("guides/intro.md") == "guides__intro.md"
+    assert member_filename("./a.txt") == "a.txt"
+    assert member_filename("../evil.txt") is None
+    assert member_filename("/etc/passwd") is None
+    assert member_filename("__MACOSX/._a.txt") is None
+    assert member_filename("docs/.DS_Store") is None
+
+
+def test_bulk_zip_ingests_in_cross_file_batches(bulk, tmp_path):
+    archive = make_zip({
+        "a.txt": TEXT,
+        "guides/b.md": TEXT,
+        "notes.docx": make_docx([TEXT]),
+        "../evil.txt": "nope",
+        ".hidden": "nope",
+        "image.bin": b"\x00\x01\x02",
+    })
+    response = bulk.post("/api/v1/upload/bulk?domain=hr", content=archive)
+    assert response.status_code == 202
+    job = wait_for(bulk, response.json()["id"])
+
+    assert job["status"] == "completed"
+    assert job["files_total"] == 4 and job["files_done"] == 3 and job["files_failed"] == 1
+    assert "image.bin" in job["errors"][0]
+    chunks = [m for batch in bulk.batches for m in batch]
+    assert job["chunks_indexed"] == len(chunks) > 0
+    assert job["files_per_second"] > 0 and job["chunks_per_second"] > 0
+    assert all(len(batch) <= 4 for batch in bulk.batches)
+    # Batches are filled across file boundaries
+    assert any(len({m["source"] for m in batch}) > 1 for batch in bulk.batches)
+    assert {m["source"] for m in chunks} == {"a.txt", "guides__b.md", "notes.docx"}
+
+    # The file that failed is removed; nothing is left in staging
+    written = sorted(p.name for p in (tmp_path / "uploads" / "hr").iterdir() if not p.name.startswith("."))
+    assert written == ["a.txt", "guides__b.md", "notes.docx"]
+    assert [p.name for p in (tmp_path / "uploads").iterdir()] == ["hr"]
+    assert {d["filename"] for d in bulk.get("/api/v1/documents").json()} == set(written)
+
+
+def test_bulk_failing_file_does_not_fail_job(bulk, tmp_path):
+    files = {f"doc{i}.txt": TEXT for i in range(5)}
+    files["broken.docx"] = make_zip({"word/document.xml": "<w:document><w:body>"})
+    files["crash.html"] = "<p>x</p>"
+    real_extract = ExtractorPool.extract
+
+    async def extract(self, path, content_type):
+        if path.endswith("crash.html"):
+            raise RuntimeError("worker exploded")
+        return await real_extract(self, path, content_type)
+
+    with patch("app.bulk_ingest.settings.BULK_EMBED_BATCH_SIZE", 1000), \
+         patch.object(ExtractorPool, "extract", extract):
+        response = bulk.post("/api/v1/upload/bulk?domain=docs", content=make_zip(files))
+        job = wait_for(bulk, response.json()["id"])
+    assert job["status"] == "completed"
+    assert job["files_done"] == 5 and job["files_failed"] == 2
+    # The chunks pending below the batch size are still indexed
+    assert job["chunks_indexed"] > 0
+    assert sorted(e.split(":")[0] for e in job["errors"]) == ["broken.docx", "crash.html"]
+    assert sorted(p.name for p in (tmp_path / "uploads" / "docs").iterdir()) == [f"doc{i}.txt" for i in range(5)]
+
+
+def test_bulk_slow_file_does_not_fail_others(bulk):
+    files = {f"doc{i}.docx": make_docx(paragraphs(2000)) for i in range(6)}
+    files["slow.docx"] = make_docx(paragraphs(100000))
+    with patch("app.bulk_ingest.extractor_pool.timeout", 0.3):
+        response = bulk.post("/api/v1/upload/bulk?domain=docs", content=make_zip(files))
+        job = wait_for(bulk, response.json()["id"])
+    assert job["status"] == "completed"
+    assert job["files_done"] == 6 and job["files_failed"] == 1
+    assert job["errors"][0].startswith("slow.docx: Extraction timed out")
+
+
+def test_bulk_large_file_is_chunked_in_batches(bulk):
+    taken = []
+    real_take = bulk_ingest._take
+
+    def take(records, count):
+        batch = real_take(records, count)
+        taken.append(len(batch))
+        return batch
+
+    with patch("app.bulk_ingest._take", take):
+        response = bulk.post("/api/v1/upload/bulk?domain=docs", content=make_zip({"big.txt": TEXT * 20}))
+        job = wait_for(bulk, response.json()["id"])
+    assert job["status"] == "completed" and job["chunks_indexed"] > 4
+    assert max(taken) <= 4
+
+
+def test_bulk_tar_gz(bulk):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        data = TEXT.encode()
+        info = tarfile.TarInfo("docs/a.txt")
+        info.size = len(data)
+        archive.addfile(info, io.BytesIO(data))
+    response = bulk.post("/api/v1/upload/bulk?domain=docs", content=buffer.getvalue())
+    job = wait_for(bulk, response.json()["id"])
+    assert job["status"] == "completed" and job["files_done"] == 1
+
+
+def test_bulk_rejects_bad_input(bulk, tmp_path):
+    assert bulk.post("/api/v1/upload/bulk?domain=docs", content=b"not an archive").status_code == 415
+    assert bulk.post("/api/v1/upload/bulk?domain=../x", content=make_zip({"a.txt": TEXT})).status_code == 400
+    assert bulk.get("/api/v1/upload/bulk/unknown").status_code == 404
+
+    existing = tmp_path / "uploads" / "docs" / "a.txt"
+    existing.parent.mkdir(parents=True)
+    existing.write_text("indexed earlier")
+    with patch("app.bulk_ingest.settings.BULK_MAX_FILES", 1):
+        response = bulk.post("/api/v1/upload/bulk?domain=docs", content=make_zip({"a.txt": TEXT, "b.txt": TEXT}))
+        job = wait_for(bulk, response.json()["id"])
+    assert job["status"] == "failed"
+    assert "Too many files" in job["errors"][0]
+    # Files unpacked before the limit was hit are removed without touching the domain folder
+    assert existing.read_text() == "indexed earlier"
+    assert sorted(p.name for p in (tmp_path / "uploads").iterdir()) == ["docs"]
+    assert bulk.batches == []
+
+
+def test_bulk_local_directory(bulk, tmp_path):
+    source = tmp_path / "corpus"
+    (source / "sub").mkdir(parents=True)
+    (source / "a.txt").write_text(TEXT)
+    (source / "sub" / "b.txt").write_text(TEXT)
+
+    assert bulk.post(f"/api/v1/upload/bulk?domain=docs&path={source}").status_code == 403
+    with patch("app.bulk_ingest.settings.BULK_INGEST_ALLOWED_DIRS", [str(tmp_path)]):
+        response = bulk.post(f"/api/v1/upload/bulk?domain=docs&path={source}")
+        assert response.status_code == 202
+        job = wait_for(bulk, response.json()["id"])
+    assert job["status"] == "completed" and job["files_done"] == 2
+    assert (tmp_path / "uploads" / "docs" / "sub__b.txt").exists()
@@ -0,0 +1,140 @@
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+from app.main import app
+from app.chunking import (
+    ChunkingConfig, iter_chunks, chunk_text, count_tokens, get_chunking_config, validate_chunking_settings,
+)
+
+client = TestClient(app)
+
+TEXT = (
+    "Retrieval works best on whole sentences. Cutting words in half hurts recall! "
+    "Does overlap help? It usually does.\n\n"
+    "A second paragraph starts here. It has two sentences.\n\n"
+    "Short third paragraph."
+) * 20
+
+
+def pieces(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize("strategy,size,overlap", [
+    ("fixed", 120, 20),
+    ("token", 30, 5),
+    ("sentence", 150, 40),
+    ("paragraph", 300, 0),
+])
+def test_streaming_matches_whole_text(strategy, size, overlap):
+    config = ChunkingConfig(strategy=strategy, chunk_size=size, chunk_overlap=overlap)
+    whole = [(c.text, c.start) for c in chunk_text(TEXT, config)]
+    for block in (1, 7, 64, 1000):
+        assert [(c.text, c.start) for c in iter_chunks(pieces(TEXT, block), config)] == whole
+
+
+def test_chunk_offsets_point_into_source():
+    for strategy in ("fixed", "token", "sentence", "paragraph"):
+        config = ChunkingConfig(strategy=strategy, chunk_size=100, chunk_overlap=10)
+        for chunk in chunk_text(TEXT, config):
+            assert TEXT[chunk.start:chunk.start + len(chunk.text)] == chunk.text
+
+
+def test_sentence_strategy_keeps_sentences_whole():
+    config = ChunkingConfig(strategy="sentence", chunk_size=200, chunk_overlap=50)
+    for chunk in chunk_text(TEXT, config):
+        assert len(chunk.text) <= 200
+        assert chunk.text.rstrip()[-1] in ".!?"
+
+
+def test_sentence_overlap_repeats_previous_sentence():
+    text = "One one one. Two two two. Three three three. Four four four."
+    config = ChunkingConfig(strategy="sentence", chunk_size=40, chunk_overlap=20)
+    chunks = [c.text for c in chunk_text(text, config)]
+    assert chunks == ["One one one. Two two two. ", "Two two two. Three three three. ", "Three three three. Four four four."]
+
+
+def test_token_strategy_respects_token_budget():
+    config = ChunkingConfig(strategy="token", chunk_size=25, chunk_overlap=5)
+    chunks = chunk_text(TEXT, config)
+    assert all(count_tokens(c.text) <= 25 for c in chunks)
+    # Words are never split across chunks
+    assert all(not c.text[-1].isalnum() or TEXT[c.start + len(c.text)] in " \n.!?," for c in chunks[:-1])
+
+
+def test_oversized_sentence_is_split():
+    text = "word " * 100
+    chunks = chunk_text(text, ChunkingConfig(strategy="sentence", chunk_size=50, chunk_overlap=0))
+    assert all(len(c.text) <= 50 for c in chunks)
+    assert "".join(c.text for c in chunks) == text
+
+
+@pytest.mark.parametrize("strategy,text", [
+    ("sentence", "2024-01-01 INFO request served in 12 ms, status 200\n" * 2000),
+    ("paragraph", "id,name,value\n" + "42,widget,3.5\n" * 5000),
+])
+def test_boundary_free_text_streams(strategy, text):
+    config = ChunkingConfig(strategy=strategy, chunk_size=200, chunk_overlap=20)
+    read = []
+
+    def feed():
+        for piece in pieces(text, 50):
+            read.append(piece)
+            yield piece
+
+    chunks = iter_chunks(feed(), config)
+    next(chunks)
+    # The first chunk is emitted long before the input ends
+    assert len(read) < 10
+    whole = [(c.text, c.start) for c in chunk_text(text, config)]
+    assert [(c.text, c.start) for c in iter_chunks(pieces(text, 50), config)] == whole
+    assert all(len(t) <= 200 for t, _ in whole)
+
+
+def test_invalid_config():
+    with pytest.raises(ValueError):
+        ChunkingConfig(strategy="bogus")
+    with pytest.raises(ValueError):
+        ChunkingConfig(chunk_size=100, chunk_overlap=100)
+
+
+def test_domain_settings_override():
+    overrides = {"legal": {"strategy": "paragraph", "chunk_size": 2000}}
+    with patch("app.chunking.settings.CHUNK_DOMAIN_SETTINGS", overrides):
+        assert get_chunking_config("legal").strategy == "paragraph"
+        assert get_chunking_config("legal").chunk_size == 2000
+        assert get_chunking_config("other") == get_chunking_config()
+
+
+def test_domain_chunk_size_scales_default_overlap():
+    with patch("app.chunking.settings.CHUNK_DOMAIN_SETTINGS", {"short": {"chunk_size": 100}}):
+        config = get_chunking_config("short")
+        assert config.chunk_size == 100 and config.chunk_overlap == 15
+        validate_chunking_settings()
+
+
+def test_invalid_domain_settings_fail_at_startup():
+    with patch("app.chunking.settings.CHUNK_DOMAIN_SETTINGS", {"bad": {"chunk_size": 100, "chunk_overlap": 200}}):
+        with pytest.raises(ValueError, match="'bad'"):
+            validate_chunking_settings()
+        with pytest.raises(ValueError):
+            with TestClient(app):
+                pass
+
+
+def test_upload_records_chunking_metadata(tmp_path):
+    with patch("app.routers.document.settings.UPLOAD_DIR", str(tmp_path)), \
+         patch("app.routers.document.settings.INGEST_BATCH_SIZE", 4), \
+         patch("app.routers.document.vector_store") as mock_vector_store:
+        files = {"file": ("doc.txt", TEXT.encode(), "text/plain")}
+        response = client.post("/api/v1/upload", files=files, data={"domain": "docs"})
+        assert response.status_code == 200
+
+        calls = mock_vector_store.add_documents.call_args_list
+        assert len(calls) > 1  # batched
+        metadatas = [m for call in calls for m in call.args[2]]
+        assert [m["chunk_index"] for m in metadatas] == list(range(len(metadatas)))
+        config = get_chunking_config("docs")
+        assert all(m["chunk_strategy"] == config.strategy for m in metadatas)
+        assert all(m["chunk_size"] == config.chunk_size and m["chunk_overlap"] == config.chunk_overlap for m in metadatas)
+        assert all(len(call.args[1]) <= 4 for call in calls)
@@ -0,0 +1,184 @@
+import asyncio
+import io
+import zipfile
+import pytest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from app.main import app
+from app.metrics import metrics
+from app.extraction import (
+    DOCX, HTML, PDF, ExtractionError, ExtractionTimeout, ExtractorPool, UnsupportedFileType, cached_text_path,
+    extract_docx, extract_html, resolve_content_type,
+)
+from benchmarks.extraction import make_docx, make_pdf, paragraphs
+
+client = TestClient(app)
+
+
+@pytest.fixture(scope="module")
+def pool():
+    pool = ExtractorPool(workers=2, timeout=30)
+    yield pool
+    pool.shutdown()
+
+
+def test_resolve_content_type():
+    assert resolve_content_type("a.docx", "application/octet-stream") == DOCX
+    assert resolve_content_type("a.PDF") == PDF
+    assert resolve_content_type("page.htm", None) == HTML
+    assert resolve_content_type("blob", "text/plain; charset=utf-8") == "text/plain"
+
+
+def test_html_extractor_keeps_structure(tmp_path):
+    path = tmp_path / "page.html"
+    path.write_text(
+        "<html><head><script>var x = 1;</script><style>p {}</style></head>"
+        "<body><h1>Title</h1><p>First\n   paragraph &amp; more.</p><ul><li>one</li><li>two</li></ul></body></html>"
+    )
+    text = "".join(extract_html(str(path)))
+    assert "var x" not in text and "p {}" not in text
+    assert "Title\n\nFirst paragraph & more.\n\none\ntwo" in text
+
+
+def test_docx_extractor(tmp_path):
+    path = tmp_path / "doc.docx"
+    path.write_bytes(make_docx(["Hello world.", "Second paragraph."]))
+    assert "".join(extract_docx(str(path))) == "Hello world.\n\nSecond paragraph.\n\n"
+
+    bad = tmp_path / "bad.docx"
+    bad.write_bytes(b"not a zip")
+    with pytest.raises(ExtractionError):
+        list(extract_docx(str(bad)))
+
+
+def test_pool_extracts_and_caches(tmp_path, pool):
+    pytest.importorskip("pypdf")
+    path = tmp_path / "report.pdf"
+    path.write_bytes(make_pdf(["Quarterly revenue grew.", "Costs fell."]))
+    metrics.reset()
+
+    text_path = asyncio.run(pool.extract(str(path), PDF))
+    assert text_path == cached_text_path(str(path)) == str(tmp_path / ".report.pdf.txt")
+    assert "Quarterly revenue grew." in open(text_path).read()
+
+    # Unchanged file: served from the cache without parsing
+    assert asyncio.run(pool.extract(str(path), PDF)) == text_path
+    assert metrics.counters["extract.files"] == 1
+    assert metrics.counters["extract.cache_hits"] == 1
+
+    # Text needs no extraction
+    assert asyncio.run(pool.extract(str(path), "text/plain")) == str(path)
+
+
+def test_pool_errors(tmp_path, pool):
+    bad = tmp_path / "bad.docx"
+    bad.write_bytes(b"not a zip")
+    with pytest.raises(ExtractionError, match="Not a valid DOCX"):
+        asyncio.run(pool.extract(str(bad), DOCX))
+
+    # Parser errors from inside the extractor are reported as ExtractionError too
+    malformed = tmp_path / "malformed.docx"
+    with zipfile.ZipFile(malformed, "w") as archive:
+        archive.writestr("word/document.xml", "<w:document><w:body>")
+    metrics.reset()
+    with pytest.raises(ExtractionError, match="Could not extract text"):
+        asyncio.run(pool.extract(str(malformed), DOCX))
+    assert metrics.counters["extract.errors"] == 1
+
+    binary = tmp_path / "image.bin"
+    binary.write_bytes(b"\x89PNG\x00\x00\x01")
+    with pytest.raises(UnsupportedFileType):
+        asyncio.run(pool.extract(str(binary), "application/octet-stream"))
+
+
+def test_pool_timeout_keeps_workers(tmp_path):
+    path = tmp_path / "big.docx"
+    path.write_bytes(make_docx(paragraphs(20000)))
+    pool = ExtractorPool(workers=1, timeout=0.02)
+    try:
+        with pytest.raises(ExtractionTimeout, match="timed out"):
+            asyncio.run(pool.extract(str(path), DOCX))
+        # Interrupted inside the worker: the pool and its process survive
+        executor = pool._pool
+        assert executor is not None and all(p.is_alive() for p in executor._processes.values())
+        pool.timeout = 30
+        assert "".join(open(asyncio.run(pool.extract(str(path), DOCX))).read().split())
+        assert pool._pool is executor
+    finally:
+        pool.shutdown()
+
+
+def test_queued_files_do_not_time_out(tmp_path):
+    # Each file takes well under the timeout, but all of them together take much longer
+    data = make_docx(paragraphs(10000))
+    paths = []
+    for i in range(8):
+        path = tmp_path / f"doc{i}.docx"
+        path.write_bytes(data)
+        paths.append(str(path))
+    pool = ExtractorPool(workers=2, timeout=0.75)
+
+    async def run():
+        return await asyncio.gather(*(pool.extract(p, DOCX) for p in paths), return_exceptions=True)
+
+    try:
+        results = asyncio.run(run())
+    finally:
+        pool.shutdown()
+    assert [r for r in results if isinstance(r, Exception)] == []
+
+
+def test_killed_pool_retries_in_flight_files(tmp_path):
+    paths = []
+    for i in range(4):
+        path = tmp_path / f"doc{i}.docx"
+        path.write_bytes(make_docx(paragraphs(5000)))
+        paths.append(str(path))
+    pool = ExtractorPool(workers=2, timeout=30)
+
+    async def run():
+        tasks = [asyncio.ensure_future(pool.extract(p, DOCX)) for p in paths]
+        while pool._pool is None or not pool._pool._processes:
+            await asyncio.sleep(0.01)
+        # What the backstop does for a worker stuck where SIGALRM cannot reach it
+        pool._discard(pool._pool, terminate=True)
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    try:
+        results = asyncio.run(run())
+    finally:
+        pool.shutdown()
+    assert [r for r in results if isinstance(r, Exception)] == []
+
+
+def test_upload_docx_indexes_extracted_text(tmp_path, pool):
+    with patch("app.routers.document.settings.UPLOAD_DIR", str(tmp_path)), \
+         patch("app.routers.document.extractor_pool", pool), \
+         patch("app.routers.document.vector_store.add_documents") as add_documents:
+        files = {"file": ("notes.docx", make_docx(["Onboarding checklist."]), "application/octet-stream")}
+        response = client.post("/api/v1/upload", files=files, data={"domain": "hr"})
+        assert response.status_code == 200
+        documents = add_documents.call_args[0][1]
+        assert [d.strip() for d in documents] == ["Onboarding checklist."]
+        assert (tmp_path / "hr" / ".notes.docx.txt").exists()
+
+        # The cached text is hidden from the document list
+        listed = client.get("/api/v1/documents").json()
+        assert [d["filename"] for d in listed] == ["notes.docx"]
+
+        malformed = io.BytesIO()
+        with zipfile.ZipFile(malformed, "w") as archive:
+            archive.writestr("word/document.xml", "<w:document>")
+        files = {"file": ("broken.docx", malformed.getvalue(), "application/octet-stream")}
+        assert client.post("/api/v1/upload", files=files, data={"domain": "hr"}).status_code == 422
+        assert not (tmp_path / "hr" / "broken.docx").exists()
+        assert not (tmp_path / "hr" / ".broken.docx.txt").exists()
+
+        files = {"file": ("photo.png", b"\x89PNG\r\n\x1a\n\x00\x00", "image/png")}
+        assert client.post("/api/v1/upload", files=files, data={"domain": "hr"}).status_code == 415
+
+        # Rejected or failed uploads are not left behind
+        add_documents.side_effect = RuntimeError("store down")
+        files = {"file": ("later.txt", b"Some text.", "text/plain")}
+        assert client.post("/api/v1/upload", files=files, data={"domain": "hr"}).status_code == 500
+        assert [d["filename"] for d in client.get("/api/v1/documents").json()] == ["notes.docx"]
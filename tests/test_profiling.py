@@ -0,0 +1,123 @@
+import asyncio
+import marshal
+import time
+import pytest
+from types import SimpleNamespace
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from app.main import app
+from app.profiling import LoopMonitor, profiles
+
+ADMIN = {"X-Admin-Key": "secret"}
+
+
+@pytest.fixture
+def admin_client():
+    async def generate(messages, stream=False, **kwargs):
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="hi"))])
+
+    # One client (one event loop thread) for the whole test, as under uvicorn
+    with patch("app.main.settings.WARMUP_ON_STARTUP", False), \
+         patch("app.main.settings.LOOP_MONITOR", False), \
+         patch("app.routers.admin.settings.ADMIN_API_KEY", "secret"), \
+         patch("app.routers.chat.llm_client.generate_chat_response", generate), \
+         TestClient(app) as client:
+        yield client
+    profiles.results.clear()
+
+
+def blocking_call():
+    time.sleep(0.3)
+
+
+def test_loop_monitor_captures_blocking_stack():
+    async def run():
+        monitor = LoopMonitor(interval=0.02, threshold=0.1)
+        monitor.start()
+        await asyncio.sleep(0.05)
+        blocking_call()
+        await asyncio.sleep(0.1)
+        monitor.stop()
+        return monitor
+
+    monitor = asyncio.run(run())
+    assert len(monitor.stalls) == 1
+    stall = monitor.report()["stalls"][0]
+    assert "blocking_call" in stall["stack"]
+    # Updated to the full stall length once the loop recovered
+    assert stall["blocked_seconds"] >= 0.25
+
+
+def test_loop_monitor_restart_stops_old_watchdog():
+    async def run():
+        monitor = LoopMonitor(interval=0.05, threshold=1)
+        monitor.start()
+        first = monitor._thread
+        monitor.stop()
+        monitor.start()
+        await asyncio.sleep(0.15)
+        assert not first.is_alive() and monitor._thread.is_alive()
+        monitor.stop()
+
+    asyncio.run(run())
+
+
+def test_admin_requires_key(admin_client):
+    assert admin_client.get("/api/v1/admin/loop").status_code == 403
+    assert admin_client.get("/api/v1/admin/loop", headers={"X-Admin-Key": "wrong"}).status_code == 403
+    assert admin_client.get("/api/v1/admin/loop", headers=ADMIN).status_code == 200
+
+
+def test_cprofile_session(admin_client):
+    start = admin_client.post("/api/v1/admin/profile/start?mode=cprofile", headers=ADMIN)
+    assert start.status_code == 200
+    assert admin_client.post("/api/v1/admin/profile/start", headers=ADMIN).status_code == 409
+    assert admin_client.post("/api/v1/chat", json={"message": "hello"}).status_code == 200
+    info = admin_client.post("/api/v1/admin/profile/stop", headers=ADMIN).json()
+    assert info["mode"] == "cprofile"
+
+    raw = admin_client.get(f"/api/v1/admin/profiles/{info['id']}", headers=ADMIN)
+    assert raw.headers["content-disposition"].endswith('.pstats"')
+    functions = {name for (_, _, name) in marshal.loads(raw.content)}
+    assert "prepare_chat_context" in functions
+    text = admin_client.get(f"/api/v1/admin/profiles/{info['id']}?format=text", headers=ADMIN).text
+    assert "cumulative" in text
+    assert admin_client.post("/api/v1/admin/profile/stop", headers=ADMIN).status_code == 409
+
+
+def test_sampling_interval_is_validated(admin_client):
+    for interval in ("0", "-1"):
+        response = admin_client.post(f"/api/v1/admin/profile/start?interval={interval}", headers=ADMIN)
+        assert response.status_code == 422
+    assert profiles.session is None
+
+
+def test_failed_start_does_not_leave_a_session(admin_client):
+    with patch("app.profiling.SamplingProfiler.start", side_effect=RuntimeError("can't start new thread")):
+        response = admin_client.post("/api/v1/admin/profile/start", headers=ADMIN)
+    assert response.status_code == 409 and "can't start new thread" in response.json()["detail"]
+    assert profiles.session is None
+    assert admin_client.post("/api/v1/admin/profile/start", headers=ADMIN).status_code == 200
+    admin_client.post("/api/v1/admin/profile/stop", headers=ADMIN)
+
+
+def test_sampling_session(admin_client):
+    admin_client.post("/api/v1/admin/profile/start?mode=sampling&interval=0.001", headers=ADMIN)
+    time.sleep(0.05)
+    info = admin_client.post("/api/v1/admin/profile/stop", headers=ADMIN).json()
+    assert info["mode"] == "sampling" and info["samples"] > 0
+    collapsed = admin_client.get(f"/api/v1/admin/profiles/{info['id']}", headers=ADMIN).text
+    stack, count = collapsed.splitlines()[0].rsplit(" ", 1)
+    assert int(count) >= 1 and ";" in stack
+
+
+def test_profile_header(admin_client):
+    response = admin_client.post("/api/v1/chat", json={"message": "hello"}, headers={"X-Profile": "1", **ADMIN})
+    assert response.status_code == 200
+    profile_id = response.headers["x-profile-id"]
+    listed = admin_client.get("/api/v1/admin/profiles", headers=ADMIN).json()["results"]
+    assert listed[0]["id"] == profile_id and listed[0]["path"] == "/api/v1/chat"
+
+    # Ignored without the admin key
+    response = admin_client.post("/api/v1/chat", json={"message": "hello"}, headers={"X-Profile": "1"})
+    assert "x-profile-id" not in response.headers
@@ -0,0 +1,121 @@
+import itertools
+import json
+import httpx
+import pytest
+from openai import AsyncOpenAI
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from app.main import app
+from app.metrics import metrics
+from app.retrieval import RetrievalResult
+from app.llm_client import pick_replica, get_client
+from app.routers.chat import conversation_key
+from app.schemas import ChatRequest
+from benchmarks.fake_openai import create_app
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def upstream():
+    """Fake upstream with a simulated prefix cache; records the prompts it receives."""
+    fake = create_app(ttft=0, tokens_per_second=0, completion_tokens=3)
+    prompts = []
+
+    async def record(request):
+        if request.url.path.endswith("/chat/completions"):
+            prompts.append(json.loads(await request.aread())["messages"])
+
+    http_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=fake), event_hooks={"request": [record]})
+    llm = AsyncOpenAI(api_key="fake", base_url="http://fake/v1", http_client=http_client)
+    counter = itertools.count()
+
+    def retrieve(domain, query):
+        # Different context every turn, like real retrieval
+        return RetrievalResult(documents=[f"context for turn {next(counter)}"])
+
+    metrics.reset()
+    with patch("app.llm_client.client", llm), patch("app.routers.chat.retrieval.retrieve", retrieve):
+        yield prompts
+
+
+def converse(layout, turns=3):
+    history = []
+    for i in range(turns):
+        data = client.post("/api/v1/chat", json={
+            "message": f"question {i}", "messages": history, "domain": "docs", "prompt_layout": layout,
+        }).json()
+        history = data["updated_history"]
+
+
+def test_prefix_cache_layout_moves_context_to_latest_turn(upstream):
+    converse("prefix_cache", turns=2)
+    first, second = upstream
+    assert first[0] == {"role": "system", "content": "You are a helpful AI assistant."}
+    assert second[-1]["content"] == "Relevant Context:\ncontext for turn 1\n\nquestion 1"
+    # Everything before the latest turn is plain history
+    assert second[1] == {"role": "user", "content": "question 0"}
+    assert second[0] == first[0]
+
+
+def test_legacy_layout_keeps_context_in_system_prompt(upstream):
+    converse("legacy", turns=2)
+    _, second = upstream
+    assert "context for turn 1" in second[0]["content"]
+    assert second[-1] == {"role": "user", "content": "question 1"}
+
+
+def test_prefix_layout_improves_cached_token_ratio(upstream):
+    converse("legacy")
+    legacy_cached = metrics.counters["llm.cached_prompt_tokens"]
+    metrics.reset()
+    converse("prefix_cache")
+    prefix_cached = metrics.counters["llm.cached_prompt_tokens"]
+    assert prefix_cached > legacy_cached
+    assert client.get("/metrics").json()["gauges"]["llm.cached_token_ratio"] > 0
+
+
+def test_streaming_records_usage_and_hides_usage_chunk(upstream):
+    with patch("app.llm_client.settings.STREAM_INCLUDE_USAGE", True), \
+         client.websocket_connect("/api/v1/ws/chat") as websocket:
+        websocket.send_json({"message": "hi"})
+        while "metadata" not in (data := websocket.receive_json()):
+            assert "error" not in data
+    assert metrics.counters["llm.completion_tokens"] == 3
+
+
+def test_sticky_replica_routing():
+    replicas = ["http://a/v1", "http://b/v1", "http://c/v1"]
+    with patch("app.llm_client.settings.OPENAI_BASE_URLS", replicas):
+        assignments = {f"session-{i}": pick_replica(f"session-{i}") for i in range(300)}
+        # Stable for a session
+        assert all(pick_replica(key) == replica for key, replica in assignments.items())
+        # Spread across replicas
+        assert set(assignments.values()) == set(replicas)
+        # Removing a replica only moves the sessions that were on it
+        with patch("app.llm_client.settings.OPENAI_BASE_URLS", replicas[:2]):
+            moved = [k for k, r in assignments.items() if r != "http://c/v1" and pick_replica(k) != r]
+        assert moved == []
+
+        first, replica = get_client("session-1")
+        assert replica == assignments["session-1"]
+        assert get_client("session-1")[0] is first
+        assert str(first.base_url).rstrip("/") == replica.rstrip("/")
+
+
+def test_single_upstream_uses_default_client():
+    with patch("app.llm_client.settings.OPENAI_BASE_URLS", []):
+        from app import llm_client
+        assert get_client("anything") == (llm_client.client, None)
+
+
+def test_conversation_key():
+    assert conversation_key(ChatRequest(message="hi", session_id="s-1")) == "s-1"
+    # First turns share no prefix yet: round-robin instead of hashing common greetings
+    assert conversation_key(ChatRequest(message="hi")) is None
+    opening = [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "Hello! How can I help?"}]
+    key = conversation_key(ChatRequest(message="next", messages=opening))
+    later = opening + [{"role": "user", "content": "next"}, {"role": "assistant", "content": "ok"}]
+    assert conversation_key(ChatRequest(message="more", messages=later)) == key
+    other = [opening[0], {"role": "assistant", "content": "Hi there."}]
+    assert conversation_key(ChatRequest(message="next", messages=other)) != key
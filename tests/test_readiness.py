@@ -0,0 +1,61 @@
+import time
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+from app.main import app
+from app.vector_store import VectorStore, vector_store
+
+
+def test_vector_store_is_lazy():
+    store = VectorStore()
+    assert store._collection is None
+    assert store.ready is False
+
+
+def test_ready_reports_warming_up_until_warm():
+    def slow_warmup():
+        time.sleep(0.3)
+        vector_store.warmup_seconds = 0.3
+        vector_store.ready = True
+
+    with patch.object(vector_store, "warmup", side_effect=slow_warmup), \
+         patch.object(vector_store, "ready", False):
+        with TestClient(app) as client:
+            response = client.get("/ready")
+            assert response.status_code == 503
+            assert response.json()["status"] == "warming_up"
+
+            deadline = time.time() + 5
+            while client.get("/ready").status_code != 200 and time.time() < deadline:
+                time.sleep(0.05)
+
+            data = client.get("/ready").json()
+            assert data["status"] == "ready"
+            assert data["warm"] is True
+            assert data["warmup_seconds"] == 0.3
+            assert data["startup_seconds"] > 0
+
+
+def test_ready_reports_warmup_error():
+    def failing_warmup():
+        vector_store.warmup_error = "model download failed"
+        raise RuntimeError("model download failed")
+
+    with patch.object(vector_store, "warmup", side_effect=failing_warmup), \
+         patch.object(vector_store, "ready", False), \
+         patch.object(vector_store, "warmup_error", None):
+        with TestClient(app) as client:
+            deadline = time.time() + 5
+            while client.get("/ready").json()["status"] == "warming_up" and time.time() < deadline:
+                time.sleep(0.05)
+            response = client.get("/ready")
+            assert response.status_code == 503
+            assert response.json()["status"] == "error"
+
+
+def test_ready_without_warmup():
+    with patch("app.main.settings.WARMUP_ON_STARTUP", False), \
+         patch.object(vector_store, "ready", False):
+        with TestClient(app) as client:
+            response = client.get("/ready")
+            assert response.status_code == 200
+            assert response.json()["warm"] is False
@@ -0,0 +1,132 @@
+from types import SimpleNamespace
+from unittest.mock import patch, MagicMock
+from fastapi.testclient import TestClient
+from app.main import app
+from app.metrics import metrics
+from app import retrieval
+from app.retrieval import RetrievalConfig, mmr_select, retrieve, get_retrieval_config
+
+client = TestClient(app)
+
+QUERY = [1.0, 0.0, 0.0]
+# Two near-identical chunks close to the query, and a less similar but different one
+CANDIDATES = [
+    {"document": "A", "embedding": [0.9, 0.1, 0.0], "distance": 0.1, "metadata": {}},
+    {"document": "A copy", "embedding": [0.89, 0.11, 0.0], "distance": 0.11, "metadata": {}},
+    {"document": "B", "embedding": [0.6, 0.0, 0.8], "distance": 0.5, "metadata": {}},
+]
+
+
+def mock_store(candidates=CANDIDATES):
+    store = MagicMock()
+    store.embed.return_value = [QUERY]
+    store.query_candidates.return_value = [candidates]
+    return store
+
+
+def test_mmr_prefers_diverse_candidates():
+    embeddings = [c["embedding"] for c in CANDIDATES]
+    assert mmr_select(QUERY, embeddings, k=2, lambda_=0.5) == [0, 2]
+    # Pure relevance keeps the near duplicate
+    assert mmr_select(QUERY, embeddings, k=2, lambda_=1.0) == [0, 1]
+    assert mmr_select(QUERY, [], k=2) == []
+
+
+def test_retrieve_overfetches_and_diversifies():
+    store = mock_store()
+    config = RetrievalConfig(top_k=2, fetch_k=10, mmr_lambda=0.5)
+    with patch("app.retrieval.vector_store", store):
+        result = retrieve("docs", "question", config)
+    store.query_candidates.assert_called_once_with("docs", [QUERY], 10)
+    assert result.documents == ["A", "B"]
+    assert {"embed", "search", "mmr", "pack"} <= set(result.timings)
+
+
+def test_retrieve_without_postprocessing_skips_overfetch():
+    store = mock_store()
+    config = RetrievalConfig(top_k=2, fetch_k=10, mmr=False)
+    with patch("app.retrieval.vector_store", store):
+        result = retrieve("docs", "question", config)
+    store.query_candidates.assert_called_once_with("docs", [QUERY], 2)
+    assert result.documents == ["A", "A copy"]
+    assert "mmr" not in result.timings
+
+
+def test_rerank_scores_drive_selection():
+    store = mock_store()
+    config = RetrievalConfig(top_k=1, mmr=False, rerank=True)
+    with patch("app.retrieval.vector_store", store), \
+         patch.object(retrieval.reranker, "score", return_value=[0.1, 0.2, 0.9]):
+        result = retrieve("docs", "question", config)
+    assert result.documents == ["B"]
+    assert "rerank" in result.timings
+
+
+def test_reranker_scores_are_scaled():
+    reranker = retrieval.Reranker("model")
+    reranker._model = MagicMock()
+    reranker._model.predict.return_value = [-8.0, 2.0, 12.0]
+    assert reranker.score("q", ["a", "b", "c"]) == [0.0, 0.5, 1.0]
+
+
+def test_reranker_failure_falls_back():
+    reranker = retrieval.Reranker("missing-model")
+    module = SimpleNamespace(CrossEncoder=MagicMock(side_effect=OSError("no network")))
+    with patch.dict("sys.modules", {"sentence_transformers": module}):
+        assert reranker.score("q", ["a"]) is None
+        assert reranker.score("q", ["a"]) is None
+    # Not retried on every request
+    assert module.CrossEncoder.call_count == 1 and not reranker.available
+
+    store = mock_store()
+    config = RetrievalConfig(top_k=2, mmr=False, rerank=True)
+    with patch("app.retrieval.vector_store", store), patch.object(retrieval, "reranker", reranker):
+        result = retrieve("docs", "question", config)
+    assert result.documents == ["A", "A copy"]
+
+
+def test_context_token_budget():
+    candidates = [dict(c, document="word " * 40) for c in CANDIDATES]
+    config = RetrievalConfig(top_k=3, mmr=False, max_context_tokens=50)
+    with patch("app.retrieval.vector_store", mock_store(candidates)):
+        result = retrieve(None, "question", config)
+    assert len(result.documents) == 1
+    assert result.context_tokens == 40
+
+
+def test_retrieve_handles_store_errors():
+    store = MagicMock()
+    store.embed.side_effect = RuntimeError("boom")
+    with patch("app.retrieval.vector_store", store):
+        assert retrieve("docs", "question").documents == []
+
+
+def test_domain_settings_override():
+    with patch("app.retrieval.settings.RETRIEVAL_DOMAIN_SETTINGS", {"fast": {"mmr": False}}):
+        assert get_retrieval_config("fast").mmr is False
+        assert get_retrieval_config("fast").candidates == get_retrieval_config("fast").top_k
+        assert get_retrieval_config("other").mmr is True
+
+
+def test_chat_packs_diverse_context_and_records_metrics():
+    captured = {}
+
+    async def generate(messages, stream=False, **kwargs):
+        captured["messages"] = messages
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="ok"))])
+
+    metrics.reset()
+    with patch("app.retrieval.vector_store", mock_store()), \
+         patch("app.retrieval.settings.RETRIEVAL_TOP_K", 2), \
+         patch("app.retrieval.settings.RETRIEVAL_MMR_LAMBDA", 0.5), \
+         patch("app.routers.chat.llm_client.generate_chat_response", generate):
+        response = client.post("/api/v1/chat", json={"message": "Hi", "domain": "docs"})
+    assert response.status_code == 200
+    system_prompt = captured["messages"][0]["content"]
+    assert "Relevant Context:\nA\nB" in system_prompt
+    assert "A copy" not in system_prompt
+
+    snapshot = client.get("/metrics").json()
+    assert snapshot["counters"]["retrieval.requests"] == 1
+    assert snapshot["counters"]["retrieval.documents_packed"] == 2
+    assert {"retrieval.embed", "retrieval.search", "retrieval.mmr", "retrieval.total"} <= set(snapshot["timings"])
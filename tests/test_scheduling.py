@@ -0,0 +1,168 @@
+import asyncio
+import httpx
+import pytest
+from types import SimpleNamespace
+from openai import AsyncOpenAI
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from app.main import app
+from app.metrics import metrics
+from app.scheduling import FairScheduler, RateLimited, Tenant, TokenBudget, current_tenant, tenants
+from app.llm_client import _stream_with_usage
+from benchmarks.fake_openai import create_app
+
+client = TestClient(app)
+
+TENANTS = {
+    "key-a": {"name": "acme", "tokens_per_minute": 30},
+    "key-b": {"name": "bulk"},
+}
+
+
+@pytest.fixture
+def upstream():
+    # Every completion reports prompt + 8 completion tokens of usage
+    fake = create_app(ttft=0, tokens_per_second=0, completion_tokens=8)
+    llm = AsyncOpenAI(api_key="fake", base_url="http://fake/v1",
+                      http_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=fake)))
+    metrics.reset()
+    tenants.clear()
+    with patch("app.llm_client.client", llm), patch("app.scheduling.settings.TENANTS", TENANTS):
+        yield
+    tenants.clear()
+
+
+def test_weighted_fair_order():
+    async def run():
+        scheduler = FairScheduler("test", capacity=1)
+        heavy, light = Tenant("heavy", weight=3), Tenant("light", weight=1)
+        blocker = Tenant("blocker")
+        order = []
+
+        async def job(tenant):
+            await scheduler.acquire(tenant)
+            order.append(tenant.name)
+            await asyncio.sleep(0)
+            scheduler.release(tenant)
+
+        await scheduler.acquire(blocker)
+        tasks = [asyncio.create_task(job(t)) for t in [light] * 4 + [heavy] * 8]
+        await asyncio.sleep(0)
+        assert scheduler.queued == 12
+        scheduler.release(blocker)
+        await asyncio.gather(*tasks)
+        return order
+
+    order = asyncio.run(run())
+    # Queued first but weighted 1:3, the light tenant gets one of every four slots
+    assert order[:8].count("heavy") == 6
+    assert order[:8].count("light") == 2
+
+
+def test_per_tenant_concurrency_cap():
+    async def run():
+        scheduler = FairScheduler("test", capacity=4)
+        capped, other = Tenant("capped", max_concurrency=1), Tenant("other")
+        state = {"capped": 0, "peak": 0}
+
+        async def job(tenant):
+            await scheduler.acquire(tenant)
+            if tenant is capped:
+                state["capped"] += 1
+                state["peak"] = max(state["peak"], state["capped"])
+            await asyncio.sleep(0.01)
+            if tenant is capped:
+                state["capped"] -= 1
+            scheduler.release(tenant)
+
+        await asyncio.gather(*(job(t) for t in [capped] * 5 + [other] * 5))
+        return state, scheduler
+
+    state, scheduler = asyncio.run(run())
+    assert state["peak"] == 1
+    assert scheduler.active == 0 and scheduler.queued == 0
+
+
+def test_queue_timeout_returns_503():
+    async def run():
+        scheduler = FairScheduler("test", capacity=1, queue_timeout=0.01)
+        tenant = Tenant("t")
+        await scheduler.acquire(tenant)
+        with pytest.raises(RateLimited) as exc:
+            await scheduler.acquire(tenant)
+        assert scheduler.queued == 0
+        scheduler.release(tenant)
+        assert scheduler.active == 0
+        return exc.value
+
+    error = asyncio.run(run())
+    assert error.status_code == 503
+    assert error.headers == {"Retry-After": "1"}
+
+
+def test_token_budget_refills():
+    now = [0.0]
+    budget = TokenBudget(60, clock=lambda: now[0])
+    budget.charge(70)
+    assert budget.available() == -10
+    assert budget.retry_after() == pytest.approx(11)
+    now[0] = 11
+    assert budget.available() == pytest.approx(1)
+    now[0] = 1000
+    assert budget.available() == 60
+
+
+def test_chat_token_budget_returns_429(upstream):
+    headers = {"X-API-Key": "key-a"}
+    first = client.post("/api/v1/chat", json={"message": "hello"}, headers=headers)
+    assert first.status_code == 200
+
+    # Usage (prompt + 8 completion tokens) was charged; the 30 tokens/min budget is spent
+    second = client.post("/api/v1/chat", json={"message": "hello " * 20}, headers=headers)
+    assert second.status_code == 200
+    limited = client.post("/api/v1/chat", json={"message": "hello"}, headers=headers)
+    assert limited.status_code == 429
+    assert int(limited.headers["Retry-After"]) >= 1
+
+    # Other tenants are unaffected
+    assert client.post("/api/v1/chat", json={"message": "hello"}, headers={"X-API-Key": "key-b"}).status_code == 200
+
+    counters = metrics.snapshot()["counters"]
+    assert counters["tenant.acme.completion_tokens"] == 16
+    assert counters["tenant.acme.rate_limited"] == 1
+    assert counters["tenant.acme.generation.requests"] == 2
+    assert counters["tenant.bulk.generation.requests"] == 1
+    assert "tenant.acme.generation.latency" in metrics.snapshot()["timings"]
+
+
+def test_require_api_key(upstream):
+    with patch("app.scheduling.settings.REQUIRE_API_KEY", True):
+        assert client.post("/api/v1/chat", json={"message": "hi"}).status_code == 401
+        assert client.post("/api/v1/chat", json={"message": "hi"}, headers={"X-API-Key": "nope"}).status_code == 401
+        assert client.post("/api/v1/chat", json={"message": "hi"}, headers={"X-API-Key": "key-b"}).status_code == 200
+
+
+def test_streamed_deltas_are_charged_without_usage():
+    def chunk(content):
+        return SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+
+    async def upstream_stream():
+        for content in ["one ", "two ", "three"]:
+            yield chunk(content)
+
+    async def run(tenant):
+        token = current_tenant.set(tenant)
+        try:
+            seen = []
+            async for c in _stream_with_usage(upstream_stream(), None):
+                seen.append(tenant.budget.available())
+            return seen
+        finally:
+            current_tenant.reset(token)
+
+    metrics.reset()
+    tenant = Tenant("streamer", tokens_per_minute=100)
+    seen = asyncio.run(run(tenant))
+    assert seen[0] == pytest.approx(99, abs=0.1)
+    assert seen[-1] == pytest.approx(97, abs=0.1)
+    assert metrics.counters["tenant.streamer.completion_tokens"] == 3
@@ -0,0 +1,115 @@
+import asyncio
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+from fastapi.testclient import TestClient
+from app.main import app
+from app.metrics import metrics
+from app.schemas import Message
+from app.summary_cache import SummaryCache, summary_cache, message_digest
+from app.routers.chat import process_summary
+
+client = TestClient(app)
+
+
+async def generate(messages, stream=False, **kwargs):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="reply"))])
+
+
+@pytest.fixture
+def summarize():
+    summary_cache.clear()
+    metrics.reset()
+    mock = AsyncMock(side_effect=lambda text: f"summary #{mock.await_count}")
+    with patch("app.routers.chat.llm_client.summarize_conversation", mock), \
+         patch("app.routers.chat.llm_client.generate_chat_response", generate):
+        yield mock
+
+
+def history(n, offset=0):
+    return [{"role": "user" if i % 2 == 0 else "assistant", "content": f"msg {i}"} for i in range(offset, offset + n)]
+
+
+def test_identical_requests_hit_cache(summarize):
+    payload = {"message": "next", "messages": history(20), "summary": "old"}
+    first = client.post("/api/v1/chat", json=payload).json()
+    second = client.post("/api/v1/chat", json=payload).json()
+    assert summarize.await_count == 1
+    assert first["updated_summary"] == second["updated_summary"] == "summary #1"
+
+    counters = client.get("/metrics").json()["counters"]
+    assert counters["summary.cache_hits"] == 1
+    assert counters["summary.cache_misses"] == 1
+    assert counters["summary.tokens_saved"] > 0
+
+
+def test_incremental_summarizes_only_new_messages(summarize):
+    messages = history(20)
+    first = client.post("/api/v1/chat", json={"message": "m20", "messages": messages, "summary": None}).json()
+
+    # A second tab still holding the full history sends the new summary plus everything
+    full = messages + [{"role": "user", "content": "m20"}, {"role": "assistant", "content": "reply"}] + history(3, 21)
+    client.post("/api/v1/chat", json={"message": "again", "messages": full, "summary": first["updated_summary"]})
+
+    assert summarize.await_count == 2
+    text = summarize.await_args.args[0]
+    assert text.startswith("Previous Summary: summary #1")
+    # msg 0..14 were covered by the first summary and must not be re-sent
+    assert "msg 0\n" not in text and "msg 14" not in text
+    assert "msg 15" in text
+    assert metrics.counters["summary.incremental_skipped_messages"] == 15
+
+
+def test_fully_covered_span_reuses_summary(summarize):
+    messages = [Message(**m) for m in history(10)]
+    summary = asyncio.run(process_summary(None, messages))
+    assert asyncio.run(process_summary(summary, messages)) == summary
+    assert summarize.await_count == 1
+
+
+def test_summary_from_another_model_or_prompt_is_not_reused(summarize):
+    messages = [Message(**m) for m in history(10)]
+    summary = asyncio.run(process_summary(None, messages))
+    with patch("app.routers.chat.settings.MODEL_NAME", "other-model"):
+        assert asyncio.run(process_summary(summary, messages)) == "summary #2"
+    with patch("app.routers.chat.llm_client.SUMMARY_PROMPT", "Summarize tersely:\n{history}"):
+        assert asyncio.run(process_summary(summary, messages)) == "summary #3"
+    # The original context still finds its coverage
+    assert asyncio.run(process_summary(summary, messages)) == summary
+
+
+def test_incremental_disabled(summarize):
+    messages = [Message(**m) for m in history(10)]
+    summary = asyncio.run(process_summary(None, messages))
+    with patch("app.routers.chat.settings.SUMMARY_INCREMENTAL", False):
+        asyncio.run(process_summary(summary, messages))
+    assert summarize.await_count == 2
+
+
+def test_concurrent_requests_share_one_call():
+    cache = SummaryCache()
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return "shared"
+
+    async def main():
+        return await asyncio.gather(*(cache.get_or_compute("k", [], compute) for _ in range(5)))
+
+    results = asyncio.run(main())
+    assert calls == 1
+    assert [r[0] for r in results] == ["shared"] * 5
+    assert sorted(r[1] for r in results) == [False, True, True, True, True]
+
+
+def test_cache_eviction():
+    cache = SummaryCache(max_entries=2)
+    for i in range(3):
+        cache.put(f"k{i}", f"s{i}", [message_digest("user", str(i))])
+    assert cache.get("k0") is None
+    assert cache.get("k2") == "s2"
+    assert cache.coverage("s0") == []
+    assert cache.coverage("s2") == [message_digest("user", "2")]
@@ -1,10 +1,8 @@
-import requests
 import json
 
-url = "http://localhost:8000/api/v1/chat"
+from agent_client import AgentClient, AgentClientError
 
-payload = {
-    "message": "Write a short poem about code.",
+params = {
     "model": "hf.co/liquidai/lfm2.5-1.2b-instruct-gguf:Q4_K_M",
     "temperature": 0.2, # Low temp for deterministic output
     "max_tokens": 50,    # Short output
@@ -13,14 +11,12 @@ payload = {
     "frequency_penalty": 0.1
 }
 
-print(f"Sending payload: {json.dumps(payload, indent=2)}")
+print(f"Sending params: {json.dumps(params, indent=2)}")
 
-try:
-    response = requests.post(url, json=payload)
-    response.raise_for_status()
-    print("Response received:")
-    print(json.dumps(response.json(), indent=2))
-except requests.exceptions.RequestException as e:
-    print(f"Error: {e}")
-    if response:
-        print(response.text)
+with AgentClient("http://localhost:8000") as client:
+    try:
+        result = client.chat("Write a short poem about code.", **params)
+        print("Response received:")
+        print(json.dumps(result.__dict__, indent=2))
+    except AgentClientError as e:
+        print(f"Error: {e}")